@@ -0,0 +1,443 @@
+import time
+import asyncio
+import functools
+
+from infogetter import InfoGetter, COLLECTORS, COLLECTOR_DEPENDENCIES, HEADERS, GEO_CACHE, TITLE_CHUNK_SIZE, \
+    ROBOTS_MAX_BYTES, MAP_MAX_BYTES, MAP_IMAGE, SITEMAP_CHUNK_SIZE, SITEMAP_WORKERS, MAX_SITEMAPS, \
+    SITEMAP_MAX_BYTES, SITEMAP_MAX_SECONDS, GoogleHiccup, NoApi, NoWiki, NoWhois, NoGeo, GeoAPIFailed, NoSitemap, \
+    METADATA_KEY, collector_outcome
+from helpers.lookup_cache import MISSING
+from helpers.metrics import RAISED, count_retries
+from helpers.title_parser import TitleParser, TitleNotFound
+from helpers.sitemap import async_crawl_sitemaps
+from helpers.robots import parse_robots
+from helpers.req_handler import GET, RequestErrorData, RequestData, ResponseTooLarge
+from helpers.async_req_handler import AsyncRequestHandler
+from helpers.lazy_import import lazy_import
+
+"""
+asyncio version of InfoGetter.
+
+AsyncInfoGetter gathers the same data as InfoGetter, but its collectors are coroutines scheduled on the running event
+loop following COLLECTOR_DEPENDENCIES. Requests go through an AsyncRequestHandler, which can be shared between
+AsyncInfoGetter instances to keep many domains in flight on a single loop, and the blocking calls (DNS, whois and
+fingerprinting) are offloaded to the loop's default executor.
+
+Usage:
+    ig = AsyncInfoGetter(url)
+    data = await ig.run()
+"""
+
+bs4 = lazy_import('bs4')
+
+
+class AsyncInfoGetter(InfoGetter):
+    """
+    Class to handle the information gathering on an event loop.
+
+    It reuses InfoGetter's path handling, caching and parsing, and only overrides the methods that wait on the network
+    or on blocking libraries.
+    """
+
+    def __init__(self, url, output_directory=None, requester=None, store=None, index=None):
+        """
+        :param url: str
+        :param output_directory: str (defaults to ./output), or a SQLite file, see InfoGetter
+        :param requester: AsyncRequestHandler to share between instances, if None, one is created and closed by run().
+        A shared requester records into its own metrics, so the requests saved under METADATA_KEY are left empty.
+        :param store: ReportStore or None, overrides output_directory
+        :param index: ReportIndex or None, see InfoGetter
+        """
+        super(AsyncInfoGetter, self).__init__(url, output_directory, store, index)
+
+        self._owns_requester = requester is None
+        if self._owns_requester:
+            requester = AsyncRequestHandler([], RequestData(GET, headers=HEADERS), RequestErrorData(allow_errors=False),
+                                            metrics=self.request_metrics)
+        self.requester = requester
+
+    async def run(self, refresh=False):
+        """
+        Run every collector as soon as the fields it depends on are collected.
+
+        If self.loaded_flag is True, return the saved self.data without performing any work, unless refresh is True.
+        Then, as in InfoGetter.run(), only the expired or errored fields and their changed dependents are collected.
+
+        :param refresh: bool
+        :return: dict, self.data
+        """
+        if self.loaded_flag and not refresh:
+            return self.data
+
+        fields = self._stale_fields() if self.loaded_flag else list(COLLECTORS)
+        if not fields:
+            return self.data
+
+        self.data['url'] = self.url
+
+        try:
+            collected = set()
+            while fields:
+                previous = {field: self.data.get(field) for field in fields}
+                self._collecting = set(fields)
+                await self._run_collectors(fields)
+
+                collected.update(fields)
+                fields = self._dependent_fields(previous, collected)
+        finally:
+            self._clear_cache()
+            if self._owns_requester:
+                await self.requester.close()
+
+        self.data[METADATA_KEY]['requests'] = self.request_metrics.snapshot()
+        self._save()
+
+        return self.data
+
+    async def _run_collectors(self, fields):
+        """
+        Schedule a task per field, each one waiting on the tasks of its dependencies. If a collector raises, the rest
+        are cancelled and the exception is raised.
+
+        :param fields: list of str, fields in COLLECTORS
+        :return: None
+        """
+        tasks = {}
+
+        async def collect(field):
+            for dep in COLLECTOR_DEPENDENCIES.get(field, []):
+                if dep in tasks:
+                    await tasks[dep]
+            self._set_field(field, await self._collect(field))
+
+        for field in fields:
+            tasks[field] = asyncio.ensure_future(collect(field))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+    async def _collect(self, field):
+        """
+        Same as InfoGetter._collect(), awaiting the collector. Retries are counted across the tasks it starts.
+
+        :param field: str, a field in COLLECTORS
+        :return: the field's value
+        """
+        start = time.perf_counter()
+        with count_retries() as retry_count:
+            try:
+                value = await getattr(self, '_collect_%s' % field)()
+            except Exception:
+                self._record_collector(field, time.perf_counter() - start, RAISED, retry_count.value)
+                raise
+
+        self._record_collector(field, time.perf_counter() - start, collector_outcome(value), retry_count.value)
+        return value
+
+    @staticmethod
+    async def _offload(func, *args, **kwargs):
+        """
+        Run a blocking call on the loop's default executor.
+
+        :param func: callable
+        :return: func's return
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def _collect_ip(self):
+        # Do not catch errors at IP lookup, as it might indicate connection issues or bad URLs.
+        return await self._get_ip(self.url)
+
+    async def _collect_title(self):
+        return await self._get_title(self.url)
+
+    async def _collect_estimated(self):
+        try:
+            return await self._get_estimated_size(self.url)
+        except Exception as e:
+            err = ("[!] Possible Google issue: _get_estimated_size failed with exception: %s" % str(e))
+            print("%s" % err)
+            return 'Error', err
+
+    async def _collect_potential_api(self):
+        try:
+            return await self._get_potential_api(self.url)
+        except NoApi:
+            return None
+        except Exception as e:
+            err = ("[!] Possible Google issue: _get_potential_api failed with exception: %s" % str(e))
+            print("%s" % err)
+            return 'Error', err
+
+    async def _collect_news_url(self):
+        return self._get_news_url(self.url)
+
+    async def _collect_whois(self):
+        try:
+            return await self._offload(InfoGetter._get_first_whois_data, self._whois_queries())
+        except NoWhois:
+            return None
+
+    async def _collect_geo_location(self):
+        try:
+            return await self._get_geo_location_data(self.data['ip'])
+        except NoGeo:
+            print("[!] Geo Location lookup failed: It shouldn't fail if IP lookup came right.")
+            return None
+        except GeoAPIFailed:
+            print("[!] Geo Location lookup failed on the request lvl, API might have changed or is down.")
+            return None
+
+    async def _collect_geo_maps(self):
+        try:
+            return await self._get_geo_imgs(self.data['whois'], self.data['geo_location'])
+        except GoogleHiccup:
+            await asyncio.sleep(2)
+            try:
+                return await self._get_geo_imgs(self.data['whois'], self.data['geo_location'])
+            except GoogleHiccup:
+                return [None]
+
+    async def _collect_builtwith(self):
+        return await self._get_built_with(self.url)
+
+    async def _collect_robots(self):
+        try:
+            return parse_robots(await self._get_robot(self.url)).as_dict()
+        except:
+            return None
+
+    async def _collect_sitemap(self):
+        try:
+            return await self._get_sitemap(self.url, self.data['robots'])
+        except NoSitemap:
+            return None
+
+    async def _collect_sitemap_stats(self):
+        if not self.data['sitemap']:
+            return None
+        return await self._get_sitemap_stats(self._sitemap_urls(self.data['sitemap'], self.data['robots']))
+
+    async def _collect_wiki(self):
+        try:
+            return await self._get_wiki(self.url)
+        except NoWiki:
+            return None
+        except Exception as e:
+            err = ("[!] Possible Google issue: _get_wiki failed with exception: %s" % str(e))
+            print("%s" % err)
+            return 'Error', err
+
+    async def _req_wrap(self, url, stream=False):
+        """
+        :param url: str
+        :param stream: bool, return an AsyncStreamResponse, the caller has to close it
+        :return: AsyncResponse or AsyncStreamResponse
+        """
+        return await self.requester.fetch(url, stream=stream)
+
+    async def _download_wrap(self, url, max_bytes, path=None, truncate=False):
+        """
+        :param url: str
+        :param max_bytes: int
+        :param path: str or None
+        :param truncate: bool
+        :return: Download
+        """
+        return await self.requester.download(url, max_bytes, path, truncate)
+
+    async def _probe_wrap(self, url):
+        """
+        :param url: str
+        :return: bool
+        """
+        return await self.requester.probe(url)
+
+    async def _get_page(self, url):
+        """
+        Same as InfoGetter._get_page(), waiting on an asyncio.Lock per url.
+
+        :param url: str
+        :return: AsyncResponse
+        """
+        async with self._get_cache_lock(url):
+            if url not in self._page_urls:
+                r = await self._req_wrap(url)
+                self._pages.setdefault(r.url, r)
+                self._page_urls[url] = r.url
+
+            return self._pages[self._page_urls[url]]
+
+    async def _get_soup(self, url):
+        """
+        :param url: str
+        :return: BeautifulSoup object
+        """
+        final_url = (await self._get_page(url)).url
+
+        if final_url not in self._soups:
+            self._soups[final_url] = bs4.BeautifulSoup(self._pages[final_url].text, 'html.parser')
+
+        return self._soups[final_url]
+
+    def _get_cache_lock(self, key):
+        """
+        Everything runs on the event loop's thread, so no lock is needed around the dictionary itself.
+
+        :param key: hashable
+        :return: asyncio.Lock
+        """
+        return self._cache_locks.setdefault(key, asyncio.Lock())
+
+    async def _get_ip(self, url):
+        """
+        :param url: str
+        :return: str
+        """
+        return (await self._offload(self._get_ips, url))[0]
+
+    async def _get_title(self, url):
+        """
+        Same as InfoGetter._get_title(), reading the streamed page on the loop.
+
+        :param url: str
+        :return: str
+        """
+        sanitized_url = 'http://' + self._sanitize_url(url)
+
+        if self._streams_title(sanitized_url):
+            r = await self._req_wrap(sanitized_url, stream=True)
+            try:
+                parser = TitleParser(r.encoding)
+                async for chunk in r.iter_content(TITLE_CHUNK_SIZE):
+                    if parser.feed_bytes(chunk):
+                        break
+                return parser.get_title()
+            except TitleNotFound:
+                pass
+            finally:
+                r.close()
+
+        return (await self._get_soup(sanitized_url)).title.string
+
+    async def _get_estimated_size(self, url):
+        """
+        :param url: str
+        :return: (str, int) -> (estimated size url, estimated size)
+        """
+        google_query_url = 'https://www.google.com/search?q=site:%s' % self._sanitize_url(url)
+        return google_query_url, self._parse_estimated_size((await self._get_page(google_query_url)).text)
+
+    async def _get_potential_api(self, url):
+        """
+        :param url: str
+        :return: str
+        """
+        google_query_url = 'https://www.google.com/search?q=api %s' % self._sanitize_url(url)
+        return self._parse_potential_api((await self._get_page(google_query_url)).text, url)
+
+    async def _get_geo_location_data(self, ip):
+        """
+        :param ip: str
+        :return: dictionary
+        """
+        geo_data = self._get_offline_geo_location(ip)
+        if geo_data is not None:
+            return geo_data
+
+        geo_data = GEO_CACHE.get(ip)
+
+        if geo_data is MISSING:
+            geo_url = 'http://extreme-ip-lookup.com/json/%s' % ip
+            geo_data = self._parse_geo_location(await self._req_wrap(geo_url))
+            GEO_CACHE.set(ip, geo_data)
+
+        return dict(geo_data)
+
+    async def _get_geo_imgs(self, whois_data, geolocation_data):
+        """
+        :param whois_data: dict
+        :param geolocation_data: dict
+        :return: list, [whois_google_maps_embed_link, geo_location_google_maps_link]
+        """
+        response = [self._get_whois_maps_link(whois_data), None]
+
+        if geolocation_data:
+            r = await self._req_wrap(self._get_map_query_url(geolocation_data))
+            try:
+                download = await self._download_wrap(self._parse_map_url(r.text), MAP_MAX_BYTES)
+                await self._offload(self.store.save_image, self.key, MAP_IMAGE, download.content)
+            except ResponseTooLarge:
+                print("[!] Map image over %s bytes, not saved." % MAP_MAX_BYTES)
+
+            response[1] = self._get_geolocation_maps_link(geolocation_data)
+
+        return response
+
+    async def _get_built_with(self, url):
+        """
+        :param url: str
+        :return: dict
+        """
+        sanitized_url = 'http://' + self._sanitize_url(url)
+        r = await self._get_page(sanitized_url)
+
+        return await self._offload(self._detect_technologies, r.headers, r.text)
+
+    async def _get_robot(self, url):
+        """
+        :param url: str
+        :return: str
+        """
+        sanitized_url = 'http://' + self._sanitize_url(url)
+        return (await self._download_wrap('%s/robots.txt' % sanitized_url, ROBOTS_MAX_BYTES, truncate=True)).text
+
+    async def _get_sitemap(self, url, robot_data):
+        """
+        :param url: str
+        :param robot_data: str or None
+        :return: str
+        """
+        sitemap_url = self._find_sitemap_url(url, robot_data)
+
+        try:
+            found = await self._probe_wrap(sitemap_url)
+        except:
+            found = False
+
+        if not found:
+            raise NoSitemap()
+        return sitemap_url
+
+    async def _get_sitemap_stats(self, sitemap_urls):
+        """
+        :param sitemap_urls: list of str
+        :return: dict
+        """
+        return await async_crawl_sitemaps(sitemap_urls, self._get_sitemap_chunks, SITEMAP_WORKERS, MAX_SITEMAPS,
+                                          max_total_bytes=SITEMAP_MAX_BYTES, max_seconds=SITEMAP_MAX_SECONDS)
+
+    async def _get_sitemap_chunks(self, sitemap_url):
+        """
+        :param sitemap_url: str
+        :return: async generator of bytes
+        """
+        r = await self._req_wrap(sitemap_url, stream=True)
+        try:
+            async for chunk in r.iter_content(SITEMAP_CHUNK_SIZE):
+                yield chunk
+        finally:
+            r.close()
+
+    async def _get_wiki(self, url):
+        """
+        :param url: str
+        :return: str
+        """
+        google_query = 'https://www.google.com/search?q=%s site:wikipedia.org' % self._sanitize_url(url)
+        return self._parse_wiki((await self._get_page(google_query)).text)
@@ -1,8 +1,17 @@
+import os
 import sys
+import json
+import time
+import argparse
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 import infogetter
 import htmldrawer
+from helpers.metrics import REQUEST_METRICS, COLLECTOR_METRICS, save_metrics
+from helpers.report_store import open_store, import_directory, SQLITE_SUFFIXES
+from helpers.report_index import open_index, index_terms, FIELDS
+from helpers.geoip import compile_database, open_geo_database
 
 """
 Entry point for the script, it stitches together infogetter and htmldrawer, then uses webbrowser to immediately open
@@ -11,27 +20,539 @@ the HTML report.
 Usage:
     'python bckg_info.py URL | FILEPATH'
     URL: valid URL
+    FILEPATH (OPTIONAL): valid path to save the data, defaults at ./output. A path ending in .sqlite, .sqlite3 or .db
+        saves every report in that single SQLite file instead
+
+    'python bckg_info.py --batch SOURCE | FILEPATH [--workers N] [--processes] [--max-in-flight N] [--refresh]
+        [--cache-dir DIR] [--metrics FILE] [--geo-db FILE] [--no-geo-api]'
+    SOURCE: file with one URL per line, or - to read them from stdin
     FILEPATH (OPTIONAL): valid path to save the data, defaults at ./output
+    --refresh: collect again the expired or errored fields of saved reports instead of skipping them
+    --cache-dir: directory to load and save the geolocation and whois lookup caches from
+    --metrics: file to keep a snapshot of the request and collector metrics in, Prometheus text if it ends in .prom,
+        else json
+    --geo-db: database compiled by --geoip to geolocate IPs on, instead of the extreme-ip-lookup.com API
+    --no-geo-api: don't ask the API for the IPs out of the --geo-db database either
+
+    'python bckg_info.py --render | FILEPATH [--workers N] [--force]'
+    FILEPATH (OPTIONAL): path the reports are saved at, defaults at ./output
+    --force: draw every report again, not only the ones whose data.json or renderer changed since the last draw
+
+    'python bckg_info.py --import SOURCE STORE'
+    SOURCE: directory of reports saved one per directory, e.g. ./output
+    STORE: path to import them into, e.g. reports.sqlite
+
+    'python bckg_info.py --query FIELD=TERM [FIELD=TERM ...] | FIELD [--store FILEPATH] [--limit N]'
+    FIELD=TERM: reports with every term, e.g. technology=nginx country=ar, out of the index of the saved reports
+    FIELD: the most common terms of a field instead, e.g. registrar
+    FIELDS: ip, country, asn, org, registrar, name_server, technology
+
+    'python bckg_info.py --reindex | FILEPATH [--workers N]'
+    FILEPATH (OPTIONAL): path the reports are saved at, defaults at ./output. The index of the saved reports is kept up
+        to date as reports are saved, this builds it again from scratch on a pool of worker processes
+
+    'python bckg_info.py --geoip SOURCE DATABASE'
+    SOURCE: CSV of IP ranges and their locations, e.g. DB-IP's IP to City Lite, see helpers.geoip.compile_database()
+    DATABASE: file to compile it into, for --batch --geo-db
 """
 
+DEFAULT_BATCH_WORKERS = 8
+DEFAULT_QUERY_LIMIT = 20  # Terms listed by a --query on a field
+PROGRESS_INTERVAL = 5  # Seconds between batch progress reports
+DNS_PREFETCH = 64  # URLs of a batch whose domains are resolved ahead of the ones handed to the pool
+RENDER_CHUNK_SIZE = 64  # Reports handed to a render_all() worker at once
+INDEX_CHUNK_SIZE = 256  # Reports handed to a rebuild_index() worker at once, and indexed in a single transaction
+
 
 def call(url, path):
     """
-    We create the InfoGetter instance, run it, then pass InfoGetter.data and InfoGetter.filepath to htmldrawer.
-    We then open the default the HTML report with webbrowser library.
+    We create the InfoGetter instance, indexing its data as it's saved, run it concurrently, then pass InfoGetter.data
+    and InfoGetter.filepath to htmldrawer, which only draws the HTML report again if it's not current. We then open
+    the default the HTML report with webbrowser library.
 
     :param url: str, valid URL
     :param path: str or None
     :return: None
     """
     ig = infogetter.InfoGetter(url, path)
-    data = ig.run()
-    path = ig.filepath
+    ig.index = open_index(ig.store.path)
+    data = ig.run(concurrent=True)
+    path = ig.store.export(ig.key)
 
-    htmldrawer.html_draw(data, path)
+    htmldrawer.draw_report(path, data)
     webbrowser.open(path + '/output.html')
 
 
+def read_urls(source):
+    """
+    Read one URL per line out of a file, or out of stdin if source is '-'. Skips blank lines, # comments and URLs
+    saved under the same directory as a previous one.
+
+    :param source: str, file path or '-'
+    :return: list of str
+    """
+    if source == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+
+    urls = []
+    seen = set()
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+
+        filename = infogetter.url_to_filename(url)
+        if filename not in seen:
+            seen.add(filename)
+            urls.append(url)
+
+    return urls
+
+
+def batch(urls, path=None, workers=DEFAULT_BATCH_WORKERS, use_processes=False, max_in_flight=None, refresh=False,
+          cache_dir=None, metrics_file=None, geo_database=None, geo_api_fallback=True):
+    """
+    Generate the report of every url on a pool of workers, without opening them.
+
+    URLs with a saved report are skipped before reaching the pool, unless refresh is True, in which case their
+    expired fields are collected again (see InfoGetter.run()). The saved reports are listed once, up front. At most
+    max_in_flight URLs are handed to the pool at once, so the rest of the list doesn't pile up in its queue, and the
+    domains of the next DNS_PREFETCH URLs are resolved meanwhile, so DNS isn't waited on one domain at a time. A URL
+    that raises is recorded in failed, and the batch carries on. Failures are also saved under
+    path/batch_errors.json, or next to path if it's a SQLite file. Every InfoGetter of a process shares
+    infogetter.SESSION_POOL, so connections are kept alive from one domain to the next, and closed when done.
+
+    If cache_dir is given, the geolocation and whois lookup caches are loaded from it before starting and, unless
+    use_processes is True (each process has its own caches), saved back when done.
+
+    If metrics_file is given, a snapshot of REQUEST_METRICS and COLLECTOR_METRICS is saved to it along with every
+    progress report. Process workers send their metrics back with each report.
+
+    If geo_database is given, IPs are geolocated on it, see infogetter.use_geo_database().
+
+    :param urls: list of str
+    :param path: str or None, directory or SQLite file (see open_store()), defaults at ./output
+    :param workers: int, size of the pool
+    :param use_processes: bool, use a process pool instead of a thread pool
+    :param max_in_flight: int, defaults at twice the number of workers
+    :param refresh: bool
+    :param cache_dir: str or None
+    :param metrics_file: str or None
+    :param geo_database: str or None, database compiled by compile_database()
+    :param geo_api_fallback: bool, ask the API for the IPs out of geo_database
+    :return: dict, {'done': list of str, 'skipped': list of str, 'failed': {url: str}}
+    """
+    # Workers would race to create it
+    if not path:
+        path = os.getcwd() + '/output'
+        if not os.path.isdir(path):
+            os.mkdir(path)
+    elif not path.endswith(SQLITE_SUFFIXES) and not os.path.isdir(path):
+        raise infogetter.InvalidFilePath(path)
+
+    store = open_store(path)
+    saved = set() if refresh else set(store.keys())
+
+    if not max_in_flight:
+        max_in_flight = workers * 2
+
+    result = {'done': [], 'skipped': [], 'failed': {}}
+    running = {}
+    start = last_report = time.time()
+
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(cache_dir, geo_database, geo_api_fallback))
+    else:
+        _init_worker(cache_dir, geo_database, geo_api_fallback)
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    with executor:
+        pending = iter(urls)
+        exhausted = False
+
+        # Domains are resolved DNS_PREFETCH URLs ahead of the pool, on infogetter.RESOLVER
+        ahead = (url for url in urls if store.key(url) not in saved)
+        _prefetch(ahead, DNS_PREFETCH)
+
+        while running or not exhausted:
+            # Keep the pool fed up to max_in_flight
+            while not exhausted and len(running) < max_in_flight:
+                url = next(pending, None)
+                if url is None:
+                    exhausted = True
+                elif store.key(url) in saved:
+                    result['skipped'].append(url)
+                else:
+                    # Process workers have resolvers of their own, they're handed the addresses already resolved
+                    addresses = infogetter.RESOLVER.cached(_host(url)) if use_processes else None
+                    running[executor.submit(_batch_worker, url, path, refresh, addresses)] = url
+                    _prefetch(ahead, 1)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = running.pop(future)
+                try:
+                    metrics = future.result()
+                    result['done'].append(url)
+                    if use_processes:
+                        REQUEST_METRICS.merge(metrics['requests'])
+                        COLLECTOR_METRICS.merge(metrics['collectors'])
+                except Exception as e:
+                    print("[!] %s failed with exception: %s" % (url, repr(e)))
+                    result['failed'][url] = repr(e)
+
+            if time.time() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.time()
+                _print_progress(result, len(urls), last_report - start)
+                if metrics_file:
+                    save_metrics(metrics_file)
+
+    _print_progress(result, len(urls), time.time() - start)
+    if metrics_file:
+        save_metrics(metrics_file)
+
+    # Process workers' connections close as they exit
+    infogetter.SESSION_POOL.close()
+
+    if not use_processes:
+        for filename, cache in infogetter.LOOKUP_CACHE_FILES.items():
+            print('[*] %s: %s' % (filename, cache.stats()))
+        if cache_dir:
+            infogetter.save_lookup_caches(cache_dir)
+
+    if result['failed']:
+        errors_path = os.path.dirname(os.path.abspath(path)) if path.endswith(SQLITE_SUFFIXES) else path
+        with open(errors_path + '/batch_errors.json', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(result['failed'], indent=True))
+
+    return result
+
+
+def _init_worker(cache_dir, geo_database, geo_api_fallback):
+    """
+    Set infogetter up for a batch, in every worker process or once for a thread pool.
+
+    :param cache_dir: str or None
+    :param geo_database: str or None
+    :param geo_api_fallback: bool
+    :return: None
+    """
+    if cache_dir:
+        infogetter.load_lookup_caches(cache_dir)
+    if geo_database:
+        infogetter.use_geo_database(geo_database, geo_api_fallback)
+
+
+def _prefetch(urls, count):
+    """
+    :param urls: iterator of str
+    :param count: int, urls taken out of it, whose domains start resolving
+    :return: None
+    """
+    infogetter.RESOLVER.prefetch([_host(url) for _, url in zip(range(count), urls)])
+
+
+def _host(url):
+    """
+    :param url: str
+    :return: str, the name InfoGetter resolves for url
+    """
+    return infogetter.InfoGetter._sanitize_url(url)
+
+
+def _batch_worker(url, path, refresh, addresses=None):
+    """
+    Generate the report of a single url. Module level so process pools can pickle it.
+
+    The HTML report is only drawn if the store keeps reports as files, those of a SqliteStore are drawn on demand.
+
+    :param url: str
+    :param path: str
+    :param refresh: bool
+    :param addresses: list of str or None, the addresses url resolves to, if already resolved
+    :return: dict, {'requests': RequestMetrics.snapshot(), 'collectors': CollectorMetrics.snapshot()} of the run
+    """
+    if addresses:
+        infogetter.RESOLVER.seed(_host(url), addresses)
+
+    ig = infogetter.InfoGetter(url, path, index=open_index(path))
+    data = ig.run(concurrent=True, refresh=refresh)
+    if ig.store.exported:
+        htmldrawer.draw_report(ig.filepath, data)
+
+    return {'requests': ig.request_metrics.snapshot(), 'collectors': ig.collector_metrics.snapshot()}
+
+
+def render_all(path=None, workers=None, force=False):
+    """
+    Draw again every report saved under path that is not current (see htmldrawer.draw_report()), on a pool of worker
+    processes. A report that raises is recorded in failed, and the rest carry on. Reports of a SqliteStore are
+    exported first, see ReportStore.export().
+
+    :param path: str or None, directory or SQLite file (see open_store()), defaults at ./output
+    :param workers: int or None, size of the pool, defaults at the number of CPUs
+    :param force: bool, draw every report, current or not
+    :return: dict, {'drawn': list of str, 'current': list of str, 'failed': {str: str}}, by report key
+    """
+    if not path:
+        path = os.getcwd() + '/output'
+    if not os.path.exists(path):
+        raise infogetter.InvalidFilePath(path)
+
+    reports = open_store(path).keys()
+
+    result = {'drawn': [], 'current': [], 'failed': {}}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        outcomes = executor.map(_render_worker, [path] * len(reports), reports, [force] * len(reports),
+                                chunksize=RENDER_CHUNK_SIZE)
+        for report, (outcome, error) in zip(reports, outcomes):
+            if outcome == 'failed':
+                print("[!] %s failed with exception: %s" % (report, error))
+                result['failed'][report] = error
+            else:
+                result[outcome].append(report)
+
+    print('[*] %s reports, Drawn: %s, Current: %s, Failed: %s' %
+          (len(reports), len(result['drawn']), len(result['current']), len(result['failed'])))
+
+    return result
+
+
+def _render_worker(path, report, force):
+    """
+    Draw a saved report, if not current. Module level so process pools can pickle it.
+
+    :param path: str, directory or SQLite file the report is saved in
+    :param report: str, key of the report
+    :param force: bool
+    :return: tuple, ('drawn' | 'current', None) or ('failed', str)
+    """
+    try:
+        directory = open_store(path).export(report)
+        return 'drawn' if htmldrawer.draw_report(directory, force=force) else 'current', None
+    except Exception as e:
+        return 'failed', repr(e)
+
+
+def rebuild_index(path=None, workers=None):
+    """
+    Index every report saved under path again from scratch, on a pool of worker processes that load them and extract
+    their terms, while this one writes them to the index. A report that can't be loaded is left out.
+
+    :param path: str or None, directory or SQLite file (see open_store()), defaults at ./output
+    :param workers: int or None, size of the pool, defaults at the number of CPUs
+    :return: int, number of reports indexed
+    """
+    if not path:
+        path = os.getcwd() + '/output'
+    if not os.path.exists(path):
+        raise infogetter.InvalidFilePath(path)
+
+    keys = open_store(path).keys()
+    chunks = [keys[start:start + INDEX_CHUNK_SIZE] for start in range(0, len(keys), INDEX_CHUNK_SIZE)]
+
+    index = open_index(path)
+    index.clear()
+
+    indexed = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for documents in executor.map(_index_worker, [path] * len(chunks), chunks):
+            indexed += index.update_many(documents)
+
+    print('[*] Indexed %s of %s reports in %.2fs' % (indexed, len(keys), time.time() - start))
+
+    return indexed
+
+
+def _index_worker(path, keys):
+    """
+    Load saved reports and extract their index terms. Module level so process pools can pickle it.
+
+    :param path: str, directory or SQLite file the reports are saved in
+    :param keys: list of str
+    :return: list of (key, url, index_terms()) tuples
+    """
+    store = open_store(path)
+
+    documents = []
+    for key in keys:
+        try:
+            data = store.load(key)
+        except ValueError as e:
+            print("[!] %s couldn't be loaded: %s" % (key, repr(e)))
+            continue
+
+        if data is not None:
+            documents.append((key, data.get('url'), index_terms(data)))
+
+    return documents
+
+
+def _print_progress(result, total, elapsed):
+    """
+    :param result: dict, batch() result
+    :param total: int
+    :param elapsed: float, seconds since the batch started
+    :return: None
+    """
+    processed = len(result['done']) + len(result['failed'])
+    rate = processed / elapsed if elapsed else 0
+    print('[*] %s/%s, Done: %s, Skipped: %s, Failed: %s, %.2f urls/s' %
+          (processed + len(result['skipped']), total, len(result['done']), len(result['skipped']),
+           len(result['failed']), rate))
+
+
+def batch_main(argv):
+    """
+    Parse the --batch command line arguments and run batch()
+
+    :param argv: list of str, arguments after --batch
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog='bckg_info.py --batch')
+    parser.add_argument('source', help="file with one URL per line, or - to read them from stdin")
+    parser.add_argument('filepath', nargs='?', default=None,
+                        help='path to save the data, defaults at ./output, or a .sqlite file')
+    parser.add_argument('--workers', type=int, default=DEFAULT_BATCH_WORKERS)
+    parser.add_argument('--processes', action='store_true', help='use processes instead of threads')
+    parser.add_argument('--max-in-flight', type=int, default=None)
+    parser.add_argument('--refresh', action='store_true', help='refresh the expired fields of saved reports')
+    parser.add_argument('--cache-dir', default=None, help='directory to persist the geolocation and whois caches in')
+    parser.add_argument('--metrics', default=None, help='file to save metrics to, Prometheus text if it ends in .prom')
+    parser.add_argument('--geo-db', default=None, help='database compiled by --geoip to geolocate IPs on')
+    parser.add_argument('--no-geo-api', action='store_true', help="don't ask the API for the IPs out of --geo-db")
+    args = parser.parse_args(argv)
+
+    if args.geo_db and not os.path.isfile(args.geo_db):
+        raise infogetter.InvalidFilePath(args.geo_db)
+
+    batch(read_urls(args.source), args.filepath, args.workers, args.processes, args.max_in_flight, args.refresh,
+          args.cache_dir, args.metrics, args.geo_db, not args.no_geo_api)
+
+
+def render_main(argv):
+    """
+    Parse the --render command line arguments and run render_all()
+
+    :param argv: list of str, arguments after --render
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog='bckg_info.py --render')
+    parser.add_argument('filepath', nargs='?', default=None,
+                        help='path the reports are saved at, defaults at ./output, or a .sqlite file')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults at the number of CPUs')
+    parser.add_argument('--force', action='store_true', help='draw every report, even the current ones')
+    args = parser.parse_args(argv)
+
+    render_all(args.filepath, args.workers, args.force)
+
+
+def import_main(argv):
+    """
+    Parse the --import command line arguments, import the reports of a directory into a store and index them
+
+    :param argv: list of str, arguments after --import
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog='bckg_info.py --import')
+    parser.add_argument('source', help='directory of reports saved one per directory, e.g. ./output')
+    parser.add_argument('store', help='path to import them into, e.g. reports.sqlite')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        raise infogetter.InvalidFilePath(args.source)
+
+    start = time.time()
+    imported = import_directory(args.source, open_store(args.store))
+    print('[*] Imported %s reports into %s in %.2fs' % (imported, args.store, time.time() - start))
+
+    rebuild_index(args.store)
+
+
+def query_main(argv):
+    """
+    Parse the --query command line arguments and print the reports matching them, or the most common terms of a field
+
+    :param argv: list of str, arguments after --query
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog='bckg_info.py --query')
+    parser.add_argument('terms', nargs='+', help='FIELD=TERM to match, or a single FIELD to count its terms, '
+                                                 'FIELD in %s' % ', '.join(FIELDS))
+    parser.add_argument('--store', default=None, help='path the reports are saved at, defaults at ./output')
+    parser.add_argument('--limit', type=int, default=DEFAULT_QUERY_LIMIT, help='terms listed when counting a field')
+    args = parser.parse_args(argv)
+
+    path = args.store or os.getcwd() + '/output'
+    if not os.path.exists(path):
+        raise infogetter.InvalidFilePath(path)
+    index = open_index(path)
+
+    counting = len(args.terms) == 1 and '=' not in args.terms[0]
+    terms = {} if counting else dict(term.split('=', 1) for term in args.terms)
+    for field in [args.terms[0]] if counting else terms:
+        if field not in FIELDS:
+            parser.error('unknown field %s, expected one of %s' % (field, ', '.join(FIELDS)))
+
+    start = time.time()
+    if counting:
+        for term, count in index.counts(args.terms[0], args.limit):
+            print('%8s  %s' % (count, term))
+    else:
+        keys = index.query(**terms)
+        for key in keys:
+            print('%s  %s' % (key, index.url(key)))
+        print('[*] %s reports' % len(keys))
+
+    print('[*] Queried in %.1fms' % ((time.time() - start) * 1000))
+
+
+def reindex_main(argv):
+    """
+    Parse the --reindex command line arguments and run rebuild_index()
+
+    :param argv: list of str, arguments after --reindex
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog='bckg_info.py --reindex')
+    parser.add_argument('filepath', nargs='?', default=None,
+                        help='path the reports are saved at, defaults at ./output, or a .sqlite file')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults at the number of CPUs')
+    args = parser.parse_args(argv)
+
+    rebuild_index(args.filepath, args.workers)
+
+
+def geoip_main(argv):
+    """
+    Parse the --geoip command line arguments and compile the CSV into a database
+
+    :param argv: list of str, arguments after --geoip
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog='bckg_info.py --geoip')
+    parser.add_argument('source', help="CSV of IP ranges and their locations, e.g. DB-IP's IP to City Lite")
+    parser.add_argument('database', help='file to compile it into')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.source):
+        raise infogetter.InvalidFilePath(args.source)
+
+    start = time.time()
+    counts = compile_database(args.source, args.database)
+    print('[*] Compiled %s IPv4 and %s IPv6 ranges of %s locations into %s in %.2fs, skipped %s rows' %
+          (counts['ipv4'], counts['ipv6'], counts['locations'], args.database, time.time() - start, counts['skipped']))
+    print('[*] %s bytes' % open_geo_database(args.database).stats()['bytes'])
+
+
 # Exceptions
 class NoUrl(Exception):
     pass
@@ -44,6 +565,30 @@ if __name__ == '__main__':
     except IndexError:
         raise NoUrl()
 
+    if uri == '--batch':
+        batch_main(sys.argv[2:])
+        sys.exit()
+
+    if uri == '--render':
+        render_main(sys.argv[2:])
+        sys.exit()
+
+    if uri == '--import':
+        import_main(sys.argv[2:])
+        sys.exit()
+
+    if uri == '--query':
+        query_main(sys.argv[2:])
+        sys.exit()
+
+    if uri == '--reindex':
+        reindex_main(sys.argv[2:])
+        sys.exit()
+
+    if uri == '--geoip':
+        geoip_main(sys.argv[2:])
+        sys.exit()
+
     # Optional
     try:
         filepath = sys.argv[2]
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+import builtwith
+from requests.structures import CaseInsensitiveDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+
+from helpers.fingerprint import FingerprintEngine, load_signatures
+from helpers.lazy_import import module_available
+from test_fingerprint import synthetic_pages
+
+"""
+Times technology detection over pages made of pieces of the builtwith signatures (see tests/test_fingerprint.py) plus
+the pages under benchmarks/fixtures: builtwith.builtwith(), which goes through every signature per page, against
+helpers.fingerprint.FingerprintEngine with each LiteralMatcher backend installed. Also times compiling the engine,
+done once per process.
+
+Usage:
+    'python benchmarks/bench_fingerprint.py [PAGES]'
+    PAGES (OPTIONAL): synthetic pages, defaults at 200
+"""
+
+DEFAULT_PAGES = 200
+URL = 'https://www.example.org/'
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def pages_per_second(detect, pages):
+    """
+    :param detect: callable, taking headers and html
+    :param pages: list of (headers, html)
+    :return: float
+    """
+    start = time.perf_counter()
+    for headers, html in pages:
+        detect(headers, html)
+    return len(pages) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGES
+    signatures = load_signatures()
+
+    pages = synthetic_pages(signatures, n_pages)
+    for name in ['index.html', 'serp.html']:
+        with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+            pages.append((CaseInsensitiveDict({'Server': 'nginx'}), f.read()))
+    print('%s pages, %.1f KB on average' % (len(pages), sum(len(html) for _, html in pages) / len(pages) / 1024))
+
+    rate = pages_per_second(lambda headers, html: builtwith.builtwith(URL, headers, html.encode('utf-8')), pages)
+    print('%-22s %8.1f pages/s' % ('builtwith', rate))
+
+    for backend in ['regex'] + (['ahocorasick'] if module_available('ahocorasick') else []):
+        start = time.perf_counter()
+        engine = FingerprintEngine(signatures, backend)
+        compiled = time.perf_counter() - start
+
+        rate = pages_per_second(lambda headers, html: engine.detect(headers, html, URL), pages)
+        print('%-22s %8.1f pages/s, compiled in %.2fs' % ('engine (%s)' % backend, rate, compiled))
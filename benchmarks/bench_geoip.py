@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import ipaddress
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.geoip import GeoDatabase, compile_database
+
+"""
+Times helpers.geoip over a synthetic CSV the size of DB-IP's IP to City Lite: compiling it, then looking up random
+IPv4 and IPv6 addresses, most of them inside a range.
+
+Usage:
+    'python benchmarks/bench_geoip.py [RANGES] [LOOKUPS]'
+    RANGES (OPTIONAL): IPv4 ranges, plus a quarter as many IPv6 ones, defaults at 1000000
+    LOOKUPS (OPTIONAL): addresses looked up of each version, defaults at 100000
+"""
+
+DEFAULT_RANGES = 1000000
+DEFAULT_LOOKUPS = 100000
+LOCATIONS = 50000
+
+HEADER = 'ip_start,ip_end,continent,country,country_code,region,city,latitude,longitude,isp,org\n'
+
+
+def synthetic_rows(version, n, rng):
+    """
+    Ranges of random sizes, one after the other with random gaps, of random locations.
+
+    :param version: int, 4 or 6
+    :param n: int
+    :param rng: random.Random
+    :return: generator of str
+    """
+    address_class = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+    step = 2 ** (32 if version == 4 else 128) // (n + 1)
+    for i in range(n):
+        first = i * step + rng.randrange(step // 4)
+        last = first + rng.randrange(step // 4, step // 2)
+        location = rng.randrange(LOCATIONS)
+        yield '%s,%s,Continent %s,Country %s,C%s,Region %s,City %s,%s,%s,ISP %s,Org %s\n' % \
+              (address_class(first), address_class(last), location % 7, location % 250, location % 250,
+               location % 5000, location, location % 180 - 90, location % 360 - 180, location % 3000,
+               location % 3000)
+
+
+def timed_lookups(database, addresses):
+    """
+    :param database: GeoDatabase
+    :param addresses: list of str
+    :return: tuple, (microseconds per lookup, share of the addresses found)
+    """
+    start = time.perf_counter()
+    found = sum(1 for address in addresses if database.lookup(address) is not None)
+    return (time.perf_counter() - start) * 1e6 / len(addresses), found / len(addresses)
+
+
+if __name__ == '__main__':
+    n_ranges = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RANGES
+    n_lookups = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LOOKUPS
+    random_generator = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as path:
+        with open(path + '/ranges.csv', 'w', encoding='utf-8') as f:
+            f.write(HEADER)
+            f.writelines(synthetic_rows(4, n_ranges, random_generator))
+            f.writelines(synthetic_rows(6, n_ranges // 4, random_generator))
+
+        start = time.perf_counter()
+        counts = compile_database(path + '/ranges.csv', path + '/ranges.db')
+        print('compile: %.2fs, %s IPv4 and %s IPv6 ranges, %s locations, %.1f MB (CSV %.1f MB)' %
+              (time.perf_counter() - start, counts['ipv4'], counts['ipv6'], counts['locations'],
+               os.path.getsize(path + '/ranges.db') / 1e6, os.path.getsize(path + '/ranges.csv') / 1e6))
+
+        start = time.perf_counter()
+        database = GeoDatabase(path + '/ranges.db')
+        print('open: %.2fms' % ((time.perf_counter() - start) * 1000))
+
+        ipv4 = [str(ipaddress.IPv4Address(random_generator.getrandbits(32))) for _ in range(n_lookups)]
+        ipv6 = [str(ipaddress.IPv6Address(random_generator.getrandbits(128))) for _ in range(n_lookups)]
+        for name, addresses in [('ipv4', ipv4), ('ipv6', ipv6)]:
+            microseconds, found = timed_lookups(database, addresses)
+            print('%s lookup: %.2fus, %.0f lookups/s, %.0f%% found' % (name, microseconds, 1e6 / microseconds,
+                                                                      found * 100))
+        database.close()
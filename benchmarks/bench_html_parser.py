@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.html_parser import available_backends, get_serp_parser
+
+"""
+Times every installed helpers.html_parser backend over a synthetic google results page, as InfoGetter reads it: the
+result count, the first cite and the first link, each parsing the page on its own.
+
+Usage:
+    'python benchmarks/bench_html_parser.py [RESULTS] [RUNS]'
+    RESULTS (OPTIONAL): results in the page, defaults at 100
+    RUNS (OPTIONAL): times each page is parsed, defaults at 20
+"""
+
+DEFAULT_RESULTS = 100
+DEFAULT_RUNS = 20
+
+# Google pages carry about as much script and style as markup
+FILLER = '<script>var data = %s;</script><style>.c%s{color:#333}</style>'
+RESULT = '<div class="g"><div class="r"><a href="https://example.org/page-%s"><h3>Result %s</h3></a>' \
+         '<div class="s"><cite>https://example.org<span> &rsaquo; page-%s</span></cite>' \
+         '<span class="st">Some <em>snippet</em> text for result %s.</span></div></div></div>'
+
+
+def synthetic_serp(results):
+    """
+    :param results: int
+    :return: str
+    """
+    head = ''.join([FILLER % (list(range(50)), i) for i in range(results)])
+    body = ''.join([RESULT % (i, i, i, i) for i in range(results)])
+    return '<!doctype html><html><head><title>site:example.org</title>%s</head><body>' \
+           '<div id="result-stats">About %s results</div><div id="search">%s</div></body></html>' % \
+           (head, results, body)
+
+
+if __name__ == '__main__':
+    n_results = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RESULTS
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RUNS
+
+    html = synthetic_serp(n_results)
+    print('page: %s KB, %s results, %s runs' % (len(html) // 1024, n_results, n_runs))
+
+    for name in available_backends():
+        parser = get_serp_parser(name)
+
+        start = time.perf_counter()
+        for _ in range(n_runs):
+            parser.result_stats(html)
+            parser.first_cite(html)
+            parser.first_link(html)
+        elapsed = time.perf_counter() - start
+
+        print('%-10s %.2fms per page' % (name, elapsed / n_runs / 3 * 1000))
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmldrawer
+from helpers.robots import parse_robots
+
+"""
+Times htmldrawer.html_draw() over synthetic robots.txt files of growing size, both parsed and as raw text (saved by
+older versions). Render time should grow linearly with the number of lines.
+
+Usage:
+    'python benchmarks/bench_htmldrawer.py [LINES ...]'
+    LINES (OPTIONAL): robots.txt sizes to time, defaults at 10000 100000 1000000
+"""
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'example_org_data.json')
+
+
+def synthetic_data(lines):
+    """
+    :param lines: int, lines in the robots.txt
+    :return: dict, InfoGetter.run() like data
+    """
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    data['robots'] = '\n'.join(['User-agent: *'] + ['Disallow: /path/%s/' % i for i in range(lines - 1)])
+    return data
+
+
+def bench(lines, raw=False):
+    """
+    :param lines: int
+    :param raw: bool, render robots.txt as raw text
+    :return: float, seconds taken by html_draw()
+    """
+    data = synthetic_data(lines)
+    if not raw:
+        data['robots'] = parse_robots(data['robots']).as_dict()
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        htmldrawer.html_draw(data, path)
+        return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        for raw in [False, True]:
+            elapsed = bench(size, raw)
+            print('%9s lines%s: %.3fs (%.2f us/line)' % (size, ' (raw)' if raw else '', elapsed, elapsed / size * 1e6))
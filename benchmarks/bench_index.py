@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.report_index import ReportIndex, index_terms
+
+"""
+Times helpers.report_index over synthetic reports, copies of tests/example_org_data.json with their IP, country,
+registrar, name servers and technologies drawn out of pools of realistic sizes: indexing them all, then queries on
+one field and on several.
+
+Usage:
+    'python benchmarks/bench_index.py [REPORTS] [QUERIES]'
+    REPORTS (OPTIONAL): reports indexed, defaults at 50000
+    QUERIES (OPTIONAL): queries of each kind, defaults at 200
+"""
+
+DEFAULT_REPORTS = 50000
+DEFAULT_QUERIES = 200
+CHUNK_SIZE = 256  # Reports indexed per transaction, as bckg_info.rebuild_index() does
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests')
+
+COUNTRIES = ['US', 'AR', 'DE', 'FR', 'GB', 'JP', 'BR', 'IN', 'NL', 'CA']
+REGISTRARS = ['Registrar %s' % i for i in range(200)]
+TECHNOLOGIES = ['Technology %s' % i for i in range(500)]
+
+
+def synthetic_report(example, i, rng):
+    """
+    :param example: dict
+    :param i: int
+    :param rng: random.Random
+    :return: dict
+    """
+    data = dict(example, url='example%s.org' % i, ip='10.%s.%s.%s' % (i // 65536 % 256, i // 256 % 256, i % 256))
+    data['geo_location'] = dict(example['geo_location'], countryCode=rng.choice(COUNTRIES))
+    data['whois'] = dict(example['whois'], registrar=rng.choice(REGISTRARS),
+                         name_servers=['ns%s.host%s.net' % (n, rng.randrange(2000)) for n in range(2)])
+    data['builtwith'] = {'tech': rng.sample(TECHNOLOGIES, 8)}
+    return data
+
+
+def timed_queries(queries):
+    """
+    :param queries: list of callables
+    :return: float, median milliseconds
+    """
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        query()
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+
+if __name__ == '__main__':
+    n_reports = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPORTS
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_QUERIES
+    random_generator = random.Random(0)
+
+    with open(os.path.join(TESTS, 'example_org_data.json'), 'r', encoding='utf-8') as f:
+        example_data = json.load(f)
+
+    documents = []
+    for n in range(n_reports):
+        report = synthetic_report(example_data, n, random_generator)
+        documents.append(('example%s.org' % n, report['url'], index_terms(report)))
+
+    with tempfile.TemporaryDirectory() as path:
+        index = ReportIndex(path + '/index.sqlite')
+
+        start = time.perf_counter()
+        for chunk_start in range(0, n_reports, CHUNK_SIZE):
+            index.update_many(documents[chunk_start:chunk_start + CHUNK_SIZE])
+        elapsed = time.perf_counter() - start
+        print('indexed %s reports in %.2fs, %.0f reports/s, %.1f MB' %
+              (n_reports, elapsed, n_reports / elapsed, os.path.getsize(path + '/index.sqlite') / 1024 / 1024))
+
+        single = [lambda: index.query(registrar=random_generator.choice(REGISTRARS)) for _ in range(n_queries)]
+        print('query(registrar=...): %.2fms median' % timed_queries(single))
+
+        combined = [lambda: index.query(country=random_generator.choice(COUNTRIES),
+                                        technology=random_generator.choice(TECHNOLOGIES)) for _ in range(n_queries)]
+        print('query(country=..., technology=...): %.2fms median' % timed_queries(combined))
+
+        counts = [lambda: index.counts('registrar', 20) for _ in range(max(n_queries // 20, 1))]
+        print('counts(registrar, 20): %.2fms median' % timed_queries(counts))
+
+        index.close()
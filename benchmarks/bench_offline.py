@@ -0,0 +1,499 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+import threading
+import contextlib
+from unittest import mock
+from urllib.parse import urlsplit, urlunsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import infogetter
+import htmldrawer
+from helpers.resolver import Resolver, DEFAULT_TTL
+from helpers.req_handler import GET, ThreadedRequestHandler, RequestData, RequestErrorData, RateLimiter, \
+    TOO_MANY_REQUESTS
+
+"""
+Offline end to end benchmarks. A local HTTP server stands in for the target site, Google and extreme-ip-lookup.com,
+serving the pages under benchmarks/fixtures with configurable latency and error rate, while whois and DNS lookups are
+stubbed. It times:
+    - InfoGetter.run(), sequential and concurrent, in total and per collector
+    - ThreadedRequestHandler throughput at each thread count
+    - htmldrawer.html_draw() over tests/example_org_data.json, and htmldrawer.draw_report() once it's current
+
+Every request InfoGetter makes is sent to the local server by LocalAdapter, keeping its original Host header, and
+the rate limits of HOST_RATES are left out, so the numbers measure this code rather than the throttling.
+
+Results are saved as json, and compared against a previous results file if given.
+
+Usage:
+    'python benchmarks/bench_offline.py [--runs N] [--latency S] [--jitter S] [--error-rate P] [--error-status CODE]
+        [--whois-latency S] [--dns-latency S] [--threads N ...] [--urls N] [--draw-runs N] [--seed N]
+        [--output FILE] [--compare FILE]'
+    --error-status: status of the injected errors, 429 by default, which RequestHandler retries
+    --output: results file, defaults at ./bench_offline.json
+    --compare: previous results file, the medians of both are printed side by side
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+TESTS = os.path.join(ROOT, 'tests')
+
+DOMAIN = 'example.org'
+IP = '93.184.216.34'
+GOOGLE_HOSTS = ['www.google.com', 'google.com']
+GEO_HOST = 'extreme-ip-lookup.com'
+
+SITEMAPS = 4  # Children of /sitemap_index.xml
+SITEMAP_URLS = 2000  # Urls in each child sitemap
+MAP_IMAGE = b'\xff\xd8\xff\xe0' + b'\x00' * 16 * 1024
+
+DEFAULT_RUNS = 5
+DEFAULT_THREADS = [1, 2, 4, 8, 16]
+DEFAULT_URLS = 400
+DEFAULT_DRAW_RUNS = 50
+DEFAULT_OUTPUT = 'bench_offline.json'
+
+
+def read_fixture(path, binary=False):
+    """
+    :param path: str
+    :param binary: bool
+    :return: str or bytes
+    """
+    with open(path, 'rb' if binary else 'r', encoding=None if binary else 'utf-8') as f:
+        return f.read()
+
+
+def sitemap_index(base_url):
+    """
+    :param base_url: str
+    :return: bytes
+    """
+    entries = ''.join(['<sitemap><loc>%s/sitemap-%s.xml</loc></sitemap>' % (base_url, i) for i in range(SITEMAPS)])
+    return ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex '
+            'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">%s</sitemapindex>' % entries).encode('utf-8')
+
+
+def sitemap(base_url, n):
+    """
+    :param base_url: str
+    :param n: int, number of the sitemap
+    :return: bytes
+    """
+    entries = ''.join(['<url><loc>%s/page-%s-%s</loc><lastmod>2020-01-%02d</lastmod></url>' %
+                       (base_url, n, i, i % 28 + 1) for i in range(SITEMAP_URLS)])
+    return ('<?xml version="1.0" encoding="UTF-8"?><urlset '
+            'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">%s</urlset>' % entries).encode('utf-8')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Routes by Host header: Google hosts get the results page fixture, or a map image under /maps/vt, the geolocation
+    host gets the geolocation fixture, and any other host is the target site. Each request waits for the server's
+    latency first, and fails with its error_status at its error_rate.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are sent apart, delayed ACKs would add 40ms to each request
+
+    def handle(self):
+        try:
+            super(FixtureHandler, self).handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # Streamed responses are closed early by the client on purpose
+            pass
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond()
+
+    def _respond(self, head=False):
+        """
+        :param head: bool, leave the body out
+        :return: None
+        """
+        server = self.server
+        time.sleep(max(0, server.latency + server.random.uniform(-server.jitter, server.jitter)))
+
+        if server.random.random() < server.error_rate:
+            status, content_type, body = server.error_status, 'text/plain', b'injected error'
+        else:
+            status, content_type, body = self._route(self.headers.get('Host', '').split(':')[0],
+                                                     urlsplit(self.path).path)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == TOO_MANY_REQUESTS:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _route(self, host, path):
+        """
+        :param host: str
+        :param path: str
+        :return: (int, str, bytes) -> (status, content type, body)
+        """
+        fixtures = self.server.fixtures
+
+        if host in GOOGLE_HOSTS:
+            if path.startswith('/maps/vt'):
+                return 200, 'image/jpeg', MAP_IMAGE
+            return 200, 'text/html; charset=utf-8', fixtures['serp']
+
+        if host == GEO_HOST:
+            return 200, 'application/json', fixtures['geo']
+
+        base_url = 'http://%s' % host
+        if path == '/':
+            return 200, 'text/html; charset=utf-8', fixtures['index']
+        if path == '/robots.txt':
+            return 200, 'text/plain', fixtures['robots']
+        if path == '/sitemap_index.xml':
+            return 200, 'application/xml', sitemap_index(base_url)
+        if path.startswith('/sitemap-'):
+            return 200, 'application/xml', sitemap(base_url, int(path[len('/sitemap-'):-len('.xml')]))
+        if path.startswith('/page'):
+            return 200, 'text/html; charset=utf-8', fixtures['index']
+
+        return 404, 'text/plain', b'not found'
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """
+    Local server for FixtureHandler, on a free port of 127.0.0.1
+    """
+    daemon_threads = True
+    request_queue_size = 128  # The default of 5 drops connections once many threads connect at once
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, error_status=TOO_MANY_REQUESTS, seed=None):
+        """
+        :param latency: float, seconds each request waits before being answered
+        :param jitter: float, seconds latency varies by, both ways
+        :param error_rate: float, 0 to 1, share of requests answered with error_status
+        :param error_status: int
+        :param seed: int or None, seed of the latency and error draws
+        """
+        super(FixtureServer, self).__init__(('127.0.0.1', 0), FixtureHandler)
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+
+        self.fixtures = {
+            'index': read_fixture(os.path.join(FIXTURES, 'index.html'), binary=True),
+            'serp': read_fixture(os.path.join(FIXTURES, 'serp.html'), binary=True),
+            'robots': read_fixture(os.path.join(FIXTURES, 'robots.txt'), binary=True),
+            'geo': read_fixture(os.path.join(TESTS, 'example_org_geo_location.json'), binary=True),
+        }
+
+    @property
+    def address(self):
+        """
+        :return: str, host:port
+        """
+        return '%s:%s' % self.server_address[:2]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class LocalAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter sending every request, http or https, to a local address instead, keeping the original host in the
+    Host header and the original url in the response.
+    """
+    def __init__(self, address, **kwargs):
+        """
+        :param address: str, host:port
+        """
+        super(LocalAdapter, self).__init__(**kwargs)
+        self.address = address
+
+    def send(self, request, **kwargs):
+        url = request.url
+        split_url = urlsplit(url)
+
+        request.headers['Host'] = split_url.netloc
+        request.url = urlunsplit(('http', self.address, split_url.path, split_url.query, ''))
+
+        response = super(LocalAdapter, self).send(request, **kwargs)
+        response.url = url
+        return response
+
+
+@contextlib.contextmanager
+def stubbed_lookups(whois_latency=0, dns_latency=0):
+    """
+    Replace the whois and DNS lookups InfoGetter makes with ones answering the fixtures after a delay.
+
+    :param whois_latency: float, seconds
+    :param dns_latency: float, seconds
+    :return: None
+    """
+    whois_data = json.loads(read_fixture(os.path.join(TESTS, 'example_org_whois.json')))
+
+    def fake_whois(query, deadline=None):
+        time.sleep(whois_latency)
+        return dict(whois_data)
+
+    def fake_query(name):
+        time.sleep(dns_latency)
+        return [IP], DEFAULT_TTL
+
+    resolver = Resolver(backend='system')
+    with mock.patch.object(infogetter.WHOIS_CLIENT, 'whois', fake_whois), \
+            mock.patch.object(resolver, '_query', fake_query), mock.patch.object(infogetter, 'RESOLVER', resolver):
+        yield
+    resolver.close()
+
+
+def summarize(samples):
+    """
+    :param samples: list of float, seconds
+    :return: dict, milliseconds, {'n': int, 'mean': float, 'median': float, 'p95': float, 'min': float, 'max': float}
+    """
+    if not samples:
+        return {'n': 0}
+
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {'n': len(samples), 'mean': statistics.mean(samples) * 1000, 'median': statistics.median(samples) * 1000,
+            'p95': p95 * 1000, 'min': ordered[0] * 1000, 'max': ordered[-1] * 1000}
+
+
+def bench_infogetter(server, runs, concurrent):
+    """
+    :param server: FixtureServer
+    :param runs: int
+    :param concurrent: bool, passed to InfoGetter.run()
+    :return: dict, {'total': summarize(), 'collectors': {field: summarize()}, 'failed_runs': int}
+    """
+    totals = []
+    durations = {field: [] for field in infogetter.COLLECTORS}
+    failed = 0
+
+    for _ in range(runs):
+        # Lookups would be served from the caches after the first run
+        infogetter.GEO_CACHE.clear()
+        infogetter.WHOIS_CACHE.clear()
+        infogetter.RESOLVER.cache.clear()
+
+        with tempfile.TemporaryDirectory() as path:
+            ig = infogetter.InfoGetter(DOMAIN, path)
+            ig.requester.rate_limiter = RateLimiter()
+            adapter = LocalAdapter(server.address)
+            ig.requester.session_pool.session.mount('http://', adapter)
+            ig.requester.session_pool.session.mount('https://', adapter)
+
+            collect = ig._collect
+
+            def timed_collect(field):
+                start = time.perf_counter()
+                try:
+                    return collect(field)
+                finally:
+                    durations[field].append(time.perf_counter() - start)
+
+            ig._collect = timed_collect
+
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ig.run(concurrent=concurrent)
+            except Exception:
+                failed += 1
+                continue
+            finally:
+                ig.requester.session_pool.close()
+            totals.append(time.perf_counter() - start)
+
+    return {'total': summarize(totals), 'collectors': {field: summarize(durations[field]) for field in durations},
+            'failed_runs': failed}
+
+
+def bench_threaded(server, thread_counts, n_urls):
+    """
+    :param server: FixtureServer
+    :param thread_counts: list of int
+    :param n_urls: int
+    :return: dict, {thread count: {'seconds': float, 'requests_per_second': float, 'responses': int, 'errors': int,
+    'retries': int}}
+    """
+    urls = ['http://%s/page-%s' % (server.address, i) for i in range(n_urls)]
+    results = {}
+
+    for thread_num in thread_counts:
+        handler = ThreadedRequestHandler(urls, RequestData(GET), RequestErrorData(backoff_max=0), thread_num,
+                                         rate_limiter=RateLimiter())
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler.do_threads()
+        elapsed = time.perf_counter() - start
+        handler.session_pool.close()
+
+        results[str(thread_num)] = {'seconds': elapsed, 'requests_per_second': n_urls / elapsed,
+                                    'responses': len(handler.responses), 'errors': len(handler.errors),
+                                    'retries': handler.retries}
+
+    return results
+
+
+def bench_html_draw(runs):
+    """
+    :param runs: int
+    :return: dict, summarize()
+    """
+    data = json.loads(read_fixture(os.path.join(TESTS, 'example_org_data.json')))
+
+    samples = []
+    with tempfile.TemporaryDirectory() as path:
+        for _ in range(runs):
+            start = time.perf_counter()
+            htmldrawer.html_draw(data, path)
+            samples.append(time.perf_counter() - start)
+
+    return summarize(samples)
+
+
+def bench_draw_report(runs):
+    """
+    Time htmldrawer.draw_report() on a report that is already current, the cost of reopening a saved report.
+
+    :param runs: int
+    :return: dict, summarize()
+    """
+    samples = []
+    with tempfile.TemporaryDirectory() as path:
+        with open(path + '/data.json', 'wb') as f:
+            f.write(read_fixture(os.path.join(TESTS, 'example_org_data.json'), binary=True))
+        htmldrawer.draw_report(path)
+
+        for _ in range(runs):
+            start = time.perf_counter()
+            htmldrawer.draw_report(path)
+            samples.append(time.perf_counter() - start)
+
+    return summarize(samples)
+
+
+def medians(results, prefix=''):
+    """
+    :param results: dict, results or part of them
+    :param prefix: str
+    :return: dict, {'path/to/metric': float}, every median and requests_per_second in results
+    """
+    found = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            found.update(medians(value, '%s%s/' % (prefix, key)))
+        elif key in ['median', 'requests_per_second']:
+            found[prefix + key] = value
+    return found
+
+
+def compare(previous, current):
+    """
+    Print the medians of two results side by side.
+
+    :param previous: dict
+    :param current: dict
+    :return: None
+    """
+    old, new = medians(previous), medians(current)
+    print('%-60s %12s %12s %9s' % ('', 'previous', 'current', 'change'))
+    for path in sorted(set(old) & set(new)):
+        change = (new[path] - old[path]) / old[path] * 100 if old[path] else 0
+        print('%-60s %12.2f %12.2f %+8.1f%%' % (path, old[path], new[path], change))
+
+
+def main(args):
+    """
+    :param args: argparse.Namespace
+    :return: dict, results
+    """
+    results = {
+        'created_at': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+    }
+
+    with FixtureServer(args.latency, args.jitter, args.error_rate, args.error_status, args.seed) as server:
+        with stubbed_lookups(args.whois_latency, args.dns_latency):
+            results['infogetter'] = {
+                'sequential': bench_infogetter(server, args.runs, concurrent=False),
+                'concurrent': bench_infogetter(server, args.runs, concurrent=True),
+            }
+        results['threaded_request_handler'] = bench_threaded(server, args.threads, args.urls)
+
+    results['html_draw'] = bench_html_draw(args.draw_runs)
+    results['draw_report_current'] = bench_draw_report(args.draw_runs)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline end to end benchmarks.')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='InfoGetter.run() calls per mode')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.005, help='seconds latency varies by')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests failing, 0 to 1')
+    parser.add_argument('--error-status', type=int, default=TOO_MANY_REQUESTS, help='status of failing requests')
+    parser.add_argument('--whois-latency', type=float, default=0.2, help='seconds per whois lookup')
+    parser.add_argument('--dns-latency', type=float, default=0.01, help='seconds per DNS lookup')
+    parser.add_argument('--threads', type=int, nargs='+', default=DEFAULT_THREADS, help='thread counts to time')
+    parser.add_argument('--urls', type=int, default=DEFAULT_URLS, help='urls per ThreadedRequestHandler')
+    parser.add_argument('--draw-runs', type=int, default=DEFAULT_DRAW_RUNS, help='html_draw() calls')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the latency and error draws')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='results file')
+    parser.add_argument('--compare', default=None, help='previous results file')
+    arguments = parser.parse_args()
+
+    bench_results = main(arguments)
+
+    with open(arguments.output, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(bench_results, indent=True))
+
+    for mode, mode_results in bench_results['infogetter'].items():
+        print('InfoGetter.run() %s: %.1fms median, %s failed' % (mode, mode_results['total'].get('median', 0),
+                                                               mode_results['failed_runs']))
+        for field, field_results in mode_results['collectors'].items():
+            print('    %-14s %8.1fms median' % (field, field_results.get('median', 0)))
+    for thread_num, thread_results in bench_results['threaded_request_handler'].items():
+        print('ThreadedRequestHandler %3s threads: %.0f requests/s' % (thread_num,
+                                                                     thread_results['requests_per_second']))
+    print('html_draw(): %.2fms median' % bench_results['html_draw']['median'])
+    print('draw_report() of a current report: %.2fms median' % bench_results['draw_report_current']['median'])
+    print('Saved to %s' % arguments.output)
+
+    if arguments.compare:
+        with open(arguments.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), bench_results)
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.robots import parse_robots
+
+"""
+Times helpers.robots over a synthetic robots.txt: parsing it, compiling its rules and checking paths against them.
+
+Usage:
+    'python benchmarks/bench_robots.py [RULES] [PATHS]'
+    RULES (OPTIONAL): rules in the robots.txt, defaults at 1000
+    PATHS (OPTIONAL): paths checked, defaults at 100000
+"""
+
+DEFAULT_RULES = 1000
+DEFAULT_PATHS = 100000
+
+
+def synthetic_robots(rules):
+    """
+    :param rules: int
+    :return: str
+    """
+    lines = ['User-agent: *']
+    for i in range(rules):
+        if i % 10 == 0:
+            lines.append('Disallow: /*/private-%s/*.json$' % i)
+        elif i % 3 == 0:
+            lines.append('Allow: /section-%s/public/' % i)
+        else:
+            lines.append('Disallow: /section-%s/' % i)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    n_rules = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RULES
+    n_paths = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PATHS
+
+    text = synthetic_robots(n_rules)
+    paths = ['/section-%s/%s/page-%s.json' % (random.randrange(n_rules), random.choice(['public', 'private-10']), i)
+             for i in range(n_paths)]
+
+    start = time.perf_counter()
+    robots = parse_robots(text)
+    parsed = time.perf_counter()
+    robots.can_fetch('Otherbot', '/')
+    compiled = time.perf_counter()
+    for path in paths:
+        robots.can_fetch('Otherbot', path)
+    checked = time.perf_counter()
+
+    print('parse: %.3fs, compile: %.3fs, %s rules' % (parsed - start, compiled - parsed, n_rules))
+    print('check: %.3fs, %.0f paths/s' % (checked - compiled, n_paths / (checked - compiled)))
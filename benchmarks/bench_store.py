@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.report_store import DirectoryStore, SqliteStore
+
+"""
+Times the helpers.report_store backends over synthetic reports, copies of tests/example_org_data.json under different
+urls, each with a map image drawn out of a small pool as many domains share a location: saving them, checking they
+exist, listing them, loading them, and the space they take.
+
+Usage:
+    'python benchmarks/bench_store.py [REPORTS] [IMAGES]'
+    REPORTS (OPTIONAL): reports saved, defaults at 2000
+    IMAGES (OPTIONAL): distinct map images among them, defaults at 50
+"""
+
+DEFAULT_REPORTS = 2000
+DEFAULT_IMAGES = 50
+IMAGE_SIZE = 40 * 1024
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests')
+
+
+def disk_usage(path):
+    """
+    :param path: str, file or directory, a SQLite file counts along with its write-ahead log
+    :return: tuple, (bytes, files)
+    """
+    if os.path.isfile(path):
+        files = [name for name in [path, path + '-wal'] if os.path.isfile(name)]
+        return sum(os.path.getsize(name) for name in files), len(files)
+
+    size = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            size += os.path.getsize(os.path.join(root, name))
+            files += 1
+    return size, files
+
+
+def bench_store(store, location, reports, images):
+    """
+    :param store: ReportStore
+    :param location: str, path it saves to
+    :param reports: list of (url, data)
+    :param images: list of bytes
+    :return: dict, {operation: microseconds per report}, plus 'bytes' and 'files'
+    """
+    results = {}
+    keys = [store.key(url) for url, _ in reports]
+
+    start = time.perf_counter()
+    for i, (key, (_, data)) in enumerate(zip(keys, reports)):
+        store.save(key, data)
+        store.save_image(key, 'location.jpg', images[i % len(images)])
+    results['save'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        store.exists(key)
+    results['exists'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.keys()
+    results['keys'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys:
+        store.load(key)
+    results['load'] = time.perf_counter() - start
+
+    results = {operation: seconds / len(reports) * 1000000 for operation, seconds in results.items()}
+    results['bytes'], results['files'] = disk_usage(location)
+    return results
+
+
+if __name__ == '__main__':
+    n_reports = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPORTS
+    n_images = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_IMAGES
+
+    with open(os.path.join(TESTS, 'example_org_data.json'), 'r', encoding='utf-8') as f:
+        example = json.load(f)
+
+    synthetic = [('https://www.example%s.org/' % i, dict(example, url='example%s.org' % i)) for i in range(n_reports)]
+    map_images = [os.urandom(IMAGE_SIZE) for _ in range(n_images)]
+    print('%s reports, %s distinct images of %s KB' % (n_reports, n_images, IMAGE_SIZE // 1024))
+
+    with tempfile.TemporaryDirectory() as path:
+        os.mkdir(path + '/output')
+        stores = [('directory', DirectoryStore(path + '/output'), path + '/output'),
+                  ('sqlite', SqliteStore(path + '/reports.sqlite'), path + '/reports.sqlite')]
+
+        for name, report_store, store_location in stores:
+            timings = bench_store(report_store, store_location, synthetic, map_images)
+            print('%-10s save %7.1fus  exists %6.1fus  keys %5.2fus  load %6.1fus  per report, %6.1f MB in %s files' %
+                  (name, timings['save'], timings['exists'], timings['keys'], timings['load'],
+                   timings['bytes'] / 1024 / 1024, timings['files']))
+
+        stores[1][1].close()
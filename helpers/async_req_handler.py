@@ -0,0 +1,419 @@
+import os
+import asyncio
+import json
+import ssl
+import time
+
+import aiohttp
+
+from helpers.req_handler import GET, HEAD, PARTIAL_CONTENT, DEFAULT_CHUNK_SIZE, DEFAULT_POOL_MAXSIZE, \
+    HOST_RATE_LIMITER, Download, backoff_delay, declared_too_large, InvalidURL, ConnectivityError, InvalidStatusCode, \
+    NoValidationString, ContainsErrorString, ResponseTooLarge
+from helpers.metrics import REQUEST_METRICS
+
+
+# v 0.0.1
+
+
+DEFAULT_CONCURRENCY = 100  # Requests in flight at once, across every host
+
+
+class AsyncResponse(object):
+    """
+    Class that holds a fully read aiohttp response, exposing the same attributes InfoGetter uses out of request's
+    ResponseObject
+    """
+    def __init__(self, url, status_code, headers, content, encoding):
+        """
+        :param url: string, final url after redirects
+        :param status_code: integer
+        :param headers: dictionary
+        :param content: bytes
+        :param encoding: string or None
+        """
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        """
+        Decoded as utf-8 when the charset is missing or one Python doesn't know.
+
+        :return: string
+        """
+        try:
+            return self.content.decode(self.encoding or 'utf-8', errors='replace')
+        except LookupError:
+            return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        """
+        :return: the decoded json body
+        """
+        return json.loads(self.text)
+
+    def close(self):
+        """
+        Nothing to release, the body is already read.
+
+        :return: None
+        """
+        pass
+
+
+class AsyncStreamResponse(object):
+    """
+    Class that holds an aiohttp response whose body is still unread, to be consumed in chunks and closed by the caller
+    """
+    def __init__(self, response):
+        """
+        :param response: aiohttp.ClientResponse
+        """
+        self.url = str(response.url)
+        self.status_code = response.status
+        self.headers = response.headers
+        self.encoding = response.charset
+
+        self._response = response
+
+    async def iter_content(self, chunk_size):
+        """
+        :param chunk_size: integer, maximum bytes per chunk
+        :return: async generator of bytes
+        """
+        async for chunk in self._response.content.iter_chunked(chunk_size):
+            yield chunk
+
+    def close(self):
+        """
+        Close the connection, dropping whatever is left of the body.
+
+        :return: None
+        """
+        self._response.close()
+
+
+class AsyncRequestHandler(object):
+    """
+    asyncio counterpart to RequestHandler and ThreadedRequestHandler. Executes a request over a list of links, keeping
+    up to concurrency requests in flight on a single event loop instead of one thread each.
+    """
+    def __init__(self, url_list, request_data, request_error_data, concurrency=DEFAULT_CONCURRENCY, max_passes=1,
+                 sleep_pass=0, limit_per_host=DEFAULT_POOL_MAXSIZE, rate_limiter=None, metrics=None):
+        """
+        request_data.files is not supported.
+
+        :param url_list: list of strings
+        :param request_data: RequestData object
+        :param request_error_data: RequestErrorData object
+        :param concurrency: integer, the maximum number of requests in flight
+        :param max_passes: integer, the number of passes over the url list before returning
+        :param sleep_pass: integer, the time to sleep between passes, 0 by default.
+        :param limit_per_host: integer, the maximum number of connections per host
+        :param rate_limiter: RateLimiter object, HOST_RATE_LIMITER if None
+        :param metrics: RequestMetrics object to record requests in, REQUEST_METRICS if None
+        """
+        self.url_list = url_list
+        self.request_data = request_data
+        self.request_error_data = request_error_data
+
+        self.concurrency = concurrency
+        self.max_passes = max_passes
+        self.sleep_pass = sleep_pass
+        self.limit_per_host = limit_per_host
+        self.rate_limiter = rate_limiter if rate_limiter else HOST_RATE_LIMITER
+        self.metrics = metrics if metrics else REQUEST_METRICS
+
+        self.responses = []
+        self.errors = []
+
+        self._session = None
+        self._semaphore = None
+
+    async def run(self, n_pass=0):
+        """
+        Request every url in self.url_list, then retry the ones in self.errors up to self.max_passes times.
+
+        :param n_pass: integer, takes count of recursive calls
+        :return: None
+        """
+        url_list = self.url_list if n_pass == 0 else [err['url'] for err in self.errors]
+        self.errors = []
+
+        await asyncio.gather(*[self._handle_url(url) for url in url_list])
+
+        if len(self.errors) > 0 and n_pass < self.max_passes:
+            await asyncio.sleep(self.sleep_pass)
+            return await self.run(n_pass=n_pass + 1)
+
+    async def fetch(self, url, stream=False):
+        """
+        Performs a single request and error checks the response, without touching self.url_list or self.responses.
+
+        If stream is True, an AsyncStreamResponse is returned instead, which the caller has to close once done with it.
+        Validation strings are not checked on streamed responses.
+
+        Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString
+
+        :param url: string
+        :param stream: boolean
+        :return: AsyncResponse or AsyncStreamResponse instance, or None if the error was appended to self.errors
+        """
+        return await self._validate_url(url, stream=stream)
+
+    async def download(self, url, max_bytes, path=None, truncate=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Same as RequestHandler.download(). The file is written from the event loop's thread, a chunk at a time.
+
+        Raise ConnectivityError, InvalidStatusCode, ResponseTooLarge
+
+        :param url: string
+        :param max_bytes: integer
+        :param path: string or None
+        :param truncate: boolean
+        :param chunk_size: integer
+        :return: Download instance, or None if the error was appended to self.errors
+        """
+        response_object = await self._validate_url(url, stream=True)
+        if response_object is None:
+            return None
+
+        chunks = []
+        size = 0
+        truncated = False
+        complete = False
+        f = open(path + '.tmp', 'wb') if path else None
+
+        try:
+            if not truncate and declared_too_large(response_object, max_bytes):
+                raise ResponseTooLarge(url)
+
+            async for chunk in response_object.iter_content(chunk_size):
+                if size + len(chunk) > max_bytes:
+                    if not truncate:
+                        raise ResponseTooLarge(url)
+                    chunk = chunk[:max_bytes - size]
+                    truncated = True
+
+                if f:
+                    f.write(chunk)
+                else:
+                    chunks.append(chunk)
+                size += len(chunk)
+
+                if truncated:
+                    break
+
+            complete = True
+
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            raise ConnectivityError(url)
+
+        finally:
+            self.metrics.record_bytes(url, size)
+            response_object.close()
+            if f:
+                f.close()
+                if complete:
+                    os.replace(path + '.tmp', path)
+                else:
+                    os.remove(path + '.tmp')
+
+        return Download(response_object.url, response_object.status_code, response_object.headers,
+                        response_object.encoding, None if path else b''.join(chunks), path, size, truncated)
+
+    async def probe(self, url):
+        """
+        Same as RequestHandler.probe()
+
+        Raises InvalidURL and ConnectivityError
+
+        :param url: string
+        :return: bool
+        """
+        response_object = await self._request_wrapper(url, stream=True, method=HEAD)
+        response_object.close()
+        if response_object.status_code in self.request_error_data.expected_status_codes:
+            return True
+
+        response_object = await self._request_wrapper(url, stream=True, method=GET, headers={'Range': 'bytes=0-0'})
+        response_object.close()
+        return response_object.status_code in self.request_error_data.expected_status_codes + [PARTIAL_CONTENT]
+
+    async def close(self):
+        """
+        Close the underlying aiohttp session and its connections.
+
+        :return: None
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """
+        The aiohttp session has to be created from within the running event loop, so it is built on first use.
+
+        :return: aiohttp.ClientSession instance
+        """
+        if self._session is None:
+            ssl_context = True
+            if self.request_data.cert:
+                ssl_context = ssl.create_default_context()
+                if isinstance(self.request_data.cert, tuple):
+                    ssl_context.load_cert_chain(*self.request_data.cert)
+                else:
+                    ssl_context.load_cert_chain(self.request_data.cert)
+
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host,
+                                             ssl=ssl_context)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.request_data.headers,
+                                                  cookies=self.request_data.cookies)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        return self._session
+
+    async def _request_wrapper(self, url, stream=False, method=None, headers=None):
+        """
+        Performs the request with the arguments in self.request_data once self.rate_limiter allows it, reading the
+        whole body unless stream is True. A streamed response gives its slot in self._semaphore back once the headers
+        are in. The request is recorded in self.metrics.
+
+        Raises InvalidURL and ConnectivityError
+
+        :param url: string
+        :param stream: boolean
+        :param method: GET, POST or HEAD, overrides self.request_data.method if not None
+        :param headers: dictionary, added to the session headers
+        :return: AsyncResponse or AsyncStreamResponse instance
+        """
+        session = self._get_session()
+        await asyncio.sleep(self.rate_limiter.reserve(url))
+
+        auth = None
+        if self.request_data.auth:
+            auth = aiohttp.BasicAuth(*self.request_data.auth)
+
+        proxy = None
+        if self.request_data.proxies:
+            proxy = self.request_data.proxies.get(url.split(':')[0])
+
+        if stream:
+            # The body is read after this returns, so only a stalled connection times out, as with requests
+            timeout = aiohttp.ClientTimeout(sock_connect=self.request_data.timeout,
+                                            sock_read=self.request_data.timeout)
+        else:
+            timeout = aiohttp.ClientTimeout(total=self.request_data.timeout)
+
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                response = await session.request(method or self.request_data.method, url,
+                                                 data=self.request_data.data, json=self.request_data.json,
+                                                 headers=headers, auth=auth, timeout=timeout,
+                                                 allow_redirects=self.request_data.allow_redirects, proxy=proxy)
+                if stream:
+                    self.metrics.record_request(url, time.perf_counter() - start, response.status)
+                    return AsyncStreamResponse(response)
+
+                async with response:
+                    content = await response.read()
+                    self.metrics.record_request(url, time.perf_counter() - start, response.status, len(content))
+                    return AsyncResponse(str(response.url), response.status, response.headers, content,
+                                         response.charset)
+
+        except aiohttp.InvalidURL:
+            raise InvalidURL(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.metrics.record_request(url, time.perf_counter() - start)
+            raise ConnectivityError(url)
+
+    async def _handle_url(self, url):
+        """
+        Performs a request, then error checks the response, and appends either the AsyncResponse to self.responses, or
+        a dictionary comprising of {'error':Exception, 'url':url, 'response':AsyncResponse} to self.errors
+
+        Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString
+
+        :param url: string
+        :return: None
+        """
+        response_object = await self._validate_url(url)
+        if response_object is not None:
+            self.responses.append(response_object)
+
+    async def _validate_url(self, url, n_try=0, stream=False):
+        """
+        Performs a request, then error checks the response with the same rules as RequestHandler. Returns the
+        AsyncResponse if valid, otherwise appends a dictionary comprising of
+        {'error':Exception, 'url':url, 'response':AsyncResponse} to self.errors and returns None.
+
+        In case of ConnectivityError, or a status code in self.request_error_data.retry_status_codes, the function
+        waits for backoff_delay() and calls itself up to self.request_error_data.error_connection_max_tries times,
+        recording each retry in self.metrics.
+
+        Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString
+
+        :param url: string
+        :param n_try: integer, takes count of recursive calls
+        :param stream: boolean
+        :return: AsyncResponse or AsyncStreamResponse instance or None
+        """
+        try:
+            response_object = await self._request_wrapper(url, stream=stream)
+
+        except ConnectivityError:
+            if self.request_error_data.allow_errors:
+                if n_try < self.request_error_data.error_connection_max_tries:
+                    self.metrics.record_retry(url)
+                    await asyncio.sleep(backoff_delay(n_try, self.request_error_data))
+                    return await self._validate_url(url, n_try=n_try + 1, stream=stream)
+                else:
+                    self.errors.append({'error': ConnectivityError, 'url': url, 'response': None})
+                    return None
+            else:
+                raise ConnectivityError(url)
+
+        # Retry throttled requests
+        if response_object.status_code in self.request_error_data.retry_status_codes:
+            if n_try < self.request_error_data.error_connection_max_tries:
+                response_object.close()
+                self.metrics.record_retry(url)
+                await asyncio.sleep(backoff_delay(n_try, self.request_error_data, response_object))
+                return await self._validate_url(url, n_try=n_try + 1, stream=stream)
+
+        # Validate by status_code
+        if response_object.status_code not in self.request_error_data.expected_status_codes:
+            response_object.close()
+            if self.request_error_data.allow_errors:
+                self.errors.append({'error': InvalidStatusCode, 'url': url, 'response': response_object})
+                return None
+            else:
+                raise InvalidStatusCode(url)
+
+        if stream:
+            return response_object
+
+        # Validate by expected validation str
+        if self.request_error_data.expected_validation_str:
+            if response_object.text.find(self.request_error_data.expected_validation_str) == -1:
+                if self.request_error_data.allow_errors:
+                    self.errors.append({'error': NoValidationString, 'url': url, 'response': response_object})
+                    return None
+                else:
+                    raise NoValidationString(url)
+
+        # Validate by expected error str
+        if self.request_error_data.expected_error_str:
+            if response_object.text.find(self.request_error_data.expected_error_str) != -1:
+                if self.request_error_data.allow_errors:
+                    self.errors.append({'error': ContainsErrorString, 'url': url, 'response': response_object})
+                    return None
+
+                else:
+                    raise ContainsErrorString(url)
+
+        return response_object
@@ -0,0 +1,352 @@
+import re
+import json
+import functools
+
+from helpers.lazy_import import lazy_import, module_available
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+# v 0.0.1
+
+
+ahocorasick = lazy_import('ahocorasick')  # Optional, pyahocorasick, see LiteralMatcher
+builtwith = lazy_import('builtwith')  # Ships the default signature set, see load_signatures()
+
+MATCHER_BACKENDS = ['ahocorasick', 'regex']
+MIN_LITERAL_LENGTH = 3  # Shorter literals are found in about every page, the regex is always run instead
+VERSION_SEPARATOR = '\\;'  # Signatures carry version and confidence tags after it, as in 'nginx(?:/([\d.]+))?\;version:\1'
+
+# Same as builtwith, so the same meta tags are found
+META_RE = re.compile('<meta[^>]*?name=[\'"]([^>]*?)[\'"][^>]*?content=[\'"]([^>]*?)[\'"][^>]*?>', re.IGNORECASE)
+
+# Non ASCII characters re.IGNORECASE matches ASCII letters with, mapped to them before lowering the text prefiltered
+CASE_FOLD = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's', '\u212a': 'k'})
+
+_REPEATS = [sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT] + \
+           ([sre_parse.POSSESSIVE_REPEAT] if hasattr(sre_parse, 'POSSESSIVE_REPEAT') else [])
+
+
+def load_signatures(path=None):
+    """
+    Load a Wappalyzer signature set, {'apps': {name: spec}, 'categories': {id: name}}.
+
+    :param path: str or None, apps.json to load, defaults at the one builtwith ships with
+    :return: dict
+    """
+    if path is None:
+        return builtwith.data
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def default_engine():
+    """
+    FingerprintEngine of the default signature set, compiled on first use.
+
+    :return: FingerprintEngine
+    """
+    return FingerprintEngine(load_signatures())
+
+
+def required_literals(pattern):
+    """
+    Literals one of which is in every text the pattern matches, lowercase, so texts without any of them can skip it.
+
+    :param pattern: str, regex
+    :return: list of str, or None if no literal of MIN_LITERAL_LENGTH is required
+    """
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except (re.error, RecursionError):
+        return None
+
+    literals = _required(parsed)
+    if literals and min(len(literal) for literal in literals) >= MIN_LITERAL_LENGTH:
+        return literals
+    return None
+
+
+def _required(items):
+    """
+    :param items: sre_parse.SubPattern or list of (opcode, argument)
+    :return: list of str, the best alternatives found, or None
+    """
+    candidates = []
+    run = []
+
+    def flush():
+        if run:
+            candidates.append([''.join(run)])
+            del run[:]
+
+    for op, av in items:
+        if op is sre_parse.LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            found = _required(av[-1])
+        elif op is sre_parse.BRANCH:
+            branches = [_required(branch) for branch in av[1]]
+            found = None if None in branches else [literal for branch in branches for literal in branch]
+        elif op in _REPEATS and av[0] >= 1:
+            found = _required(av[2])
+        else:
+            found = None
+
+        if found:
+            candidates.append(found)
+    flush()
+
+    if not candidates:
+        return None
+
+    # The alternatives whose shortest literal is the longest filter the most
+    return max(candidates, key=lambda literals: (min(len(literal) for literal in literals), -len(literals)))
+
+
+def _trie_regex(words):
+    """
+    Regex matching the longest of words at any position, as a trie, so each position tries a branch per character.
+
+    :param words: list of str
+    :return: str
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        group = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        # Greedy, so longer words are tried first
+        return '(?:%s)?' % group if '' in node else group
+
+    return emit(trie)
+
+
+class LiteralMatcher(object):
+    """
+    Class that finds which of a set of literals a text holds, in a single pass over it. Uses an Aho-Corasick automaton
+    if pyahocorasick is installed, else a regex shaped as a trie of the literals, in a lookahead so overlapping
+    literals are all found.
+    """
+    def __init__(self, literals, backend=None):
+        """
+        Raises BackendNotAvailable
+
+        :param literals: iterable of str, lowercase
+        :param backend: str or None, in MATCHER_BACKENDS, defaults at the first one installed
+        """
+        self.literals = sorted(set(literals))
+        if backend is None:
+            backend = 'ahocorasick' if module_available('ahocorasick') else 'regex'
+        elif backend not in MATCHER_BACKENDS or (backend == 'ahocorasick' and not module_available('ahocorasick')):
+            raise BackendNotAvailable(backend)
+        self.backend = backend
+
+        if backend == 'ahocorasick':
+            self._automaton = ahocorasick.Automaton()
+            for literal in self.literals:
+                self._automaton.add_word(literal, literal)
+            if self.literals:
+                self._automaton.make_automaton()
+        else:
+            # The regex only reports the longest literal at each position, the ones inside it are implied
+            self._regex = re.compile('(?=(%s))' % _trie_regex(self.literals)) if self.literals else None
+            self._implied = {literal: [other for other in self.literals if other in literal]
+                             for literal in self.literals}
+
+    def found(self, text):
+        """
+        :param text: str, lowercase
+        :return: set of str, the literals in text
+        """
+        if not self.literals:
+            return set()
+
+        if self.backend == 'ahocorasick':
+            return {literal for _, literal in self._automaton.iter(text)}
+
+        found = set()
+        for longest in {match.group(1) for match in self._regex.finditer(text)}:
+            found.update(self._implied[longest])
+        return found
+
+
+class FingerprintEngine(object):
+    """
+    Class that detects the technologies of a page out of a Wappalyzer signature set, compiled once, giving the same
+    result as builtwith.builtwith().
+
+    Every signature regex is compiled once. The literals they require (see required_literals()) are looked for in the
+    HTML by a single LiteralMatcher pass, and only the regexes whose literals were found, or that require none, are
+    run. Headers and meta tags are read once and only checked against the signatures naming them.
+    """
+    def __init__(self, signatures, backend=None):
+        """
+        :param signatures: dict, see load_signatures()
+        :param backend: str or None, LiteralMatcher backend
+        """
+        self.apps = signatures['apps']
+        self.categories = signatures['categories']
+
+        self._regexes = []  # Compiled once per distinct pattern, see _pattern()
+        self._pattern_ids = {}
+        self._always = set()  # Patterns with no required literal
+        self._by_literal = {}  # {literal: [pattern id]}
+
+        self._url = []  # [(app, [pattern id])], in signature order, as every list below
+        self._headers = []  # [(app, [(lowercase header, pattern id)])]
+        self._html = []  # [(app, [pattern id])], html and script snippets
+        self._meta = []  # [(app, [(meta name, pattern id)])]
+
+        for app, spec in self.apps.items():
+            if 'url' in spec:
+                self._url.append((app, [self._pattern(spec['url'], prefilter=False)]))
+            if spec.get('headers'):
+                self._headers.append((app, [(name.lower(), self._pattern(value, prefilter=False))
+                                            for name, value in spec['headers'].items()]))
+
+            snippets = []
+            for key in ['html', 'script']:
+                value = spec.get(key, [])
+                snippets += value if isinstance(value, list) else [value]
+            if snippets:
+                self._html.append((app, [self._pattern(snippet) for snippet in snippets]))
+
+            if spec.get('meta'):
+                self._meta.append((app, [(name, self._pattern(value, prefilter=False))
+                                         for name, value in spec['meta'].items()]))
+
+        self.matcher = LiteralMatcher(self._by_literal, backend)
+
+    def detect(self, headers=None, html=None, url=''):
+        """
+        Same as builtwith.builtwith(url, headers, html), without ever downloading anything: categories, and the
+        technologies in them, are in the same order.
+
+        :param headers: dict or None, response headers, matched case insensitively
+        :param html: str, bytes or None
+        :param url: str
+        :return: dict, {category: [technology]}
+        """
+        techs = {}
+        regexes = self._regexes
+
+        for app, pattern_ids in self._url:
+            if regexes[pattern_ids[0]].search(url):
+                self._add_app(techs, app)
+
+        if headers:
+            lowered = {name.lower(): value for name, value in headers.items()}
+            for app, checks in self._headers:
+                if all(lowered.get(name) and regexes[pattern_id].search(lowered[name]) for name, pattern_id in checks):
+                    self._add_app(techs, app)
+
+        if html:
+            if isinstance(html, bytes):
+                html = html.decode()
+
+            candidates = self._candidates(html)
+            results = {}
+            for app, pattern_ids in self._html:
+                for pattern_id in pattern_ids:
+                    if pattern_id in candidates:
+                        if pattern_id not in results:
+                            results[pattern_id] = regexes[pattern_id].search(html) is not None
+                        if results[pattern_id]:
+                            self._add_app(techs, app)
+                            break
+
+            metas = dict(META_RE.findall(html))
+            if metas:
+                for app, checks in self._meta:
+                    for name, pattern_id in checks:
+                        if name in metas and regexes[pattern_id].search(metas[name]):
+                            self._add_app(techs, app)
+                            break
+
+        return techs
+
+    def _candidates(self, html):
+        """
+        :param html: str
+        :return: set of int, ids of the patterns that might match html
+        """
+        if not html.isascii():
+            html = html.translate(CASE_FOLD)
+
+        candidates = set(self._always)
+        for literal in self.matcher.found(html.lower()):
+            candidates.update(self._by_literal[literal])
+        return candidates
+
+    def _pattern(self, signature, prefilter=True):
+        """
+        Compile a signature, once per distinct one.
+
+        :param signature: str, regex, with its tags after VERSION_SEPARATOR
+        :param prefilter: bool, index its required literals, for the patterns run on the HTML
+        :return: int, pattern id
+        """
+        source = signature.split(VERSION_SEPARATOR)[0]
+        pattern_id = self._pattern_ids.get((source, prefilter))
+        if pattern_id is not None:
+            return pattern_id
+
+        pattern_id = len(self._regexes)
+        self._regexes.append(re.compile(source, re.IGNORECASE))
+        self._pattern_ids[(source, prefilter)] = pattern_id
+
+        if prefilter:
+            literals = required_literals(source)
+            if literals is None:
+                self._always.add(pattern_id)
+            else:
+                for literal in literals:
+                    self._by_literal.setdefault(literal, []).append(pattern_id)
+
+        return pattern_id
+
+    def _add_app(self, techs, app):
+        """
+        Add app, and the apps it implies, to techs, under each of its categories, as builtwith.add_app() does.
+
+        :param techs: dict
+        :param app: str
+        :return: None
+        """
+        spec = self.apps[app]
+        implies = spec.get('implies', [])
+        implies = implies if isinstance(implies, list) else [implies]
+
+        for category_id in spec['cats']:
+            category = self.categories[str(category_id)]
+            technologies = techs.setdefault(category, [])
+            if app not in technologies:
+                technologies.append(app)
+                for implied in implies:
+                    self._add_app(techs, implied)
+
+                # builtwith reuses the loop variable, so the next categories get the last app implied instead, e.g.
+                # WordPress implies PHP, and PHP is listed under blogs too. Saved reports already hold it this way
+                if implies:
+                    app = implies[-1]
+
+
+# Exceptions
+class BackendNotAvailable(Exception):
+    pass
@@ -0,0 +1,369 @@
+import os
+import sys
+import csv
+import json
+import mmap
+import array
+import bisect
+import socket
+import struct
+import ipaddress
+import threading
+
+
+# v 0.0.1
+
+
+MAGIC = b'BCKGGEO2'
+HEADER = struct.Struct('<8sIII4x')  # Magic, IPv4 ranges, IPv6 ranges, locations, padded to ALIGNMENT
+ALIGNMENT = 8  # Every array starts at a multiple of it, so it can be cast in place
+LOW_64 = 2 ** 64 - 1
+IPV4_MAPPED = b'\x00' * 10 + b'\xff\xff'  # Prefix of IPv4 addresses mapped into IPv6, ::ffff:0:0/96
+
+# Fields of a location, same as the extreme-ip-lookup.com API answers with, see GeoDatabase.lookup()
+FIELDS = ['businessName', 'businessWebsite', 'city', 'continent', 'country', 'countryCode', 'ipName', 'ipType', 'isp',
+          'lat', 'lon', 'org', 'region']
+OPTIONAL_FIELDS = ['asn']  # Only in the lookups of the locations that have them, the API has none
+
+# CSV headers, lowercase, read as each field, besides the names in FIELDS themselves
+COLUMN_ALIASES = {
+    'start': ['start', 'ip_start', 'ip_from', 'range_start', 'first'],
+    'end': ['end', 'ip_end', 'ip_to', 'range_end', 'last'],
+    'network': ['network', 'cidr'],
+    'countryCode': ['country_code', 'country_iso_code'],
+    'country': ['country_name'],
+    'region': ['region_name', 'stateprov', 'subdivision', 'state'],
+    'city': ['city_name'],
+    'lat': ['latitude'],
+    'lon': ['longitude'],
+    'org': ['organization', 'organization_name'],
+    'continent': ['continent_code', 'continent_name'],
+    'asn': ['as_number', 'autonomous_system_number'],
+}
+
+# Columns of a CSV without header, as DB-IP's free "IP to City Lite" comes
+DBIP_CITY_LITE = ['start', 'end', 'continent', 'countryCode', 'region', 'city', 'lat', 'lon']
+
+_DATABASES = {}  # {path: GeoDatabase}, see open_geo_database()
+_databases_lock = threading.Lock()
+
+
+def compile_database(source, path):
+    """
+    Compile a CSV of IP ranges and their locations into a database GeoDatabase opens, replacing it atomically.
+
+    Every row is a range, as start and end addresses (or integers, as IP2Location gives them) or as a network in CIDR
+    notation, then the location fields, named by the header (see COLUMN_ALIASES). A CSV without header is read as
+    DB-IP's "IP to City Lite". Ranges overlapping a previous one are skipped, and contiguous ranges of the same
+    location are merged.
+
+    Raises InvalidSource
+
+    :param source: str, CSV file
+    :param path: str, database file
+    :return: dict, {'ipv4': int, 'ipv6': int, 'locations': int, 'skipped': int}
+    """
+    ranges = {4: [], 6: []}
+    location_ids = {}
+    skipped = 0
+
+    with open(source, 'r', encoding='utf-8', newline='') as f:
+        rows = csv.reader(f)
+        columns = _columns(next(rows, None))
+        if columns is None:
+            columns = DBIP_CITY_LITE
+            f.seek(0)
+            rows = csv.reader(f)
+        elif 'network' not in columns and not {'start', 'end'}.issubset(columns):
+            raise InvalidSource(source)
+
+        for row in rows:
+            if not row or row[0].startswith('#'):
+                continue
+            values = dict(zip(columns, row))
+
+            try:
+                version, first, last = _row_range(values)
+            except ValueError:
+                skipped += 1
+                continue
+
+            location = tuple(values.get(field, '').strip() for field in FIELDS + OPTIONAL_FIELDS)
+            location_id = location_ids.setdefault(location, len(location_ids))
+            ranges[version].append((first, last, location_id))
+
+    tables = {}
+    for version in [4, 6]:
+        tables[version], overlapping = _merge(ranges[version])
+        skipped += overlapping
+
+    locations = [json.dumps(location, separators=(',', ':')).encode('utf-8') for location in location_ids]
+    _write(path, tables, locations)
+
+    return {'ipv4': len(tables[4]), 'ipv6': len(tables[6]), 'locations': len(locations), 'skipped': skipped}
+
+
+def _columns(header):
+    """
+    :param header: list of str or None, first row of the CSV
+    :return: list of str, the field each column is read as, or None if the row isn't a header
+    """
+    if not header:
+        return None
+    try:
+        _address(header[0])
+        return None
+    except ValueError:
+        pass
+
+    names = {field.lower(): field for field in FIELDS + OPTIONAL_FIELDS}
+    for field, aliases in COLUMN_ALIASES.items():
+        names.update({alias: field for alias in aliases})
+    return [names.get(column.strip().lower(), column) for column in header]
+
+
+def _row_range(values):
+    """
+    Raises ValueError
+
+    :param values: dict, {column: value}
+    :return: tuple, (version, first address, last address), addresses as integers
+    """
+    if values.get('network'):
+        network = ipaddress.ip_network(values['network'].strip(), strict=False)
+        return network.version, int(network.network_address), int(network.broadcast_address)
+
+    first = _address(values['start'])
+    last = _address(values['end'])
+    if first.version != last.version or int(first) > int(last):
+        raise ValueError(values)
+    return first.version, int(first), int(last)
+
+
+def _address(value):
+    """
+    Raises ValueError
+
+    :param value: str, address or integer
+    :return: ipaddress.IPv4Address or ipaddress.IPv6Address
+    """
+    value = value.strip()
+    if value.isdigit():
+        value = int(value)
+    return ipaddress.ip_address(value)
+
+
+def _merge(ranges):
+    """
+    :param ranges: list of (first, last, location id)
+    :return: tuple, (list of (first, last, location id), sorted and not overlapping, ranges skipped)
+    """
+    merged = []
+    skipped = 0
+    for first, last, location_id in sorted(ranges):
+        if merged and first <= merged[-1][1]:
+            skipped += 1
+        elif merged and first == merged[-1][1] + 1 and location_id == merged[-1][2]:
+            merged[-1] = (merged[-1][0], last, location_id)
+        else:
+            merged.append((first, last, location_id))
+    return merged, skipped
+
+
+def _write(path, tables, locations):
+    """
+    Layout, after HEADER, as arrays of little endian integers: the first addresses, last addresses and location ids of
+    the IPv4 ranges, then of the IPv6 ranges, their addresses split in the high and low 64 bits. Then the offset of
+    every location, plus the end of the last one, and the locations, as JSON lists of FIELDS and OPTIONAL_FIELDS.
+
+    :param path: str
+    :param tables: dict, {version: list of (first, last, location id)}
+    :param locations: list of bytes
+    :return: None
+    """
+    offsets = [0]
+    for location in locations:
+        offsets.append(offsets[-1] + len(location))
+
+    ipv4, ipv6 = tables[4], tables[6]
+    arrays = [
+        ('I', [first for first, _, _ in ipv4]),
+        ('I', [last for _, last, _ in ipv4]),
+        ('I', [location_id for _, _, location_id in ipv4]),
+        ('Q', [first >> 64 for first, _, _ in ipv6]),
+        ('Q', [first & LOW_64 for first, _, _ in ipv6]),
+        ('Q', [last >> 64 for _, last, _ in ipv6]),
+        ('Q', [last & LOW_64 for _, last, _ in ipv6]),
+        ('I', [location_id for _, _, location_id in ipv6]),
+        ('I', offsets),
+    ]
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(ipv4), len(ipv6), len(locations)))
+        for typecode, values in arrays:
+            table = array.array(typecode, values)
+            if sys.byteorder == 'big':
+                table.byteswap()
+            f.write(table.tobytes())
+            f.write(b'\x00' * (-f.tell() % ALIGNMENT))
+        f.write(b''.join(locations))
+
+    os.replace(path + '.tmp', path)
+
+
+def open_geo_database(path):
+    """
+    Get the GeoDatabase at path. A single instance is kept per path, so every InfoGetter shares its mapping.
+
+    :param path: str
+    :return: GeoDatabase
+    """
+    with _databases_lock:
+        database = _DATABASES.get(path)
+        if database is None:
+            database = _DATABASES[path] = GeoDatabase(path)
+        return database
+
+
+class GeoDatabase(object):
+    """
+    Class that looks the location of IPs up on a database compiled by compile_database(), memory mapped, so it's read
+    on demand and shared by every process using it, by binary search over the sorted ranges of the IP's version. The
+    arrays are cast in place, so bisect runs over them without copying nor decoding them.
+    """
+    def __init__(self, path):
+        """
+        Raises InvalidDatabase
+
+        :param path: str
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty file
+                raise InvalidDatabase(path)
+
+        if len(self._map) < HEADER.size or self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise InvalidDatabase(path)
+        _, ipv4, ipv6, n_locations = HEADER.unpack_from(self._map, 0)
+        self.counts = {4: ipv4, 6: ipv6}
+
+        self._view = memoryview(self._map)
+        self._arrays = []
+        self._offset = HEADER.size
+        try:
+            self._ipv4 = [self._array('I', ipv4) for _ in range(3)]  # Firsts, lasts, location ids
+            self._ipv6 = [self._array('Q', ipv6) for _ in range(4)] + [self._array('I', ipv6)]
+            self._offsets = self._array('I', n_locations + 1)
+        except ValueError:
+            self.close()
+            raise InvalidDatabase(path)
+        self._locations = self._offset
+
+    def lookup(self, ip):
+        """
+        :param ip: str
+        :return: dict, the same fields the extreme-ip-lookup.com API answers with, plus the OPTIONAL_FIELDS the
+        location has, or None if no range holds ip
+        """
+        try:
+            packed = socket.inet_pton(socket.AF_INET6 if ':' in ip else socket.AF_INET, ip)
+        except (OSError, TypeError, ValueError):
+            return None
+        if len(packed) == 16 and packed.startswith(IPV4_MAPPED):
+            packed = packed[12:]
+        address = int.from_bytes(packed, 'big')
+
+        if len(packed) == 4:
+            firsts, lasts, location_ids = self._ipv4
+            i = bisect.bisect_right(firsts, address) - 1
+            if i < 0 or lasts[i] < address:
+                return None
+        else:
+            i = self._find_ipv6(address >> 64, address & LOW_64)
+            if i is None:
+                return None
+            location_ids = self._ipv6[4]
+
+        location = self._location(location_ids[i])
+        geo_data = dict(zip(FIELDS, location))
+        geo_data.update({field: value for field, value in zip(OPTIONAL_FIELDS, location[len(FIELDS):]) if value})
+        geo_data.update({'query': socket.inet_ntop(socket.AF_INET if len(packed) == 4 else socket.AF_INET6, packed),
+                         'status': 'success'})
+        return geo_data
+
+    def stats(self):
+        """
+        :return: dict, {'ipv4': int, 'ipv6': int, 'bytes': int}
+        """
+        return {'ipv4': self.counts[4], 'ipv6': self.counts[6], 'bytes': len(self._map)}
+
+    def close(self):
+        """
+        :return: None
+        """
+        for view in reversed(self._arrays):
+            view.release()
+        self._view.release()
+        self._map.close()
+
+    def _array(self, typecode, count):
+        """
+        Raises ValueError, if the file is too short
+
+        :param typecode: str, 'I' or 'Q'
+        :param count: int
+        :return: memoryview, of the next array of the file, or array.array on big endian hosts
+        """
+        size = array.array(typecode).itemsize * count
+        if self._offset + size > len(self._map):
+            raise ValueError(self._offset)
+
+        view = self._view[self._offset:self._offset + size]
+        self._arrays.append(view)
+        self._offset += size + -size % ALIGNMENT
+
+        if sys.byteorder == 'big':
+            table = array.array(typecode, view)
+            table.byteswap()
+            return table
+        cast = view.cast(typecode)
+        self._arrays.append(cast)
+        return cast
+
+    def _find_ipv6(self, high, low):
+        """
+        Bisect the high 64 bits of the first addresses, then the low ones of the ranges sharing them.
+
+        :param high: int
+        :param low: int
+        :return: int, index of the range holding the address, or None
+        """
+        first_highs, first_lows, last_highs, last_lows, _ = self._ipv6
+        start = bisect.bisect_left(first_highs, high)
+        end = bisect.bisect_right(first_highs, high, start)
+        i = bisect.bisect_right(first_lows, low, start, end) - 1
+        if i < start:
+            i = start - 1
+        if i < 0 or (last_highs[i], last_lows[i]) < (high, low):
+            return None
+        return i
+
+    def _location(self, location_id):
+        """
+        :param location_id: int
+        :return: list of str, values of FIELDS and OPTIONAL_FIELDS
+        """
+        return json.loads(self._map[self._locations + self._offsets[location_id]:
+                                    self._locations + self._offsets[location_id + 1]])
+
+
+# Exceptions
+class InvalidSource(Exception):
+    pass
+
+
+class InvalidDatabase(Exception):
+    pass
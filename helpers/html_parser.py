@@ -0,0 +1,216 @@
+import functools
+
+from helpers.lazy_import import lazy_import, module_available
+
+# Imported once a backend parses its first page, lxml and selectolax are optional
+bs4 = lazy_import('bs4')
+lxml_html = lazy_import('lxml.html')
+lexbor = lazy_import('selectolax.lexbor')
+
+
+# v 0.0.1
+
+
+RESULT_STATS_ID = 'result-stats'
+SEARCH_ID = 'search'
+
+
+class SerpParser(object):
+    """
+    Class that pulls the few elements InfoGetter reads out of a Google results page. Each backend subclasses it, and
+    they all return the same values over tests/serp_corpus.
+    """
+    name = None
+
+    def result_stats(self, html):
+        """
+        Raises ElementNotFound
+
+        :param html: str
+        :return: str, text of div#result-stats
+        """
+        raise NotImplementedError()
+
+    def first_cite(self, html):
+        """
+        Raises ElementNotFound if there's no div#search or no cite in it
+
+        :param html: str
+        :return: str or None, first text directly under the first cite in div#search
+        """
+        raise NotImplementedError()
+
+    def first_link(self, html):
+        """
+        Raises ElementNotFound if there's no div#search
+
+        :param html: str
+        :return: str or None, href of the first link in div#search, None if there's no link
+        """
+        raise NotImplementedError()
+
+
+class Bs4Parser(SerpParser):
+    """
+    Builds the whole BeautifulSoup html.parser tree, as InfoGetter always did
+    """
+    name = 'bs4'
+
+    def _find_div(self, html, div_id):
+        """
+        :param html: str
+        :param div_id: str
+        :return: bs4.Tag
+        """
+        div = bs4.BeautifulSoup(html, 'html.parser').find('div', {'id': div_id})
+        if div is None:
+            raise ElementNotFound('div#%s' % div_id)
+        return div
+
+    def result_stats(self, html):
+        return self._find_div(html, RESULT_STATS_ID).getText()
+
+    def first_cite(self, html):
+        cite = self._find_div(html, SEARCH_ID).find('cite')
+        if cite is None:
+            raise ElementNotFound('cite')
+        return cite.find(string=True, recursive=False)
+
+    def first_link(self, html):
+        link = self._find_div(html, SEARCH_ID).find('a')
+        return link.get('href') if link is not None else None
+
+
+class StrainerParser(Bs4Parser):
+    """
+    Same as Bs4Parser, only building the tree of the target div
+    """
+    name = 'strainer'
+
+    def _find_div(self, html, div_id):
+        soup = bs4.BeautifulSoup(html, 'html.parser', parse_only=bs4.SoupStrainer('div', {'id': div_id}))
+        div = soup.find('div', {'id': div_id})
+        if div is None:
+            raise ElementNotFound('div#%s' % div_id)
+        return div
+
+
+class LxmlParser(SerpParser):
+    """
+    libxml2's HTML parser, through lxml
+    """
+    name = 'lxml'
+
+    def _find_div(self, html, div_id):
+        """
+        :param html: str
+        :param div_id: str
+        :return: lxml.html.HtmlElement
+        """
+        tree = lxml_html.fromstring(html.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8'))
+        divs = tree.xpath('//div[@id=$div_id][1]', div_id=div_id)
+        if not divs:
+            raise ElementNotFound('div#%s' % div_id)
+        return divs[0]
+
+    def result_stats(self, html):
+        return self._find_div(html, RESULT_STATS_ID).text_content()
+
+    def first_cite(self, html):
+        cites = self._find_div(html, SEARCH_ID).xpath('(.//cite)[1]')
+        if not cites:
+            raise ElementNotFound('cite')
+
+        # Text nodes hang from the element (text) and from its children (tail)
+        for text in [cites[0].text] + [child.tail for child in cites[0]]:
+            if text:
+                return text
+        return None
+
+    def first_link(self, html):
+        links = self._find_div(html, SEARCH_ID).xpath('(.//a)[1]')
+        return links[0].get('href') if links else None
+
+
+class SelectolaxParser(SerpParser):
+    """
+    lexbor's HTML5 parser, through selectolax
+    """
+    name = 'selectolax'
+
+    def _find_div(self, html, div_id):
+        """
+        :param html: str
+        :param div_id: str
+        :return: selectolax.lexbor.LexborNode
+        """
+        div = lexbor.LexborHTMLParser(html).css_first('div[id="%s"]' % div_id)
+        if div is None:
+            raise ElementNotFound('div#%s' % div_id)
+        return div
+
+    def result_stats(self, html):
+        return self._find_div(html, RESULT_STATS_ID).text()
+
+    def first_cite(self, html):
+        cite = self._find_div(html, SEARCH_ID).css_first('cite')
+        if cite is None:
+            raise ElementNotFound('cite')
+
+        for child in cite.iter(include_text=True):
+            if child.tag == '-text':
+                return child.text(deep=False)
+        return None
+
+    def first_link(self, html):
+        link = self._find_div(html, SEARCH_ID).css_first('a')
+        return link.attributes.get('href') if link is not None else None
+
+
+BACKENDS = {parser.name: parser for parser in [Bs4Parser, StrainerParser, LxmlParser, SelectolaxParser]}
+BACKEND_MODULES = {'bs4': 'bs4', 'strainer': 'bs4', 'lxml': 'lxml.html', 'selectolax': 'selectolax.lexbor'}
+PREFERRED_BACKENDS = ['selectolax', 'lxml', 'strainer']  # Fastest first, strainer is always available
+
+
+@functools.lru_cache(maxsize=None)
+def available_backends():
+    """
+    Importing the library of every backend, the first time it's called.
+
+    :return: list of str, names of the backends whose library is installed
+    """
+    return [name for name in BACKENDS if module_available(BACKEND_MODULES[name])]
+
+
+def get_serp_parser(name=None):
+    """
+    Raises BackendNotAvailable
+
+    :param name: str or None, a key of BACKENDS, if None the fastest available one
+    :return: SerpParser
+    """
+    available = available_backends()
+
+    if name is None:
+        name = [backend for backend in PREFERRED_BACKENDS if backend in available][0]
+    elif name not in available:
+        raise BackendNotAvailable(name)
+
+    return BACKENDS[name]()
+
+
+@functools.lru_cache(maxsize=None)
+def default_serp_parser():
+    """
+    :return: SerpParser, get_serp_parser() of the fastest backend, built on first use and then shared
+    """
+    return get_serp_parser()
+
+
+# Exceptions
+class ElementNotFound(Exception):
+    pass
+
+
+class BackendNotAvailable(Exception):
+    pass
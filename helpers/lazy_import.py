@@ -0,0 +1,63 @@
+import importlib
+
+
+# v 0.0.1
+
+
+class LazyModule(object):
+    """
+    Class that stands in for a module, importing it on first attribute access. Heavy dependencies are then only paid
+    for by the code paths that use them, e.g. a cached report never imports whois, builtwith, bs4 or requests.
+
+    importlib.import_module() holds the import lock of the module, so concurrent first accesses are safe.
+    """
+    def __init__(self, name):
+        """
+        :param name: str, absolute module name, e.g. 'lxml.html'
+        """
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        """
+        Raises ImportError
+
+        :return: module
+        """
+        if self._module is None:
+            object.__setattr__(self, '_module', importlib.import_module(self._name))
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        return '<LazyModule %s%s>' % (self._name, '' if self._module is None else ' (loaded)')
+
+
+def lazy_import(name):
+    """
+    :param name: str, absolute module name
+    :return: LazyModule
+    """
+    return LazyModule(name)
+
+
+def module_available(name):
+    """
+    Import name to tell if it's installed, for optional dependencies.
+
+    :param name: str, absolute module name
+    :return: bool
+    """
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+# v 0.0.1
+
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 24 * 60 * 60  # Seconds
+
+MISSING = object()  # Returned by LookupCache.get() on a miss, as None is a valid cached value
+
+
+class LookupCache(object):
+    """
+    Class that holds a thread-safe, size bounded LRU cache whose entries expire after ttl seconds, or after a ttl of
+    their own, e.g. the TTL of a DNS answer. It can be saved to and loaded from a json file, so keys and values have to
+    be json serializable.
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        """
+        :param max_entries: integer, the least recently used entries are evicted over this size
+        :param ttl: integer, seconds an entry is valid for, None never expires
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # {key: (stored_at, value, ttl of its own or None)}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: string
+        :return: the cached value, or MISSING if there's none or it expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self._is_expired(entry[0], entry[2]):
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        :param key: string
+        :param value: json serializable value
+        :param ttl: float or None, seconds this entry is valid for, defaults at the cache's
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = (time.time(), value, ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        :return: dictionary, {'entries': int, 'hits': int, 'misses': int, 'hit_rate': float}
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        """
+        :return: None
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    def save(self, path):
+        """
+        Save the entries that didn't expire into a json file, replacing it atomically.
+
+        :param path: string
+        :return: None
+        """
+        with self._lock:
+            entries = [[key, stored_at, value] + ([] if ttl is None else [ttl])
+                       for key, (stored_at, value, ttl) in self._entries.items() if not self._is_expired(stored_at, ttl)]
+
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(entries))
+        os.replace(path + '.tmp', path)
+
+    def load(self, path):
+        """
+        Load the entries saved by save(), if the file exists. Expired entries are dropped.
+
+        :param path: string
+        :return: None
+        """
+        if not os.path.isfile(path):
+            return
+
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+
+        with self._lock:
+            for entry in entries:
+                key, stored_at, value = entry[:3]
+                ttl = entry[3] if len(entry) > 3 else None
+                if not self._is_expired(stored_at, ttl):
+                    self._entries[key] = (stored_at, value, ttl)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _is_expired(self, stored_at, ttl=None):
+        """
+        :param stored_at: float, timestamp
+        :param ttl: float or None, ttl of the entry, defaults at the cache's
+        :return: bool
+        """
+        ttl = self.ttl if ttl is None else ttl
+        return ttl is not None and time.time() - stored_at > ttl
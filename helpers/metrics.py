@@ -0,0 +1,405 @@
+import os
+import json
+import threading
+import contextlib
+import contextvars
+from urllib.parse import urlsplit
+
+
+# v 0.0.1
+
+
+DEFAULT_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]  # Seconds
+PROMETHEUS_PREFIX = 'bckg_info'
+
+# Collector outcomes
+OK, EMPTY, ERROR, RAISED = 'ok', 'empty', 'error', 'raised'
+
+_retry_count = contextvars.ContextVar('retry_count', default=None)
+
+
+class Histogram(object):
+    """
+    Class that counts observations into fixed buckets, as a Prometheus histogram. Not thread-safe on its own.
+    """
+    def __init__(self, bounds=None):
+        """
+        :param bounds: list of float, upper bounds of the buckets, ascending, DEFAULT_BUCKETS if None
+        """
+        self.bounds = list(bounds if bounds is not None else DEFAULT_BUCKETS)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last one is over every bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        :param value: float
+        :return: None
+        """
+        n = 0
+        while n < len(self.bounds) and value > self.bounds[n]:
+            n += 1
+        self.counts[n] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, snapshot):
+        """
+        :param snapshot: dict, as_dict() return of a Histogram with the same bounds
+        :return: None
+        """
+        self.counts = [count + other for count, other in zip(self.counts, snapshot['counts'])]
+        self.sum += snapshot['sum']
+        self.count += snapshot['count']
+
+    def as_dict(self):
+        """
+        :return: dict, {'bounds': list of float, 'counts': list of int, per bucket, one more than bounds, 'sum': float,
+        'count': int}
+        """
+        return {'bounds': list(self.bounds), 'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+
+class RetryCount(object):
+    """
+    Class that holds the retries made within a count_retries() block
+    """
+    def __init__(self):
+        self.value = 0
+
+
+class RequestMetrics(object):
+    """
+    Class that holds thread-safe request metrics by host: requests, connection errors, status codes, latency, bytes
+    received and retries.
+
+    Every record is also made on parent, if any, so a RequestMetrics per InfoGetter can roll up into REQUEST_METRICS.
+    """
+    def __init__(self, parent=None, bounds=None):
+        """
+        :param parent: RequestMetrics or None
+        :param bounds: list of float, latency buckets, DEFAULT_BUCKETS if None
+        """
+        self.parent = parent
+        self.bounds = bounds
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, url, seconds, status_code=None, size=0):
+        """
+        :param url: str
+        :param seconds: float, time to the response, only to its headers if it was streamed
+        :param status_code: int, None on a connection error
+        :param size: int, bytes of body read along with the response
+        :return: None
+        """
+        with self._lock:
+            host = self._host(url)
+            host['requests'] += 1
+            host['latency'].observe(seconds)
+            host['bytes'] += size
+            if status_code is None:
+                host['connection_errors'] += 1
+            else:
+                host['status_codes'][str(status_code)] = host['status_codes'].get(str(status_code), 0) + 1
+
+        if self.parent is not None:
+            self.parent.record_request(url, seconds, status_code, size)
+
+    def record_bytes(self, url, size):
+        """
+        :param url: str
+        :param size: int, bytes of a streamed body read after the response
+        :return: None
+        """
+        with self._lock:
+            self._host(url)['bytes'] += size
+
+        if self.parent is not None:
+            self.parent.record_bytes(url, size)
+
+    def record_retry(self, url):
+        """
+        Count a retry of url, also on the count_retries() block it was made in, if any.
+
+        :param url: str
+        :return: None
+        """
+        with self._lock:
+            self._host(url)['retries'] += 1
+
+        if self.parent is not None:
+            self.parent.record_retry(url)
+        else:
+            retry_count = _retry_count.get()
+            if retry_count is not None:
+                retry_count.value += 1
+
+    def snapshot(self):
+        """
+        :return: dict, json serializable, {'hosts': {host: {'requests': int, 'connection_errors': int,
+        'status_codes': {str: int}, 'latency': Histogram.as_dict(), 'bytes': int, 'retries': int}}}
+        """
+        with self._lock:
+            return {'hosts': {name: dict(host, status_codes=dict(host['status_codes']),
+                                         latency=host['latency'].as_dict())
+                              for name, host in self._hosts.items()}}
+
+    def merge(self, snapshot):
+        """
+        Add up the snapshot() of another RequestMetrics, e.g. one from a worker process.
+
+        :param snapshot: dict
+        :return: None
+        """
+        with self._lock:
+            for name, other in snapshot['hosts'].items():
+                host = self._hosts.setdefault(name, self._new_host())
+                for key in ['requests', 'connection_errors', 'bytes', 'retries']:
+                    host[key] += other[key]
+                for status_code, count in other['status_codes'].items():
+                    host['status_codes'][status_code] = host['status_codes'].get(status_code, 0) + count
+                host['latency'].merge(other['latency'])
+
+        if self.parent is not None:
+            self.parent.merge(snapshot)
+
+    def clear(self):
+        """
+        :return: None
+        """
+        with self._lock:
+            self._hosts = {}
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """
+        :param prefix: str, prepended to every metric name
+        :return: str, Prometheus text exposition format
+        """
+        hosts = self.snapshot()['hosts']
+        lines = []
+
+        for name, key, help_text in [('requests_total', 'requests', 'Requests made.'),
+                                     ('connection_errors_total', 'connection_errors', 'Requests without a response.'),
+                                     ('response_bytes_total', 'bytes', 'Bytes of response bodies read.'),
+                                     ('request_retries_total', 'retries', 'Requests retried.')]:
+            lines += _metric_header(prefix, name, 'counter', help_text)
+            for host, values in sorted(hosts.items()):
+                lines.append('%s_%s{host="%s"} %s' % (prefix, name, _escape(host), values[key]))
+
+        lines += _metric_header(prefix, 'responses_total', 'counter', 'Responses, by status code.')
+        for host, values in sorted(hosts.items()):
+            for status_code, count in sorted(values['status_codes'].items()):
+                lines.append('%s_responses_total{host="%s",status="%s"} %s' % (prefix, _escape(host), status_code,
+                                                                               count))
+
+        lines += _metric_header(prefix, 'request_duration_seconds', 'histogram', 'Time to the response.')
+        for host, values in sorted(hosts.items()):
+            lines += _histogram_lines('%s_request_duration_seconds' % prefix, 'host="%s"' % _escape(host),
+                                      values['latency'])
+
+        return '\n'.join(lines) + '\n'
+
+    def _host(self, url):
+        """
+        Get the metrics of url's host, to be called holding self._lock
+
+        :param url: str
+        :return: dict
+        """
+        name = urlsplit(url).hostname or ''
+        if name not in self._hosts:
+            self._hosts[name] = self._new_host()
+        return self._hosts[name]
+
+    def _new_host(self):
+        """
+        :return: dict
+        """
+        return {'requests': 0, 'connection_errors': 0, 'status_codes': {}, 'latency': Histogram(self.bounds),
+                'bytes': 0, 'retries': 0}
+
+
+class CollectorMetrics(object):
+    """
+    Class that holds thread-safe metrics of InfoGetter collectors, by field: duration, outcomes and request retries.
+
+    Every record is also made on parent, if any, so a CollectorMetrics per InfoGetter can roll up into
+    COLLECTOR_METRICS.
+    """
+    def __init__(self, parent=None, bounds=None):
+        """
+        :param parent: CollectorMetrics or None
+        :param bounds: list of float, duration buckets, DEFAULT_BUCKETS if None
+        """
+        self.parent = parent
+        self.bounds = bounds
+
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def record(self, field, seconds, outcome, retries=0):
+        """
+        :param field: str
+        :param seconds: float
+        :param outcome: OK, EMPTY, ERROR or RAISED
+        :param retries: int
+        :return: None
+        """
+        with self._lock:
+            collector = self._collector(field)
+            collector['duration'].observe(seconds)
+            collector['outcomes'][outcome] = collector['outcomes'].get(outcome, 0) + 1
+            collector['retries'] += retries
+
+        if self.parent is not None:
+            self.parent.record(field, seconds, outcome, retries)
+
+    def snapshot(self):
+        """
+        :return: dict, json serializable, {'collectors': {field: {'duration': Histogram.as_dict(),
+        'outcomes': {outcome: int}, 'retries': int}}}
+        """
+        with self._lock:
+            return {'collectors': {field: {'duration': collector['duration'].as_dict(),
+                                           'outcomes': dict(collector['outcomes']), 'retries': collector['retries']}
+                                   for field, collector in self._collectors.items()}}
+
+    def merge(self, snapshot):
+        """
+        Add up the snapshot() of another CollectorMetrics, e.g. one from a worker process.
+
+        :param snapshot: dict
+        :return: None
+        """
+        with self._lock:
+            for field, other in snapshot['collectors'].items():
+                collector = self._collector(field)
+                collector['duration'].merge(other['duration'])
+                for outcome, count in other['outcomes'].items():
+                    collector['outcomes'][outcome] = collector['outcomes'].get(outcome, 0) + count
+                collector['retries'] += other['retries']
+
+        if self.parent is not None:
+            self.parent.merge(snapshot)
+
+    def clear(self):
+        """
+        :return: None
+        """
+        with self._lock:
+            self._collectors = {}
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """
+        :param prefix: str, prepended to every metric name
+        :return: str, Prometheus text exposition format
+        """
+        collectors = self.snapshot()['collectors']
+        lines = []
+
+        lines += _metric_header(prefix, 'collector_runs_total', 'counter', 'Collector runs, by outcome.')
+        for field, values in sorted(collectors.items()):
+            for outcome, count in sorted(values['outcomes'].items()):
+                lines.append('%s_collector_runs_total{collector="%s",outcome="%s"} %s' % (prefix, _escape(field),
+                                                                                         outcome, count))
+
+        lines += _metric_header(prefix, 'collector_retries_total', 'counter', 'Requests retried by collectors.')
+        for field, values in sorted(collectors.items()):
+            lines.append('%s_collector_retries_total{collector="%s"} %s' % (prefix, _escape(field), values['retries']))
+
+        lines += _metric_header(prefix, 'collector_duration_seconds', 'histogram', 'Time taken by collectors.')
+        for field, values in sorted(collectors.items()):
+            lines += _histogram_lines('%s_collector_duration_seconds' % prefix, 'collector="%s"' % _escape(field),
+                                      values['duration'])
+
+        return '\n'.join(lines) + '\n'
+
+    def _collector(self, field):
+        """
+        Get the metrics of field, to be called holding self._lock
+
+        :param field: str
+        :return: dict
+        """
+        if field not in self._collectors:
+            self._collectors[field] = {'duration': Histogram(self.bounds), 'outcomes': {}, 'retries': 0}
+        return self._collectors[field]
+
+
+# Process-wide metrics, every RequestHandler and InfoGetter records into these unless given others
+REQUEST_METRICS = RequestMetrics()
+COLLECTOR_METRICS = CollectorMetrics()
+
+
+@contextlib.contextmanager
+def count_retries():
+    """
+    Count the retries RequestMetrics records from within the block, on this thread or asyncio task and the tasks it
+    starts.
+
+    :return: RetryCount
+    """
+    retry_count = RetryCount()
+    token = _retry_count.set(retry_count)
+    try:
+        yield retry_count
+    finally:
+        _retry_count.reset(token)
+
+
+def save_metrics(path, request_metrics=REQUEST_METRICS, collector_metrics=COLLECTOR_METRICS):
+    """
+    Save a snapshot of the metrics, replacing path atomically. Paths ending in .prom get the Prometheus text format,
+    any other json.
+
+    :param path: str
+    :param request_metrics: RequestMetrics
+    :param collector_metrics: CollectorMetrics
+    :return: None
+    """
+    if path.endswith('.prom'):
+        text = request_metrics.to_prometheus() + collector_metrics.to_prometheus()
+    else:
+        text = json.dumps(dict(request_metrics.snapshot(), **collector_metrics.snapshot()), indent=True)
+
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def _metric_header(prefix, name, metric_type, help_text):
+    """
+    :param prefix: str
+    :param name: str
+    :param metric_type: str
+    :param help_text: str
+    :return: list of str
+    """
+    return ['# HELP %s_%s %s' % (prefix, name, help_text), '# TYPE %s_%s %s' % (prefix, name, metric_type)]
+
+
+def _histogram_lines(name, labels, histogram):
+    """
+    :param name: str
+    :param labels: str, 'key="value"'
+    :param histogram: dict, Histogram.as_dict()
+    :return: list of str
+    """
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram['bounds'] + ['+Inf'], histogram['counts']):
+        cumulative += count
+        lines.append('%s_bucket{%s,le="%s"} %s' % (name, labels, bound, cumulative))
+    lines.append('%s_sum{%s} %s' % (name, labels, histogram['sum']))
+    lines.append('%s_count{%s} %s' % (name, labels, histogram['count']))
+    return lines
+
+
+def _escape(value):
+    """
+    :param value: str
+    :return: str, escaped as a Prometheus label value
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
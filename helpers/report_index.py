@@ -0,0 +1,274 @@
+import os
+import re
+import time
+import threading
+
+from helpers.report_store import SqliteConnections, SQLITE_SUFFIXES
+
+
+# v 0.0.1
+
+
+INDEX_FILE = 'index.sqlite'  # Index of a DirectoryStore, inside its directory
+INDEX_SUFFIX = '.index.sqlite'  # Index of a SqliteStore, replacing its suffix
+
+# Fields terms are indexed under, see index_terms()
+FIELDS = ['ip', 'country', 'asn', 'org', 'registrar', 'name_server', 'technology']
+
+SCHEMA = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    CREATE TABLE IF NOT EXISTS postings (
+        field TEXT NOT NULL,
+        term TEXT NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (field, term, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS postings_key ON postings (key);
+    CREATE TABLE IF NOT EXISTS documents (
+        key TEXT PRIMARY KEY,
+        url TEXT,
+        indexed_at REAL NOT NULL
+    );
+'''
+
+ASN_RE = re.compile(r'^(?:as)?(\d+)$')
+
+_INDEXES = {}  # {path: ReportIndex}, see open_index()
+_indexes_lock = threading.Lock()
+
+
+def normalize_term(term, field=None):
+    """
+    Terms are matched case insensitively, name servers with or without their trailing dot, and autonomous systems
+    with or without their AS prefix.
+
+    :param term: str
+    :param field: str or None
+    :return: str
+    """
+    term = str(term).strip().lower().rstrip('.')
+    if field == 'asn':
+        asn = ASN_RE.match(term.replace(' ', ''))
+        if asn:
+            return 'as' + asn.group(1)
+    return term
+
+
+def index_terms(data):
+    """
+    Terms of a report, by field:
+        ip: data['ip']
+        country, org: country code and organization (or ISP) of data['geo_location']
+        asn: autonomous system of data['geo_location'], given by GeoIP databases with an ASN column (the API has none),
+        or the origin of data['whois'], given by the registries of IPs
+        registrar, name_server: of data['whois']
+        technology: every technology of data['builtwith'], whatever its category
+
+    Fields that failed or came back empty have no terms.
+
+    :param data: dict, InfoGetter.data
+    :return: list of (field, term) tuples, no duplicates
+    """
+    terms = []
+
+    if isinstance(data.get('ip'), str):
+        terms.append(('ip', data['ip']))
+
+    geo_location = data.get('geo_location')
+    if isinstance(geo_location, dict):
+        terms += _values('country', geo_location.get('countryCode'))
+        terms += _values('asn', geo_location.get('asn'))
+        terms += _values('org', geo_location.get('org'))
+        terms += _values('org', geo_location.get('isp'))
+
+    whois = data.get('whois')
+    if isinstance(whois, dict):
+        terms += _values('registrar', whois.get('registrar'))
+        terms += _values('asn', re.split(r'[\s,]+', whois['origin']) if whois.get('origin') else None)
+        terms += _values('name_server', whois.get('name_servers'))
+
+    builtwith = data.get('builtwith')
+    if isinstance(builtwith, dict):
+        for technologies in builtwith.values():
+            terms += _values('technology', technologies)
+
+    unique = []
+    seen = set()
+    for field, term in terms:
+        posting = (field, normalize_term(term, field))
+        if posting[1] and posting not in seen:
+            seen.add(posting)
+            unique.append(posting)
+    return unique
+
+
+def _values(field, value):
+    """
+    :param field: str
+    :param value: str, list of str or None
+    :return: list of (field, value) tuples
+    """
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [(field, elem) for elem in value if elem]
+    return [(field, value)]
+
+
+def index_path(location):
+    """
+    :param location: str, directory or SQLite file of a report store, see open_store()
+    :return: str, path of its index
+    """
+    if location.endswith(SQLITE_SUFFIXES):
+        return os.path.splitext(location)[0] + INDEX_SUFFIX
+    return os.path.join(location, INDEX_FILE)
+
+
+def open_index(location):
+    """
+    Get the index of the report store saved at location. A single instance is kept per location, so every InfoGetter
+    of a batch shares it.
+
+    :param location: str, directory or SQLite file of a report store
+    :return: ReportIndex
+    """
+    path = index_path(location)
+    with _indexes_lock:
+        index = _INDEXES.get(path)
+        if index is None:
+            index = _INDEXES[path] = ReportIndex(path)
+        return index
+
+
+class ReportIndex(object):
+    """
+    Class that holds an inverted index of saved reports in a SQLite file: for each field and term (see index_terms()),
+    the keys of the reports that have it, so "which domains share this IP" or "which run nginx" is a single indexed
+    lookup instead of opening every report.
+
+    update() replaces the postings of a report as it's saved, update_many() those of many reports at once.
+    """
+    def __init__(self, path):
+        """
+        :param path: str, SQLite file, created if missing
+        """
+        self.path = path
+        self._connections = SqliteConnections(path, SCHEMA)
+        self._connections.get()  # A bad path raises here, rather than at the first report
+
+    def update(self, key, data):
+        """
+        Replace the postings of a report.
+
+        :param key: str, key of the report in its store
+        :param data: dict, InfoGetter.data
+        :return: None
+        """
+        self.update_many([(key, data.get('url'), index_terms(data))])
+
+    def update_many(self, documents):
+        """
+        Replace the postings of many reports, in a single transaction.
+
+        :param documents: iterable of (key, url, index_terms()) tuples
+        :return: int, number of reports indexed
+        """
+        count = 0
+        with self._connections.get() as connection:
+            for key, url, terms in documents:
+                connection.execute('DELETE FROM postings WHERE key = ?', (key,))
+                connection.executemany('INSERT OR IGNORE INTO postings (field, term, key) VALUES (?, ?, ?)',
+                                       [(field, term, key) for field, term in terms])
+                connection.execute('INSERT OR REPLACE INTO documents (key, url, indexed_at) VALUES (?, ?, ?)',
+                                   (key, url, time.time()))
+                count += 1
+        return count
+
+    def remove(self, key):
+        """
+        :param key: str
+        :return: None
+        """
+        with self._connections.get() as connection:
+            connection.execute('DELETE FROM postings WHERE key = ?', (key,))
+            connection.execute('DELETE FROM documents WHERE key = ?', (key,))
+
+    def clear(self):
+        """
+        :return: None
+        """
+        with self._connections.get() as connection:
+            connection.execute('DELETE FROM postings')
+            connection.execute('DELETE FROM documents')
+
+    def query(self, **terms):
+        """
+        Keys of the reports having every term given, e.g. query(technology='nginx', country='ar').
+
+        Raises UnknownField
+
+        :param terms: {field: str}, fields in FIELDS
+        :return: list of str, sorted
+        """
+        if not terms:
+            return []
+
+        selects = []
+        params = []
+        for field, term in terms.items():
+            if field not in FIELDS:
+                raise UnknownField(field)
+            selects.append('SELECT key FROM postings WHERE field = ? AND term = ?')
+            params += [field, normalize_term(term, field)]
+
+        sql = ' INTERSECT '.join(selects) + ' ORDER BY key'
+        return [row[0] for row in self._connections.get().execute(sql, params)]
+
+    def counts(self, field, limit=None):
+        """
+        Terms of a field, by the number of reports having them, e.g. the most used registrars.
+
+        Raises UnknownField
+
+        :param field: str, in FIELDS
+        :param limit: int or None, most common terms returned
+        :return: list of (term, count) tuples, most common first
+        """
+        if field not in FIELDS:
+            raise UnknownField(field)
+
+        sql = 'SELECT term, COUNT(*) AS n FROM postings WHERE field = ? GROUP BY term ORDER BY n DESC, term'
+        params = [field]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [(term, count) for term, count in self._connections.get().execute(sql, params)]
+
+    def keys(self):
+        """
+        :return: list of str, keys of every indexed report
+        """
+        return [row[0] for row in self._connections.get().execute('SELECT key FROM documents ORDER BY key')]
+
+    def url(self, key):
+        """
+        :param key: str
+        :return: str or None, url of the indexed report
+        """
+        row = self._connections.get().execute('SELECT url FROM documents WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def close(self):
+        """
+        Close the connection of the calling thread, if any.
+
+        :return: None
+        """
+        self._connections.close()
+
+
+# Exceptions
+class UnknownField(Exception):
+    pass
@@ -0,0 +1,440 @@
+import os
+import re
+import json
+import zlib
+import time
+import hashlib
+import threading
+from urllib.parse import quote
+
+from helpers.lazy_import import lazy_import
+
+
+# v 0.0.1
+
+
+sqlite3 = lazy_import('sqlite3')  # Only SqliteStore needs it
+
+DATA_FILE = 'data.json'
+IMAGE_NAMES = ['location.jpg']  # Files of a report directory kept along with its data, see import_directory()
+INVALID_FILENAME_CHARS = ['/', '\\', '?', '%', '*', ':', '|', '"', '<', '>', '.']
+
+SQLITE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')  # Paths open_store() opens as a SqliteStore
+EXPORT_SUFFIX = '_reports'  # Default export directory of a SqliteStore, next to its file
+DEFAULT_COMPRESSION_LEVEL = 6
+BUSY_TIMEOUT = 30  # Seconds a connection waits for another one's write before raising
+
+SCHEMA = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    CREATE TABLE IF NOT EXISTS reports (
+        key TEXT PRIMARY KEY,
+        url TEXT,
+        saved_at REAL NOT NULL,
+        payload BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS images (
+        digest TEXT PRIMARY KEY,
+        content BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS report_images (
+        key TEXT NOT NULL,
+        name TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (key, name)
+    );
+    CREATE INDEX IF NOT EXISTS report_images_digest ON report_images (digest);
+'''
+
+_STORES = {}  # {location: ReportStore}, see open_store()
+_stores_lock = threading.Lock()
+
+
+def url_to_filename(url):
+    """
+    Transform an url into a filename valid name
+
+    :param url: str
+    :return: str
+    """
+
+    # Standardize urls
+    first_pass = url.replace('http://', '').replace('https://', '').replace('www.', '').split('/')[0]
+    # Cut to root
+    second_pass = first_pass.replace('.', ' - ')
+    # Remove invalids
+    for invalid in INVALID_FILENAME_CHARS:
+        second_pass = second_pass.replace(invalid, '')
+
+    return second_pass
+
+
+def report_key(url):
+    """
+    Lossless key of the report of an url, its lowercase host without the scheme or a leading www., e.g.
+    https://www.Example.org/a -> example.org
+
+    :param url: str
+    :return: str
+    """
+    host = re.split('[/?#]', url.split('://', 1)[-1], 1)[0].lower()
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    return host
+
+
+def serialize(data):
+    """
+    :param data: dict, InfoGetter.data
+    :return: bytes, the content of its data.json
+    """
+    return json.dumps(data, indent=True).encode('utf-8')
+
+
+def open_store(location):
+    """
+    Get the store saved at location, a SqliteStore if it ends in one of SQLITE_SUFFIXES, else a DirectoryStore. A
+    single instance is kept per location, so every InfoGetter of a batch shares it.
+
+    :param location: str, path of the directory or the SQLite file
+    :return: ReportStore
+    """
+    with _stores_lock:
+        store = _STORES.get(location)
+        if store is None:
+            if location.endswith(SQLITE_SUFFIXES):
+                store = SqliteStore(location)
+            else:
+                store = DirectoryStore(location)
+            _STORES[location] = store
+        return store
+
+
+def import_directory(source, store):
+    """
+    Import every report saved under a directory in the DirectoryStore layout, along with its images, into store.
+
+    :param source: str, path of the directory, e.g. ./output
+    :param store: ReportStore
+    :return: int, number of reports imported
+    """
+    imported = 0
+    for entry in os.scandir(source):
+        data_path = os.path.join(entry.path, DATA_FILE)
+        if not entry.is_dir() or not os.path.isfile(data_path):
+            continue
+
+        with open(data_path, 'rb') as f:
+            data = json.loads(f.read())
+
+        key = store.key(data.get('url') or entry.name)
+        store.save(key, data)
+
+        for name in IMAGE_NAMES:
+            image_path = os.path.join(entry.path, name)
+            if os.path.isfile(image_path):
+                with open(image_path, 'rb') as f:
+                    store.save_image(key, name, f.read())
+
+        imported += 1
+
+    return imported
+
+
+class SqliteConnections(object):
+    """
+    Class that hands each thread its own connection to a SQLite file, and each process after a fork, creating schema
+    on the first one.
+    """
+    def __init__(self, path, schema):
+        """
+        :param path: str, SQLite file, created if missing
+        :param schema: str, script run on every new connection, so it has to be idempotent
+        """
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self):
+        """
+        :return: sqlite3.Connection of the calling thread
+        """
+        connection = getattr(self._local, 'connection', None)
+
+        # A connection inherited through a fork can't be used by the child
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            connection.executescript(self.schema)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+
+        return connection
+
+    def close(self):
+        """
+        Close the connection of the calling thread, if any.
+
+        :return: None
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class ReportStore(object):
+    """
+    Class that defines where InfoGetter saves reports: their data, by key, and the images drawn along with them.
+
+    output.html is always drawn in a directory, so export() lays a report out as files, data.json and images, for
+    htmldrawer. Stores whose reports are already laid out that way set exported to True.
+    """
+    exported = False
+
+    def key(self, url):
+        """
+        :param url: str
+        :return: str, key of the report of url
+        """
+        raise NotImplementedError()
+
+    def exists(self, key):
+        """
+        :param key: str
+        :return: bool
+        """
+        raise NotImplementedError()
+
+    def keys(self):
+        """
+        :return: list of str, keys of every saved report
+        """
+        raise NotImplementedError()
+
+    def load(self, key):
+        """
+        Raises json.decoder.JSONDecodeError
+
+        :param key: str
+        :return: dict, or None if there's no report saved under key
+        """
+        raise NotImplementedError()
+
+    def save(self, key, data):
+        """
+        :param key: str
+        :param data: dict, json serializable
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def save_image(self, key, name, content):
+        """
+        :param key: str
+        :param name: str, file name of the image, e.g. location.jpg
+        :param content: bytes
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def directory(self, key):
+        """
+        :param key: str
+        :return: str, path of the directory the report of key is exported to
+        """
+        raise NotImplementedError()
+
+    def export(self, key):
+        """
+        Lay the report of key out as files, data.json and images, under directory(key).
+
+        :param key: str
+        :return: str, directory(key)
+        """
+        raise NotImplementedError()
+
+
+class DirectoryStore(ReportStore):
+    """
+    Class that saves each report in a directory of its own, path/<url_to_filename>/data.json, next to its images and
+    output.html. url_to_filename() is lossy, e.g. every '.' is dropped, so different urls might share a report.
+    """
+    exported = True
+
+    def __init__(self, path):
+        """
+        :param path: str, directory holding the reports
+        """
+        self.path = path
+
+    def key(self, url):
+        return url_to_filename(url)
+
+    def exists(self, key):
+        return os.path.isfile(os.path.join(self.path, key, DATA_FILE))
+
+    def keys(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.path)
+                      if entry.is_dir() and os.path.isfile(os.path.join(entry.path, DATA_FILE)))
+
+    def load(self, key):
+        try:
+            with open(os.path.join(self.path, key, DATA_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, data):
+        self._write(os.path.join(self.directory(key), DATA_FILE), serialize(data))
+
+    def save_image(self, key, name, content):
+        self._write(os.path.join(self.directory(key), name), content)
+
+    def directory(self, key):
+        """
+        The directory is created if missing.
+
+        :param key: str
+        :return: str
+        """
+        path = os.path.join(self.path, key)
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def export(self, key):
+        return self.directory(key)
+
+    @staticmethod
+    def _write(path, content):
+        """
+        Replace path atomically.
+
+        :param path: str
+        :param content: bytes
+        :return: None
+        """
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+
+class SqliteStore(ReportStore):
+    """
+    Class that saves every report in a single SQLite file, indexed by report_key(), with its data.json compressed. Each
+    image is saved once, by its sha256, however many reports it is drawn in.
+
+    Connections are opened per thread, and per process after a fork (see SqliteConnections), so a store can be shared
+    by the workers of a batch. WAL mode lets them read while another one writes.
+    """
+    def __init__(self, path, export_directory=None, compression_level=DEFAULT_COMPRESSION_LEVEL):
+        """
+        :param path: str, SQLite file, created if missing
+        :param export_directory: str or None, defaults at path without its suffix plus EXPORT_SUFFIX
+        :param compression_level: int, zlib level of the payloads
+        """
+        self.path = path
+        self.export_directory = export_directory or os.path.splitext(path)[0] + EXPORT_SUFFIX
+        self.compression_level = compression_level
+
+        self._connections = SqliteConnections(path, SCHEMA)
+        self._connection()  # A bad path raises here, rather than at the first report
+
+    def key(self, url):
+        return report_key(url)
+
+    def exists(self, key):
+        return self._connection().execute('SELECT 1 FROM reports WHERE key = ?', (key,)).fetchone() is not None
+
+    def keys(self):
+        return [row[0] for row in self._connection().execute('SELECT key FROM reports ORDER BY key')]
+
+    def load(self, key):
+        content = self.load_content(key)
+        return None if content is None else json.loads(content)
+
+    def load_content(self, key):
+        """
+        :param key: str
+        :return: bytes, content of the report's data.json, or None if there's no report saved under key
+        """
+        row = self._connection().execute('SELECT payload FROM reports WHERE key = ?', (key,)).fetchone()
+        return None if row is None else zlib.decompress(row[0])
+
+    def save(self, key, data):
+        payload = zlib.compress(serialize(data), self.compression_level)
+
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO reports (key, url, saved_at, payload) VALUES (?, ?, ?, ?)',
+                               (key, data.get('url'), time.time(), payload))
+
+    def save_image(self, key, name, content):
+        digest = hashlib.sha256(content).hexdigest()
+
+        with self._connection() as connection:
+            row = connection.execute('SELECT digest FROM report_images WHERE key = ? AND name = ?',
+                                     (key, name)).fetchone()
+
+            connection.execute('INSERT OR IGNORE INTO images (digest, content) VALUES (?, ?)', (digest, content))
+            connection.execute('INSERT OR REPLACE INTO report_images (key, name, digest) VALUES (?, ?, ?)',
+                               (key, name, digest))
+
+            # Drop the image it replaced, unless another report still draws it
+            if row is not None and row[0] != digest:
+                connection.execute('DELETE FROM images WHERE digest = ? AND NOT EXISTS '
+                                   '(SELECT 1 FROM report_images WHERE digest = ?)', (row[0], row[0]))
+
+    def load_images(self, key):
+        """
+        :param key: str
+        :return: dict, {name: bytes}
+        """
+        return dict(self._connection().execute('SELECT report_images.name, images.content FROM report_images '
+                                               'JOIN images ON images.digest = report_images.digest '
+                                               'WHERE report_images.key = ?', (key,)))
+
+    def directory(self, key):
+        return os.path.join(self.export_directory, quote(key, safe=''))
+
+    def export(self, key):
+        """
+        Raises ReportNotFound
+
+        :param key: str
+        :return: str
+        """
+        content = self.load_content(key)
+        if content is None:
+            raise ReportNotFound(key)
+
+        path = self.directory(key)
+        os.makedirs(path, exist_ok=True)
+
+        files = self.load_images(key)
+        files[DATA_FILE] = content
+        for name, file_content in files.items():
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(file_content)
+
+        return path
+
+    def close(self):
+        """
+        Close the connection of the calling thread, if any.
+
+        :return: None
+        """
+        self._connections.close()
+
+    def _connection(self):
+        """
+        :return: sqlite3.Connection of the calling thread
+        """
+        return self._connections.get()
+
+
+# Exceptions
+class ReportNotFound(Exception):
+    pass
@@ -1,13 +1,32 @@
-import requests
+import os
+import queue
+import random
 import threading
 import time
+import datetime
+import email.utils
+from urllib.parse import urlsplit
+
+from helpers.metrics import REQUEST_METRICS
+from helpers.lazy_import import lazy_import
+
+requests = lazy_import('requests')  # Imported by the first request, reading saved reports doesn't need it
 
 
 # v 0.0.1
 
 
-VALID_METHODS = [GET, POST] = 'get', 'post'
+VALID_METHODS = [GET, POST, HEAD] = 'get', 'post', 'head'
 TOO_MANY_REQUESTS = 429
+PARTIAL_CONTENT = 206
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # Bytes read at a time by download()
+
+DEFAULT_POOL_CONNECTIONS = 10  # Number of hosts to keep pools for
+DEFAULT_POOL_MAXSIZE = 10  # Number of keep-alive connections to keep per host
+
+DEFAULT_BACKOFF_BASE = 0.5  # Seconds, doubled on every retry
+DEFAULT_BACKOFF_MAX = 60  # Seconds, also caps Retry-After
 
 
 class RequestData(object):
@@ -48,37 +67,274 @@ class RequestErrorData(object):
     def __init__(self, allow_errors=True, error_connection_max_tries=10,
                  expected_status_codes=[200],
                  expected_validation_str=None,
-                 expected_error_str=None):
+                 expected_error_str=None,
+                 retry_status_codes=[TOO_MANY_REQUESTS],
+                 backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX):
         """
         :param allow_errors: boolean, if False, RequestHandler raises when there are errors
         :param error_connection_max_tries: integer, amount of times RequestHandler attempts the connection
-        when it catches a ConnectionError
+        when it catches a ConnectionError (only if allow_errors) or gets one of retry_status_codes
         :param expected_status_codes: list of integers, the expected valid status codes for the request
         :param expected_validation_str: string, a string to check against the response.text that validates the response
         :param expected_error_str: string, a string to check against the response.text that invalidates the response
+        :param retry_status_codes: list of integers, status codes that are retried after a backoff
+        :param backoff_base: float, seconds of the first backoff, doubled on each retry
+        :param backoff_max: float, maximum seconds of a single backoff, Retry-After included
         """
 
         self.allow_errors = allow_errors
         self.error_connection_max_tries = error_connection_max_tries
+        self.retry_status_codes = retry_status_codes
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
 
         self.expected_status_codes = expected_status_codes
         self.expected_validation_str = expected_validation_str
         self.expected_error_str = expected_error_str
 
 
+class RateLimiter(object):
+    """
+    Class that holds a token bucket per host. Hosts without a configured rate are not limited.
+
+    Every handler in the process shares HOST_RATE_LIMITER unless given another one, so the rate holds no matter how many
+    handlers or threads are hitting the same host.
+    """
+    def __init__(self):
+        self._rates = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_rate(self, host, rate, burst=1):
+        """
+        :param host: string, as in the url, e.g. www.google.com
+        :param rate: float, requests per second
+        :param burst: integer, requests allowed back to back before the rate kicks in
+        :return: None
+        """
+        with self._lock:
+            self._rates[host] = (rate, burst)
+            self._buckets[host] = [float(burst), time.monotonic()]
+
+    def reserve(self, url):
+        """
+        Take a token from the bucket of url's host, returning how long the caller has to wait before using it. Tokens
+        are reserved in order, so concurrent callers get increasing waits instead of all waking up at once.
+
+        :param url: string
+        :return: float, seconds to wait
+        """
+        host = urlsplit(url).hostname
+
+        with self._lock:
+            if host not in self._rates:
+                return 0
+
+            rate, burst = self._rates[host]
+            bucket = self._buckets[host]
+
+            now = time.monotonic()
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+            bucket[0] -= 1
+            return 0 if bucket[0] >= 0 else -bucket[0] / rate
+
+
+HOST_RATE_LIMITER = RateLimiter()
+
+
+def backoff_delay(n_try, request_error_data, response_object=None):
+    """
+    Seconds to wait before retrying, honoring the Retry-After header of response_object if any, otherwise exponential
+    backoff with full jitter.
+
+    :param n_try: integer, number of retries so far
+    :param request_error_data: RequestErrorData object
+    :param response_object: request's ResponseObject instance or None
+    :return: float
+    """
+    retry_after = None
+    if response_object is not None:
+        retry_after = response_object.headers.get('Retry-After')
+
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:  # HTTP-date
+            try:
+                date = email.utils.parsedate_to_datetime(retry_after)
+                delay = (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+
+        if delay is not None:
+            return min(max(delay, 0), request_error_data.backoff_max)
+
+    return random.uniform(0, min(request_error_data.backoff_max, request_error_data.backoff_base * 2 ** n_try))
+
+
+class Download(object):
+    """
+    Class that holds the result of RequestHandler.download(), with the body either in memory or saved to a file
+    """
+    def __init__(self, url, status_code, headers, encoding, content=None, path=None, size=0, truncated=False):
+        """
+        :param url: string, final url after redirects
+        :param status_code: integer
+        :param headers: dictionary
+        :param encoding: string or None
+        :param content: bytes, None if the body was saved to path
+        :param path: string or None
+        :param size: integer, bytes of body kept
+        :param truncated: boolean, True if the body was cut at max_bytes
+        """
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.encoding = encoding
+        self.content = content
+        self.path = path
+        self.size = size
+        self.truncated = truncated
+
+    @property
+    def text(self):
+        """
+        :return: string, None if the body was saved to path
+        """
+        if self.content is None:
+            return None
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+
+def declared_too_large(response_object, max_bytes):
+    """
+    :param response_object: response with headers
+    :param max_bytes: integer
+    :return: bool, True if Content-Length is over max_bytes
+    """
+    length = response_object.headers.get('Content-Length', '')
+    return length.isdigit() and int(length) > max_bytes
+
+
+class SessionPool(object):
+    """
+    Class that holds a requests.Session with keep-alive connection pools, built from a RequestData object.
+
+    The session is created on first use and is shared by every RequestHandler given this SessionPool. The connection
+    pools underneath are thread-safe, so handlers running on different threads can share it.
+    """
+    def __init__(self, request_data, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False):
+        """
+        :param request_data: RequestData object, its headers, proxies and cert are set on the session
+        :param pool_connections: integer, the number of hosts to keep connection pools for
+        :param pool_maxsize: integer, the maximum number of connections kept per host
+        :param pool_block: boolean, if True, wait for a free connection instead of opening one over pool_maxsize
+        """
+        self.request_data = request_data
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        :return: requests.Session instance
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = self._build_session()
+            return self._session
+
+    def _build_session(self):
+        """
+        :return: requests.Session instance
+        """
+        session = requests.Session()
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_connections,
+                                                pool_maxsize=self.pool_maxsize, pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        if self.request_data.headers:
+            session.headers.update(self.request_data.headers)
+        if self.request_data.proxies:
+            session.proxies.update(self.request_data.proxies)
+        session.cert = self.request_data.cert
+
+        return session
+
+    def stats(self):
+        """
+        Hit and miss counters of the connection pools currently kept, by host. A hit is a request that reused a
+        keep-alive connection, a miss is a request that had to open a new one.
+
+        :return: dictionary, {host: {'requests': int, 'hits': int, 'misses': int}}
+        """
+        with self._lock:
+            session = self._session
+
+        stats = {}
+        if session is None:
+            return stats
+
+        pool_managers = []
+        for adapter in set(session.adapters.values()):
+            pool_managers.append(adapter.poolmanager)
+            pool_managers += list(adapter.proxy_manager.values())
+
+        for pool_manager in pool_managers:
+            for key in pool_manager.pools.keys():
+                pool = pool_manager.pools.get(key)
+                if pool is None:
+                    continue
+
+                host_stats = stats.setdefault(pool.host, {'requests': 0, 'hits': 0, 'misses': 0})
+                host_stats['requests'] += pool.num_requests
+                host_stats['hits'] += pool.num_requests - pool.num_connections
+                host_stats['misses'] += pool.num_connections
+
+        return stats
+
+    def close(self):
+        """
+        Close every pooled connection. The session is rebuilt if the SessionPool is used again.
+
+        :return: None
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
 class RequestHandler(object):
     """
     Class that executes a request over a list of links
     """
-    def __init__(self, url_list, request_data, request_error_data):
+    def __init__(self, url_list, request_data, request_error_data, session_pool=None, rate_limiter=None,
+                 metrics=None):
         """
         :param url_list: list of strings
         :param request_data: RequestData object
         :param request_error_data: RequestErrorData object
+        :param session_pool: SessionPool object to share keep-alive connections with, if None, a new one is created
+        :param rate_limiter: RateLimiter object, HOST_RATE_LIMITER if None
+        :param metrics: RequestMetrics object to record requests in, REQUEST_METRICS if None
         """
         self.url_list = url_list
         self.request_data = request_data
         self.request_error_data = request_error_data
+        self.session_pool = session_pool if session_pool else SessionPool(request_data)
+        self.rate_limiter = rate_limiter if rate_limiter else HOST_RATE_LIMITER
+        self.metrics = metrics if metrics else REQUEST_METRICS
 
         self.responses = []
         self.errors = []
@@ -90,59 +346,207 @@ class RequestHandler(object):
         for url in self.url_list:
             self._handle_url(url)
 
-    def _request_wrapper(self, url):
+    def _request_wrapper(self, url, stream=None, method=None, headers=None):
         """
-        Wraps the requests.request() function
+        Wraps the request through self.session_pool, reusing keep-alive connections, once self.rate_limiter allows it.
+        The request is recorded in self.metrics.
 
         Raises InvalidURL and ConnectivityError
 
         :param url: string
+        :param stream: boolean, overrides self.request_data.stream if not None
+        :param method: GET, POST or HEAD, overrides self.request_data.method if not None
+        :param headers: dictionary, added to self.request_data.headers
         :return: request's ResponseObject instance
         """
+        time.sleep(self.rate_limiter.reserve(url))
+
+        if headers:
+            headers = dict(self.request_data.headers or {}, **headers)
+        else:
+            headers = self.request_data.headers
+
+        stream = self.request_data.stream if stream is None else stream
+        start = time.perf_counter()
+
         try:
-            response_object = requests.request(self.request_data.method, url, data=self.request_data.data,
-                                               json=self.request_data.json, headers=self.request_data.headers,
-                                               cookies=self.request_data.cookies, files=self.request_data.files,
-                                               auth=self.request_data.auth, timeout=self.request_data.timeout,
-                                               allow_redirects=self.request_data.allow_redirects,
-                                               proxies=self.request_data.proxies, stream=self.request_data.stream,
-                                               cert=self.request_data.cert)
-            return response_object
+            session = self.session_pool.session
+            response_object = session.request(method or self.request_data.method, url, data=self.request_data.data,
+                                              json=self.request_data.json, headers=headers,
+                                              cookies=self.request_data.cookies, files=self.request_data.files,
+                                              auth=self.request_data.auth, timeout=self.request_data.timeout,
+                                              allow_redirects=self.request_data.allow_redirects,
+                                              proxies=self.request_data.proxies,
+                                              stream=stream, cert=self.request_data.cert)
 
         except requests.exceptions.MissingSchema or requests.exceptions.InvalidSchema or requests.exceptions.InvalidURL:
             raise InvalidURL(url)
         except requests.exceptions.ConnectionError:
+            self.metrics.record_request(url, time.perf_counter() - start)
+            raise ConnectivityError(url)
+
+        self.metrics.record_request(url, time.perf_counter() - start, response_object.status_code,
+                                    0 if stream else len(response_object.content))
+        return response_object
+
+    def fetch(self, url, stream=None):
+        """
+        Performs a single request and error checks the response, without touching self.url_list or self.responses, so
+        a single RequestHandler can be shared between threads.
+
+        If stream is True, the body is left unread, and the caller has to close the ResponseObject once done with it.
+
+        Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString
+
+        :param url: string
+        :param stream: boolean, overrides self.request_data.stream if not None
+        :return: request's ResponseObject instance, or None if the error was appended to self.errors
+        """
+        return self._validate_url(url, stream=stream)
+
+    def download(self, url, max_bytes, path=None, truncate=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Performs a single request like fetch(), streaming the body in chunks and reading at most max_bytes of it. The
+        body is kept in memory, or written to path if given, through a temporary file so path is only replaced by a
+        complete download.
+
+        Bodies over max_bytes raise ResponseTooLarge, as soon as Content-Length or the bytes read tell so, unless
+        truncate is True, in which case the first max_bytes are kept.
+
+        Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString, ResponseTooLarge
+
+        :param url: string
+        :param max_bytes: integer
+        :param path: string or None
+        :param truncate: boolean
+        :param chunk_size: integer
+        :return: Download instance, or None if the error was appended to self.errors
+        """
+        response_object = self._validate_url(url, stream=True)
+        if response_object is None:
+            return None
+
+        chunks = []
+        size = 0
+        truncated = False
+        complete = False
+        f = open(path + '.tmp', 'wb') if path else None
+
+        try:
+            if not truncate and declared_too_large(response_object, max_bytes):
+                raise ResponseTooLarge(url)
+
+            for chunk in response_object.iter_content(chunk_size):
+                if size + len(chunk) > max_bytes:
+                    if not truncate:
+                        raise ResponseTooLarge(url)
+                    chunk = chunk[:max_bytes - size]
+                    truncated = True
+
+                if f:
+                    f.write(chunk)
+                else:
+                    chunks.append(chunk)
+                size += len(chunk)
+
+                if truncated:
+                    break
+
+            complete = True
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError):
             raise ConnectivityError(url)
 
-    def _handle_url(self, url, connectivity_n_try=0):
+        finally:
+            self.metrics.record_bytes(url, size)
+            response_object.close()
+            if f:
+                f.close()
+                if complete:
+                    os.replace(path + '.tmp', path)
+                else:
+                    os.remove(path + '.tmp')
+
+        return Download(response_object.url, response_object.status_code, response_object.headers,
+                        response_object.encoding, None if path else b''.join(chunks), path, size, truncated)
+
+    def probe(self, url):
+        """
+        Check that url can be fetched without downloading its body. A HEAD request is tried first, then, as some
+        servers don't answer HEAD properly, a GET for its first byte only.
+
+        Raises InvalidURL and ConnectivityError
+
+        :param url: string
+        :return: bool, True if either answered with an expected status code
+        """
+        response_object = self._request_wrapper(url, method=HEAD)
+        response_object.close()
+        if response_object.status_code in self.request_error_data.expected_status_codes:
+            return True
+
+        response_object = self._request_wrapper(url, stream=True, method=GET, headers={'Range': 'bytes=0-0'})
+        response_object.close()
+        return response_object.status_code in self.request_error_data.expected_status_codes + [PARTIAL_CONTENT]
+
+    def _handle_url(self, url):
         """
         Performs a request, then error checks the response, and appends either the ResponseObject to self.responses, or
         a dictionary comprising of {'error':Exception, 'url':url, 'response':ResponseObject} to self.errors
 
-        In case of ConnectivityError the function calls itself self.request_error_data.error_connection_max_tries times.
-
         Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString
 
         :param url: string
-        :param connectivity_n_try: integer, takes count of recursive calls
         :return: None
         """
+        response_object = self._validate_url(url)
+        if response_object is not None:
+            self.responses.append(response_object)
+
+    def _validate_url(self, url, n_try=0, stream=None):
+        """
+        Performs a request, then error checks the response. Returns the ResponseObject if valid, otherwise appends a
+        dictionary comprising of {'error':Exception, 'url':url, 'response':ResponseObject} to self.errors and returns
+        None.
+
+        In case of ConnectivityError, or a status code in self.request_error_data.retry_status_codes, the function
+        waits for backoff_delay() and calls itself up to self.request_error_data.error_connection_max_tries times,
+        recording each retry in self.metrics.
+
+        Raise ConnectivityError, InvalidStatusCode, NoValidationString, ContainsErrorString
+
+        :param url: string
+        :param n_try: integer, takes count of recursive calls
+        :param stream: boolean, overrides self.request_data.stream if not None
+        :return: request's ResponseObject instance or None
+        """
 
         try:
-            response_object = self._request_wrapper(url)
+            response_object = self._request_wrapper(url, stream=stream)
 
         except ConnectivityError:
             if self.request_error_data.allow_errors:
-                if connectivity_n_try < self.request_error_data.error_connection_max_tries:
-                    return self._handle_url(url, connectivity_n_try=connectivity_n_try + 1)
+                if n_try < self.request_error_data.error_connection_max_tries:
+                    self.metrics.record_retry(url)
+                    time.sleep(backoff_delay(n_try, self.request_error_data))
+                    return self._validate_url(url, n_try=n_try + 1, stream=stream)
                 else:
                     self.errors.append({'error': ConnectivityError, 'url': url, 'response': None})
                     return None
             else:
                 raise ConnectivityError(url)
 
+        # Retry throttled requests
+        if response_object.status_code in self.request_error_data.retry_status_codes:
+            if n_try < self.request_error_data.error_connection_max_tries:
+                response_object.close()
+                self.metrics.record_retry(url)
+                time.sleep(backoff_delay(n_try, self.request_error_data, response_object))
+                return self._validate_url(url, n_try=n_try + 1, stream=stream)
+
         # Validate by status_code
         if response_object.status_code not in self.request_error_data.expected_status_codes:
+            response_object.close()
             if self.request_error_data.allow_errors:
                 self.errors.append({'error': InvalidStatusCode, 'url': url, 'response': response_object})
                 return None
@@ -168,21 +572,28 @@ class RequestHandler(object):
                 else:
                     raise ContainsErrorString(url)
 
-        self.responses.append(response_object)
+        return response_object
 
 
 class ThreadedRequestHandler(object):
     """
-    Class that divides a big url_list around of number of threads.
+    Class that spreads a big url_list over a pool of worker threads fed from a shared queue.
+
+    Workers take the next url as soon as they are done with the previous one, so a slow host only holds up the thread
+    requesting it. Urls that fail go back into the queue until they fail max_passes + 1 times.
     """
-    def __init__(self, url_list, request_data, request_error_data, thread_num=1, max_passes=1, sleep_pass=0):
+    def __init__(self, url_list, request_data, request_error_data, thread_num=1, max_passes=1, sleep_pass=0,
+                 session_pool=None, rate_limiter=None, metrics=None):
         """
         :param url_list: list of strings
         :param request_data: RequestData object
         :param request_error_data: RequestErrorData object
         :param thread_num: integer, the number of threads to use
-        :param max_passes: integer, the number of passes over the url list before returning
-        :param sleep_pass: integer, the time to sleep between passes, 0 by default.
+        :param max_passes: integer, the number of times a failed url is retried before it is kept in self.errors
+        :param sleep_pass: integer, the time to wait before retrying a failed url, 0 by default.
+        :param session_pool: SessionPool object shared by every thread, if None, one sized for thread_num is created
+        :param rate_limiter: RateLimiter object, HOST_RATE_LIMITER if None
+        :param metrics: RequestMetrics object every thread records its requests in, REQUEST_METRICS if None
         """
         self.url_list = url_list
         self.request_data = request_data
@@ -192,14 +603,22 @@ class ThreadedRequestHandler(object):
         self.max_passes = max_passes
         self.sleep_pass = sleep_pass
 
+        if not session_pool:
+            session_pool = SessionPool(request_data, pool_maxsize=max(DEFAULT_POOL_MAXSIZE, thread_num))
+        self.session_pool = session_pool
+        self.rate_limiter = rate_limiter if rate_limiter else HOST_RATE_LIMITER
+        self.metrics = metrics if metrics else REQUEST_METRICS
+
         self.responses = []
         self.errors = []
+        self.retries = 0
 
         self._init_threads(self.url_list)
 
     def _init_threads(self, url_list):
         """
-        Creates the threads by dividing the url_list between self.thread_num. Fills self.threads and self.handlers.
+        Queues every url and creates self.thread_num workers, each with its own RequestHandler. Fills self.threads and
+        self.handlers.
 
         :param url_list: list of strings
         :return: None
@@ -210,48 +629,105 @@ class ThreadedRequestHandler(object):
         # Don't use more threads than urls
         self.thread_num = len(url_list) if len(url_list) < self.thread_num else self.thread_num
 
-        t_lists = [[] for _ in range(self.thread_num)]
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._pending = len(url_list)  # Urls without a response or a final error yet
 
-        count = 0
         for url in url_list:
-            t_lists[(count % self.thread_num)].append(url)
-            count += 1
+            self._queue.put((url, 0))
 
-        for thread_list in t_lists:
-            rh = RequestHandler(thread_list, self.request_data, self.request_error_data)
-            t = threading.Thread(target=rh.run)
+        for _ in range(self.thread_num):
+            rh = RequestHandler([], self.request_data, self.request_error_data, self.session_pool, self.rate_limiter,
+                                self.metrics)
+            t = threading.Thread(target=self._work, args=(rh,), daemon=True)
             self.handlers.append(rh)
             self.threads.append(t)
 
     def do_threads(self, n_pass=0):
         """
-        Start all threads, when they end recollect them and then call itself again but with the content of self.errors.
+        Start all workers and wait until every url got either a valid response or its final error.
 
-        :param n_pass: integer, takes count of recursive calls
+        :param n_pass: integer, ignored, kept for callers of the recursive version: passes are now counted per url
         :return: None
         """
-        self.errors = []
-
         for t in self.threads:
             t.start()
 
-        for t in self.threads:  # TODO: We could repurpose threads as they become available
+        with self._finished:
+            while self._pending > 0:
+                self._finished.wait()
+
+        # Stop the workers
+        for _ in self.threads:
+            self._queue.put(None)
+        for t in self.threads:
             t.join()
 
-        for handler in self.handlers:
-            self.responses += handler.responses
-            self.errors += handler.errors
+        print('[*] Responses: %s, Errors: %s, Retries: %s' % (len(self.responses), len(self.errors), self.retries))
 
-        print('[*] Pass n: %s, Responses: %s, Errors: %s' % (n_pass, len(self.responses), len(self.errors)))
+    def _work(self, handler):
+        """
+        Worker loop, request urls off the queue until a None is found.
+
+        :param handler: RequestHandler object owned by this worker
+        :return: None
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            url, n_pass = item
+            try:
+                response_object = handler.fetch(url)
+                error = handler.errors.pop() if response_object is None else None
+            except Exception as e:  # allow_errors is False
+                response_object = None
+                error = {'error': e.__class__, 'url': url, 'response': None}
+
+            if response_object is not None:
+                self._finish(response_object=response_object)
+            elif n_pass < self.max_passes:
+                self._retry(url, n_pass + 1)
+            else:
+                self._finish(error=error)
 
-        if len(self.errors) > 0:
-            if n_pass < self.max_passes:
-                url_list = [err['url'] for err in self.errors]
-                self._init_threads(url_list)
+    def _retry(self, url, n_pass):
+        """
+        Put url back in the queue, after self.sleep_pass seconds without blocking the worker.
 
-                time.sleep(self.sleep_pass)
+        :param url: string
+        :param n_pass: integer, times url has been requested
+        :return: None
+        """
+        with self._lock:
+            self.retries += 1
 
-                return self.do_threads(n_pass=n_pass + 1)
+        if self.sleep_pass:
+            timer = threading.Timer(self.sleep_pass, self._queue.put, args=((url, n_pass),))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._queue.put((url, n_pass))
+
+    def _finish(self, response_object=None, error=None):
+        """
+        Keep the outcome of a url and wake do_threads() up if it was the last one.
+
+        :param response_object: request's ResponseObject instance
+        :param error: dictionary comprising of {'error':Exception, 'url':url, 'response':ResponseObject}
+        :return: None
+        """
+        with self._finished:
+            if response_object is not None:
+                self.responses.append(response_object)
+            else:
+                self.errors.append(error)
+
+            self._pending -= 1
+            if self._pending == 0:
+                self._finished.notify_all()
 
 
 # EXCEPTIONS
@@ -279,3 +755,7 @@ class NoValidationString(Exception):
 
 class ContainsErrorString(Exception):
     pass
+
+
+class ResponseTooLarge(Exception):
+    pass
@@ -0,0 +1,260 @@
+import socket
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from helpers.lazy_import import lazy_import, module_available
+from helpers.lookup_cache import LookupCache, MISSING
+
+
+# v 0.0.1
+
+
+dns_resolver = lazy_import('dns.resolver')  # Optional, dnspython, see Resolver
+dns_exception = lazy_import('dns.exception')
+
+RESOLVER_BACKENDS = ['dnspython', 'system']
+RECORD_TYPES = ['A', 'AAAA']
+
+DEFAULT_TIMEOUT = 5  # Seconds a name may take to resolve
+DEFAULT_WORKERS = 16  # Names resolved at once
+DEFAULT_TTL = 300  # Seconds answers are cached for when the backend doesn't tell their TTL, as getaddrinfo() doesn't
+NEGATIVE_TTL = 60  # Seconds names that don't resolve are cached for
+MAX_ENTRIES = 100000
+
+
+class Resolver(object):
+    """
+    Class that resolves names to every IPv4 and IPv6 address they have, on a pool of threads, caching the answers for
+    their TTL. Uses dnspython if it's installed, which tells the TTLs, else the system resolver through
+    socket.getaddrinfo(), whose answers are cached for default_ttl.
+
+    prefetch() resolves names ahead of the code asking for them, e.g. the whole input of a batch, and resolve() waits
+    on the lookup already under way for a name rather than starting another.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, workers=DEFAULT_WORKERS, backend=None, default_ttl=DEFAULT_TTL,
+                 negative_ttl=NEGATIVE_TTL, cache=None):
+        """
+        Raises BackendNotAvailable
+
+        :param timeout: float, seconds resolve() waits for a name
+        :param workers: int, names resolved at once
+        :param backend: str or None, in RESOLVER_BACKENDS, defaults at the first one installed
+        :param default_ttl: float, seconds answers without a TTL are cached for
+        :param negative_ttl: float, seconds names that don't resolve are cached for
+        :param cache: LookupCache or None
+        """
+        if backend is None:
+            backend = 'dnspython' if module_available('dns.resolver') else 'system'
+        elif backend not in RESOLVER_BACKENDS or (backend == 'dnspython' and not module_available('dns.resolver')):
+            raise BackendNotAvailable(backend)
+
+        self.backend = backend
+        self.timeout = timeout
+        self.workers = workers
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.cache = LookupCache(max_entries=MAX_ENTRIES, ttl=default_ttl) if cache is None else cache
+
+        self._in_flight = {}  # {name: Future}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._dns = None  # dns.resolver.Resolver, reads the system configuration once, see _query()
+
+    def resolve(self, name):
+        """
+        Raises NameNotResolved, ResolveTimeout
+
+        :param name: str, host name or IP
+        :return: list of str, the IPv4 addresses first, in the order they were answered
+        """
+        name = name.lower().rstrip('.')
+        if _is_ip(name):
+            return [name]
+
+        addresses = self.cache.get(name)
+        if addresses is MISSING:
+            try:
+                addresses = self._lookup(name).result(timeout=self.timeout)
+            except TimeoutError:
+                raise ResolveTimeout(name)
+
+        if not addresses:
+            raise NameNotResolved(name)
+        return list(addresses)
+
+    def cached(self, name):
+        """
+        :param name: str
+        :return: list of str, or None if name isn't cached or didn't resolve
+        """
+        name = name.lower().rstrip('.')
+        if _is_ip(name):
+            return [name]
+
+        addresses = self.cache.get(name)
+        return list(addresses) if addresses and addresses is not MISSING else None
+
+    def seed(self, name, addresses, ttl=None):
+        """
+        Cache addresses resolved somewhere else, e.g. by the process handing name over.
+
+        :param name: str
+        :param addresses: list of str
+        :param ttl: float or None, defaults at default_ttl
+        :return: None
+        """
+        self.cache.set(name.lower().rstrip('.'), list(addresses), ttl)
+
+    def prefetch(self, names):
+        """
+        Start resolving every name not cached nor under way, without waiting for them.
+
+        :param names: iterable of str
+        :return: int, names whose lookup started
+        """
+        started = 0
+        for name in names:
+            name = name.lower().rstrip('.')
+            if not _is_ip(name) and self.cache.get(name) is MISSING:
+                with self._lock:
+                    under_way = name in self._in_flight
+                if not under_way:
+                    self._lookup(name)
+                    started += 1
+        return started
+
+    def resolve_many(self, names):
+        """
+        Resolve every name at once.
+
+        :param names: list of str
+        :return: dict, {name: list of str, or None if it didn't resolve in time}
+        """
+        self.prefetch(names)
+
+        resolved = {}
+        for name in names:
+            try:
+                resolved[name] = self.resolve(name)
+            except ResolveError:
+                resolved[name] = None
+        return resolved
+
+    def close(self):
+        """
+        :return: None
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def _lookup(self, name):
+        """
+        :param name: str
+        :return: Future, of a list of str, empty if name doesn't resolve
+        """
+        with self._lock:
+            future = self._in_flight.get(name)
+            if future is None:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='resolver')
+                future = self._in_flight[name] = self._pool.submit(self._resolve_and_cache, name)
+            return future
+
+    def _resolve_and_cache(self, name):
+        """
+        Raises ResolveTimeout, which isn't cached, so the next resolve() tries again
+
+        :param name: str
+        :return: list of str
+        """
+        try:
+            addresses, ttl = self._query(name)
+            self.cache.set(name, addresses, ttl if addresses else self.negative_ttl)
+            return addresses
+        finally:
+            with self._lock:
+                self._in_flight.pop(name, None)
+
+    def _query(self, name):
+        """
+        Raises ResolveTimeout, only if no record type answered before one timed out
+
+        :param name: str
+        :return: tuple, (list of str, TTL in seconds), no addresses if name doesn't resolve
+        """
+        if self.backend == 'system':
+            try:
+                infos = socket.getaddrinfo(name, None, type=socket.SOCK_STREAM)
+            except (socket.gaierror, UnicodeError):
+                return [], None
+
+            addresses = []
+            for family in [socket.AF_INET, socket.AF_INET6]:
+                for info_family, _, _, _, sockaddr in infos:
+                    if info_family == family and sockaddr[0] not in addresses:
+                        addresses.append(sockaddr[0])
+            return addresses, self.default_ttl
+
+        if self._dns is None:
+            self._dns = dns_resolver.Resolver()
+            self._dns.lifetime = self.timeout
+
+        addresses = []
+        ttls = []
+        timed_out = False
+        for record_type in RECORD_TYPES:
+            try:
+                answer = self._dns.resolve(name, record_type)
+            except dns_resolver.NXDOMAIN:
+                break
+            except (dns_resolver.NoAnswer, dns_resolver.NoNameservers):
+                continue
+            except dns_exception.Timeout:
+                timed_out = True
+                continue
+            except (dns_exception.DNSException, ValueError):
+                # Malformed names, e.g. a..example.org (EmptyLabel), labels over 63 characters (LabelTooLong), YXDOMAIN
+                return [], None
+
+            addresses += [record.address for record in answer if record.address not in addresses]
+            ttls.append(answer.rrset.ttl)
+
+        if timed_out:
+            if not addresses:
+                raise ResolveTimeout(name)
+            # Whatever resolved is kept, for no longer than a name that didn't, so the rest is asked for again soon
+            ttls.append(self.negative_ttl)
+
+        return addresses, min(ttls) if ttls else None
+
+
+def _is_ip(name):
+    """
+    :param name: str
+    :return: bool
+    """
+    try:
+        ipaddress.ip_address(name)
+    except ValueError:
+        return False
+    return True
+
+
+# Exceptions
+class ResolveError(Exception):
+    pass
+
+
+class NameNotResolved(ResolveError):
+    pass
+
+
+class ResolveTimeout(ResolveError):
+    pass
+
+
+class BackendNotAvailable(Exception):
+    pass
@@ -0,0 +1,225 @@
+import re
+from urllib.parse import urlsplit
+
+
+# v 0.0.1
+
+
+ALLOW, DISALLOW = 'allow', 'disallow'
+ANY_AGENT = '*'
+ROBOTS_PATH = '/robots.txt'  # Always allowed
+
+
+class RobotsGroup(object):
+    """
+    Class that holds the rules of one or more user-agent lines, following RFC 9309: the longest matching rule wins,
+    and allow wins a tie.
+
+    Rules are compiled on first use. Plain path prefixes go in a dictionary checked once per distinct prefix length,
+    longest first, and rules with wildcards in a single regular expression whose alternatives are ordered by
+    priority, so a path is checked in a few lookups and one match.
+    """
+    def __init__(self, agents, rules=None, crawl_delay=None):
+        """
+        :param agents: list of str
+        :param rules: list of [ALLOW or DISALLOW, str], in file order
+        :param crawl_delay: float or None
+        """
+        self.agents = agents
+        self.rules = rules if rules is not None else []
+        self.crawl_delay = crawl_delay
+
+        self._prefixes = None  # {path: ALLOW or DISALLOW}
+        self._lengths = None  # Distinct prefix lengths, longest first
+        self._patterns = None  # Wildcard rules, by priority
+        self._matcher = None
+
+    def allowed(self, path):
+        """
+        :param path: str, path and query of the url
+        :return: bool
+        """
+        if self._matcher is None:
+            self._compile()
+
+        best = None  # (length, rule)
+        for length in self._lengths:
+            if length <= len(path) and path[:length] in self._prefixes:
+                best = (length, self._prefixes[path[:length]])
+                break
+
+        match = self._matcher.match(path)
+        if match is not None:
+            rule, pattern = self._patterns[int(match.lastgroup[1:])]
+            if best is None or len(pattern) > best[0] or (len(pattern) == best[0] and rule == ALLOW):
+                best = (len(pattern), rule)
+
+        return best is None or best[1] == ALLOW
+
+    def _compile(self):
+        """
+        :return: None
+        """
+        prefixes = {}
+        patterns = []
+        for rule, path in self.rules:
+            if '*' in path or path.endswith('$'):
+                patterns.append((rule, path))
+            elif prefixes.get(path) != ALLOW:
+                prefixes[path] = rule
+
+        self._prefixes = prefixes
+        self._lengths = sorted(set([len(path) for path in prefixes]), reverse=True)
+        self._patterns = sorted(patterns, key=lambda rule: (-len(rule[1]), rule[0] != ALLOW))
+
+        alternatives = ['(?P<r%s>%s)' % (n, pattern_to_regex(path)) for n, (_, path) in enumerate(self._patterns)]
+        # (?!) never matches, for groups without wildcard rules
+        self._matcher = re.compile('|'.join(alternatives) or '(?!)', re.DOTALL)
+
+
+class Robots(object):
+    """
+    Class that holds a parsed robots.txt: its groups, indexed by user-agent, and every sitemap it lists.
+    """
+    def __init__(self, groups, sitemaps):
+        """
+        :param groups: list of RobotsGroup, in file order
+        :param sitemaps: list of str
+        """
+        self.groups = groups
+        self.sitemaps = sitemaps
+
+        # Groups naming the same agent are merged, agents are case insensitive
+        self._agents = {}
+        for group in groups:
+            for agent in group.agents:
+                merged = self._agents.setdefault(agent.lower(), RobotsGroup([agent]))
+                merged.rules += group.rules
+                if merged.crawl_delay is None:
+                    merged.crawl_delay = group.crawl_delay
+
+    def group_for(self, user_agent):
+        """
+        :param user_agent: str, a product token ('Googlebot') or a whole User-Agent header ('Googlebot/2.1 (...)')
+        :return: RobotsGroup or None, the group of the agent, else the * group, if any
+        """
+        token = user_agent.split('/')[0].strip().lower()
+        return self._agents.get(token) or self._agents.get(ANY_AGENT)
+
+    def can_fetch(self, user_agent, url):
+        """
+        :param user_agent: str
+        :param url: str, absolute url or path
+        :return: bool
+        """
+        split_url = urlsplit(url)
+        path = split_url.path or '/'
+        if split_url.query:
+            path += '?' + split_url.query
+
+        if path == ROBOTS_PATH:
+            return True
+
+        group = self.group_for(user_agent)
+        return group is None or group.allowed(path)
+
+    def crawl_delay(self, user_agent):
+        """
+        :param user_agent: str
+        :return: float or None
+        """
+        group = self.group_for(user_agent)
+        return group.crawl_delay if group else None
+
+    def as_dict(self):
+        """
+        :return: dict, json serializable, {'groups': [{'agents': list, 'rules': list, 'crawl_delay': float}],
+        'sitemaps': list}
+        """
+        return {'groups': [{'agents': group.agents, 'rules': group.rules, 'crawl_delay': group.crawl_delay}
+                           for group in self.groups],
+                'sitemaps': self.sitemaps}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: dict, as_dict() return
+        :return: Robots
+        """
+        return cls([RobotsGroup(group['agents'], [list(rule) for rule in group['rules']], group['crawl_delay'])
+                    for group in data['groups']], list(data['sitemaps']))
+
+
+def parse_robots(text):
+    """
+    Parse a robots.txt. Keys are case insensitive, comments and unknown lines are skipped, and rules before the first
+    user-agent line are ignored.
+
+    :param text: str
+    :return: Robots
+    """
+    groups = []
+    sitemaps = []
+    group = None
+    in_rules = False  # A user-agent line after rules starts a new group
+
+    for line in text.splitlines():
+        key, _, value = line.split('#', 1)[0].partition(':')
+        key = key.strip().lower()
+        value = value.strip()
+
+        if key == 'user-agent':
+            if group is None or in_rules:
+                group = RobotsGroup([])
+                groups.append(group)
+                in_rules = False
+            if value:
+                group.agents.append(value)
+
+        elif key in [ALLOW, DISALLOW]:
+            if group is not None:
+                in_rules = True
+                # An empty disallow allows everything, same as no rule
+                if value:
+                    group.rules.append([key, value])
+
+        elif key == 'crawl-delay':
+            if group is not None:
+                in_rules = True
+                try:
+                    group.crawl_delay = float(value)
+                except ValueError:
+                    pass
+
+        elif key == 'sitemap':
+            if value and value not in sitemaps:
+                sitemaps.append(value)
+
+    return Robots(groups, sitemaps)
+
+
+def load_robots(robots_data):
+    """
+    Get the Robots out of InfoGetter.data['robots'], either structured or the raw text saved by older versions.
+
+    :param robots_data: dict, str or None
+    :return: Robots or None
+    """
+    if not robots_data:
+        return None
+    if isinstance(robots_data, str):
+        return parse_robots(robots_data)
+    return Robots.from_dict(robots_data)
+
+
+def pattern_to_regex(pattern):
+    """
+    :param pattern: str, robots.txt path pattern, * matches any characters and a trailing $ ends the match
+    :return: str, regular expression matching from the start of a path
+    """
+    end = pattern.endswith('$')
+    if end:
+        pattern = pattern[:-1]
+
+    regex = '.*'.join([re.escape(part) for part in pattern.split('*')])
+    return regex + '\\Z' if end else regex
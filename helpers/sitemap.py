@@ -0,0 +1,410 @@
+import time
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+from helpers.lazy_import import lazy_import
+
+
+# v 0.0.1
+
+
+asyncio = lazy_import('asyncio')  # Only async_crawl_sitemaps() needs it
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # Uncompressed size limit of a sitemap, set by the protocol
+DEFAULT_MAX_SITEMAPS = 50  # Sitemaps read per crawl, index files included
+DEFAULT_MAX_TOTAL_BYTES = 100 * 1024 * 1024  # Uncompressed bytes read per crawl, across every sitemap
+DEFAULT_MAX_SECONDS = 60  # Wall time of a crawl
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_SAMPLE_SIZE = 5
+
+GZIP_MAGIC = b'\x1f\x8b'
+DECOMPRESS_CHUNK_SIZE = 64 * 1024  # Bytes inflated at a time, so a gzip bomb is caught at max_bytes
+
+
+class SitemapParser(object):
+    """
+    Class that reads a sitemap or a sitemap index fed in chunks, gzipped or not, keeping only its totals. Every <url>
+    and <sitemap> entry is dropped from the tree once read, so memory stays flat whatever the size of the file.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, sample_size=DEFAULT_SAMPLE_SIZE, budget=None):
+        """
+        :param max_bytes: integer, uncompressed bytes read before raising SitemapTooLarge
+        :param sample_size: integer, number of urls kept as a sample
+        :param budget: CrawlBudget or None, shared with the other sitemaps of a crawl
+        """
+        self.max_bytes = max_bytes
+        self.sample_size = sample_size
+        self.budget = budget
+
+        self.url_count = 0
+        self.lastmod = None  # [oldest, newest], compared as W3C datetime strings
+        self.sample = []
+        self.sitemaps = []  # Child sitemaps listed by an index
+
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._root = None
+        self._head = b''
+        self._decompressor = None
+        self._read = 0
+
+    def feed(self, chunk):
+        """
+        Raises InvalidSitemap, SitemapTooLarge and BudgetExceeded
+
+        :param chunk: bytes
+        :return: None
+        """
+        # Tell gzip apart once the first two bytes are in
+        if self._head is not None:
+            self._head += chunk
+            if len(self._head) < len(GZIP_MAGIC):
+                return
+
+            chunk, self._head = self._head, None
+            if chunk.startswith(GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        if self._decompressor is None:
+            self._feed_xml(chunk)
+            return
+
+        while chunk:
+            try:
+                data = self._decompressor.decompress(chunk, DECOMPRESS_CHUNK_SIZE)
+            except zlib.error:
+                raise InvalidSitemap()
+            chunk = self._decompressor.unconsumed_tail
+            self._feed_xml(data)
+
+    def close(self):
+        """
+        Raises InvalidSitemap
+
+        :return: None
+        """
+        if self._head:
+            self._feed_xml(self._head)
+
+        try:
+            self._parser.close()
+        except ParseError:
+            raise InvalidSitemap()
+        self._read_events()
+
+    def _feed_xml(self, data):
+        """
+        :param data: bytes, uncompressed
+        :return: None
+        """
+        self._read += len(data)
+        if self._read > self.max_bytes:
+            raise SitemapTooLarge()
+        if self.budget is not None:
+            self.budget.spend(len(data))
+
+        try:
+            self._parser.feed(data)
+        except ParseError:
+            raise InvalidSitemap()
+        self._read_events()
+
+    def _read_events(self):
+        """
+        :return: None
+        """
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = elem
+                continue
+
+            tag = local_name(elem.tag)
+            if tag not in ['url', 'sitemap'] or elem is self._root:
+                continue
+
+            entry = {local_name(child.tag): (child.text or '').strip() for child in elem}
+            if entry.get('loc'):
+                if tag == 'sitemap':
+                    self.sitemaps.append(entry['loc'])
+                else:
+                    self._add_url(entry['loc'], entry.get('lastmod'))
+
+            self._root.clear()
+
+    def _add_url(self, loc, lastmod):
+        """
+        :param loc: str
+        :param lastmod: str or None
+        :return: None
+        """
+        self.url_count += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(loc)
+
+        if lastmod:
+            if self.lastmod is None:
+                self.lastmod = [lastmod, lastmod]
+            else:
+                self.lastmod = [min(self.lastmod[0], lastmod), max(self.lastmod[1], lastmod)]
+
+
+class CrawlBudget(object):
+    """
+    Class that holds the uncompressed bytes and the wall time a crawl may spend, across every sitemap it reads
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_TOTAL_BYTES, max_seconds=DEFAULT_MAX_SECONDS):
+        """
+        :param max_bytes: integer
+        :param max_seconds: number, counted from now
+        """
+        self.max_bytes = max_bytes
+        self.deadline = time.monotonic() + max_seconds
+
+        self._read = 0
+        self._lock = threading.Lock()
+
+    def spend(self, n_bytes):
+        """
+        Raises BudgetExceeded
+
+        :param n_bytes: integer
+        :return: None
+        """
+        with self._lock:
+            self._read += n_bytes
+        if self.exceeded():
+            raise BudgetExceeded()
+
+    def exceeded(self):
+        """
+        :return: bool
+        """
+        return self._read > self.max_bytes or time.monotonic() > self.deadline
+
+
+class SitemapStats(object):
+    """
+    Class that adds up the SitemapParser of every sitemap read in a crawl
+    """
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE):
+        """
+        :param sample_size: integer
+        """
+        self.sample_size = sample_size
+
+        self.url_count = 0
+        self.lastmod = None
+        self.sample = []
+        self.sitemaps = 0
+        self.errors = 0
+        self.truncated = False
+
+    def add(self, parser):
+        """
+        :param parser: SitemapParser, closed
+        :return: None
+        """
+        self.sitemaps += 1
+        self.url_count += parser.url_count
+        self.sample += parser.sample[:self.sample_size - len(self.sample)]
+
+        if parser.lastmod:
+            if self.lastmod is None:
+                self.lastmod = list(parser.lastmod)
+            else:
+                self.lastmod = [min(self.lastmod[0], parser.lastmod[0]), max(self.lastmod[1], parser.lastmod[1])]
+
+    def add_partial(self, parser):
+        """
+        Add the urls read out of a sitemap cut short by the crawl budget, truncating the stats
+
+        :param parser: SitemapParser, not closed
+        :return: None
+        """
+        if parser.url_count:
+            self.add(parser)
+        self.truncated = True
+
+    def as_dict(self):
+        """
+        :return: dict, {'url_count': int, 'lastmod': [str, str] or None, 'sample': list of str, 'sitemaps': int,
+        'errors': int, 'truncated': bool}
+        """
+        return {'url_count': self.url_count, 'lastmod': self.lastmod, 'sample': self.sample,
+                'sitemaps': self.sitemaps, 'errors': self.errors, 'truncated': self.truncated}
+
+
+def local_name(tag):
+    """
+    :param tag: str, ElementTree tag, '{namespace}name' or 'name'
+    :return: str, name
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sitemap(chunks, max_bytes=DEFAULT_MAX_BYTES, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Raises InvalidSitemap and SitemapTooLarge
+
+    :param chunks: iterable of bytes
+    :param max_bytes: integer
+    :param sample_size: integer
+    :return: SitemapParser, closed
+    """
+    parser = SitemapParser(max_bytes, sample_size)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+    return parser
+
+
+def crawl_sitemaps(urls, get_chunks, max_workers=DEFAULT_MAX_WORKERS, max_sitemaps=DEFAULT_MAX_SITEMAPS,
+                   sample_size=DEFAULT_SAMPLE_SIZE, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+                   max_seconds=DEFAULT_MAX_SECONDS):
+    """
+    Read the sitemaps at urls and every sitemap their indexes list, up to max_sitemaps, max_workers at a time. A
+    sitemap that can't be fetched or parsed is counted in 'errors'. Once max_total_bytes are read or max_seconds have
+    gone by, the crawl stops as 'truncated', keeping the urls counted up to then.
+
+    :param urls: list of str
+    :param get_chunks: callable, url -> iterable of bytes, closing its response once exhausted or closed
+    :param max_workers: integer
+    :param max_sitemaps: integer
+    :param sample_size: integer
+    :param max_total_bytes: integer, uncompressed, across every sitemap
+    :param max_seconds: number
+    :return: dict, SitemapStats.as_dict()
+    """
+    stats = SitemapStats(sample_size)
+    budget = CrawlBudget(max_total_bytes, max_seconds)
+    seen = set()
+
+    def read(sitemap_url):
+        parser = SitemapParser(sample_size=sample_size, budget=budget)
+        if budget.exceeded():
+            raise BudgetExceeded(parser)
+
+        chunks = get_chunks(sitemap_url)
+        try:
+            for chunk in chunks:
+                parser.feed(chunk)
+        except BudgetExceeded:
+            raise BudgetExceeded(parser)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        parser.close()
+        return parser
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+
+        def submit(sitemap_urls):
+            for sitemap_url in sitemap_urls:
+                if sitemap_url in seen:
+                    continue
+                if len(seen) >= max_sitemaps or budget.exceeded():
+                    stats.truncated = True
+                    return
+
+                seen.add(sitemap_url)
+                running[executor.submit(read, sitemap_url)] = sitemap_url
+
+        submit(urls)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                try:
+                    parser = future.result()
+                except BudgetExceeded as e:
+                    stats.add_partial(e.args[0])
+                    continue
+                except Exception:
+                    stats.errors += 1
+                    continue
+
+                stats.add(parser)
+                submit(parser.sitemaps)
+
+    return stats.as_dict()
+
+
+async def async_crawl_sitemaps(urls, get_chunks, max_workers=DEFAULT_MAX_WORKERS, max_sitemaps=DEFAULT_MAX_SITEMAPS,
+                               sample_size=DEFAULT_SAMPLE_SIZE, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+                               max_seconds=DEFAULT_MAX_SECONDS):
+    """
+    Same as crawl_sitemaps(), with max_workers sitemaps read at a time on the running event loop.
+
+    :param urls: list of str
+    :param get_chunks: callable, url -> async iterable of bytes, closing its response once exhausted or closed
+    :param max_workers: integer
+    :param max_sitemaps: integer
+    :param sample_size: integer
+    :param max_total_bytes: integer
+    :param max_seconds: number
+    :return: dict, SitemapStats.as_dict()
+    """
+    stats = SitemapStats(sample_size)
+    budget = CrawlBudget(max_total_bytes, max_seconds)
+    seen = set()
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def read(sitemap_url):
+        async with semaphore:
+            parser = SitemapParser(sample_size=sample_size, budget=budget)
+            if budget.exceeded():
+                raise BudgetExceeded(parser)
+
+            chunks = get_chunks(sitemap_url)
+            try:
+                async for chunk in chunks:
+                    parser.feed(chunk)
+            except BudgetExceeded:
+                raise BudgetExceeded(parser)
+            finally:
+                if hasattr(chunks, 'aclose'):
+                    await chunks.aclose()
+            parser.close()
+            return parser
+
+    pending = list(urls)
+    while pending:
+        batch = []
+        for sitemap_url in pending:
+            if sitemap_url in seen:
+                continue
+            if len(seen) >= max_sitemaps or budget.exceeded():
+                stats.truncated = True
+                break
+
+            seen.add(sitemap_url)
+            batch.append(sitemap_url)
+
+        pending = []
+        for result in await asyncio.gather(*[read(sitemap_url) for sitemap_url in batch], return_exceptions=True):
+            if isinstance(result, BudgetExceeded):
+                stats.add_partial(result.args[0])
+            elif isinstance(result, Exception):
+                stats.errors += 1
+            else:
+                stats.add(result)
+                pending += result.sitemaps
+
+    return stats.as_dict()
+
+
+# Exceptions
+class InvalidSitemap(Exception):
+    pass
+
+
+class SitemapTooLarge(Exception):
+    pass
+
+
+class BudgetExceeded(Exception):
+    pass
@@ -0,0 +1,133 @@
+import codecs
+from html.parser import HTMLParser
+
+
+# v 0.0.1
+
+
+DEFAULT_MAX_BYTES = 256 * 1024  # Bytes read looking for the title before giving up
+
+
+class TitleParser(HTMLParser):
+    """
+    Class that reads the <title> of an HTML document fed in chunks, stopping as soon as it's closed or the <head> ends.
+
+    The title matches BeautifulSoup's soup.title.string with html.parser: the text of the first <title>, or None if it
+    is empty. A <title> holding anything but text sets self.failed, as the tree would be needed to tell the string.
+    """
+    def __init__(self, encoding=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param encoding: str or None, defaults at utf-8, as do charsets Python doesn't know
+        :param max_bytes: integer, bytes fed before giving up
+        """
+        super(TitleParser, self).__init__(convert_charrefs=True)
+
+        self.max_bytes = max_bytes
+
+        self.title = None
+        self.done = False
+        self.failed = False
+
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._read = 0
+        self._in_title = False
+        self._parts = []
+
+    def feed_bytes(self, chunk):
+        """
+        :param chunk: bytes
+        :return: bool, True once no more chunks are needed
+        """
+        self._read += len(chunk)
+        self.feed(self._decoder.decode(chunk))
+
+        if not self.done and self._read >= self.max_bytes:
+            self._fail()
+
+        return self.done
+
+    def get_title(self):
+        """
+        Raises TitleNotFound if the head ended, max_bytes were read or the chunks ran out before a plain text title
+        was found.
+
+        :return: str or None, None if the title is empty
+        """
+        if not self.done or self.failed:
+            raise TitleNotFound()
+
+        return self.title
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+
+        if self._in_title:
+            self._fail()
+        elif tag == 'title':
+            self._in_title = True
+        elif tag == 'body':
+            self._fail()
+
+    def handle_startendtag(self, tag, attrs):
+        if self._in_title or tag == 'title':
+            self._fail()
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+
+        if self._in_title:
+            if tag != 'title':
+                self._fail()
+                return
+
+            self.title = ''.join(self._parts) or None
+            self._in_title = False
+            self.done = True
+
+        elif tag == 'head':
+            self._fail()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._parts.append(data)
+
+    def handle_comment(self, data):
+        if self._in_title:
+            self._fail()
+
+    def _fail(self):
+        """
+        :return: None
+        """
+        self.failed = True
+        self.done = True
+
+
+def stream_title(chunks, encoding=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Read the title out of an HTML document, consuming chunks only until it's found.
+
+    Raises TitleNotFound
+
+    :param chunks: iterable of bytes
+    :param encoding: str or None, defaults at utf-8
+    :param max_bytes: integer
+    :return: str or None, None if the title is empty
+    """
+    parser = TitleParser(encoding, max_bytes)
+
+    for chunk in chunks:
+        if parser.feed_bytes(chunk):
+            break
+
+    return parser.get_title()
+
+
+# Exceptions
+class TitleNotFound(Exception):
+    pass
@@ -0,0 +1,511 @@
+import re
+import time
+import socket
+import bisect
+import functools
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from helpers.lazy_import import lazy_import
+from helpers.lookup_cache import MISSING
+
+
+# v 0.0.1
+
+
+# python-whois, for its server table and parsers, only imported by the first query. The whois.whois module is shadowed
+# by the whois.whois() function in the package namespace, so it's imported on its own
+whois = lazy_import('whois')
+nic_client = lazy_import('whois.whois')
+
+WHOIS_PORT = 43
+IANA_HOST = 'whois.iana.org'
+
+DEFAULT_TIMEOUT = 10  # Seconds a whole lookup may take, referrals included
+DEFAULT_SERVER_LIMIT = 4  # Queries in flight per whois server, registries throttle or ban past a few
+DEFAULT_WORKERS = 16  # Lookups run at once by first_answer()
+MAX_RESPONSE_BYTES = 512 * 1024
+
+REFER_RE = re.compile(r'^refer:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+RANGE_RE = re.compile(r'^inet6?num:\s*(.+?)\s*$', re.IGNORECASE | re.MULTILINE)
+REFERRAL_SERVER_RE = re.compile(r'^ReferralServer:\s*whois://([^\s:/]+)', re.IGNORECASE | re.MULTILINE)
+NET_RANGE_RE = re.compile(r'^NetRange:', re.IGNORECASE | re.MULTILINE)
+FIELD_RE = re.compile(r'^([A-Za-z][\w-]*):[ \t]*(.*?)\s*$')
+
+# Fields of an IP's entry, and the labels each is read from, in RPSL as RIPE, APNIC, AFRINIC and LACNIC answer, or as
+# ARIN does. Same keys as the domain entries the maps and report read, plus the network's own
+RIR_FIELDS = {
+    'name': ['netname'],
+    'org': ['org-name', 'orgname', 'owner', 'descr'],
+    'registry': ['source'],
+    'address': ['address'],
+    'city': ['city'],
+    'state': ['stateprov'],
+    'zipcode': ['postalcode'],
+    'country': ['country'],
+    'netrange': ['inetnum', 'inet6num', 'netrange'],
+    'cidr': ['cidr', 'route', 'route6'],
+    'origin': ['originas', 'origin'],
+    'emails': ['abuse-mailbox', 'orgabuseemail', 'e-mail'],
+    'creation_date': ['created', 'regdate'],
+    'updated_date': ['last-modified', 'updated', 'changed'],
+    'description': ['descr'],
+}
+RIR_JOINED_FIELDS = ['address', 'description']  # Every line of the object holding them, rather than the first
+RIR_LIST_FIELDS = ['emails']
+
+
+def parse_rir_answer(query, text, server):
+    """
+    Parse the answer of a regional internet registry to an IP. Answers hold several objects, split by blank lines, e.g.
+    the network, its organisation and the route announcing it, so each field is read from the first object that has
+    one of its labels. ARIN lists every network holding the IP, least specific first, so only the last one is read.
+
+    Raises NoWhoisRecord
+
+    :param query: str, the IP
+    :param text: str
+    :param server: str, the registry, if the answer doesn't tell
+    :return: dict, {field in RIR_FIELDS: str, list of str or None}
+    """
+    net_ranges = [match.start() for match in NET_RANGE_RE.finditer(text)]
+    if len(net_ranges) > 1:
+        text = text[net_ranges[-1]:]
+
+    objects = []  # [{label: [values]}]
+    fields = {}
+    for line in text.splitlines():
+        if not line.strip():
+            fields = {}
+            continue
+        match = FIELD_RE.match(line)
+        if match and match.group(2):
+            if not fields:
+                objects.append(fields)
+            fields.setdefault(match.group(1).lower(), []).append(match.group(2))
+
+    entry = {}
+    for field, labels in RIR_FIELDS.items():
+        values = next((fields[label] for label in labels for fields in objects if label in fields), None)
+        if values is None or field in RIR_LIST_FIELDS:
+            entry[field] = values
+        elif field in RIR_JOINED_FIELDS:
+            entry[field] = ', '.join(values)
+        else:
+            entry[field] = values[0]
+
+    if not entry['netrange'] and not entry['name']:
+        raise NoWhoisRecord(query)
+
+    # RIPE's source reads 'RIPE # Filtered'
+    entry['registry'] = entry['registry'].split('#')[0].strip() if entry['registry'] else server
+    return entry
+
+
+def parse_range(value):
+    """
+    :param value: str, as IANA gives them, '93.0.0.0 - 93.255.255.255' or '2a00::/12'
+    :return: tuple, (version, first address, last address) as integers
+    """
+    if '-' in value:
+        first, last = [ipaddress.ip_address(elem.strip()) for elem in value.split('-', 1)]
+    else:
+        network = ipaddress.ip_network(value.strip(), strict=False)
+        first, last = network.network_address, network.broadcast_address
+    return first.version, int(first), int(last)
+
+
+@functools.lru_cache(maxsize=None)
+def _nic_client_class():
+    """
+    Subclass of whois' NICClient, made on first use as whois is imported lazily.
+
+    :return: type
+    """
+    class ReferringNICClient(nic_client.NICClient):
+        """
+        NICClient that asks referral for the whois server of the TLDs missing from its table, instead of IANA.
+        """
+        def __init__(self, referral):
+            """
+            :param referral: callable, taking a TLD, returning its whois server or None
+            """
+            super().__init__()
+            self.referral = referral
+
+        def findwhois_iana(self, tld):
+            return self.referral(tld)
+
+    return ReferringNICClient
+
+
+class ReferralCache(object):
+    """
+    Class that holds, thread-safe, the whois server IANA refers to for each TLD and IP range, so each is only asked
+    for once per process.
+    """
+    def __init__(self):
+        self._tlds = {}  # {tld: server or None}
+        self._starts = {4: [], 6: []}  # {version: [first address]}, sorted, to bisect
+        self._ranges = {4: [], 6: []}  # {version: [(first address, last address, server)]}, in the same order
+        self._lock = threading.Lock()
+
+    def tld(self, tld):
+        """
+        :param tld: str
+        :return: str, None if the TLD has no whois server, or MISSING if it's not cached
+        """
+        with self._lock:
+            return self._tlds.get(tld.lower(), MISSING)
+
+    def set_tld(self, tld, server):
+        """
+        :param tld: str
+        :param server: str or None
+        :return: None
+        """
+        with self._lock:
+            self._tlds[tld.lower()] = server
+
+    def ip(self, address):
+        """
+        :param address: str
+        :return: str, or MISSING if no cached range holds address
+        """
+        address = ipaddress.ip_address(address)
+        value = int(address)
+        with self._lock:
+            i = bisect.bisect_right(self._starts[address.version], value) - 1
+            if i >= 0:
+                first, last, server = self._ranges[address.version][i]
+                if first <= value <= last:
+                    return server
+        return MISSING
+
+    def add_range(self, version, first, last, server):
+        """
+        :param version: int, 4 or 6
+        :param first: int, first address
+        :param last: int, last address
+        :param server: str
+        :return: None
+        """
+        with self._lock:
+            i = bisect.bisect_left(self._starts[version], first)
+            if i < len(self._starts[version]) and self._starts[version][i] == first:
+                self._ranges[version][i] = (first, last, server)
+            else:
+                self._starts[version].insert(i, first)
+                self._ranges[version].insert(i, (first, last, server))
+
+    def stats(self):
+        """
+        :return: dict, {'tlds': int, 'ranges': int}
+        """
+        with self._lock:
+            return {'tlds': len(self._tlds), 'ranges': sum(len(ranges) for ranges in self._ranges.values())}
+
+
+class WhoisClient(object):
+    """
+    Class that makes whois lookups over port 43 itself, rather than through whois.whois(), which has no deadline:
+        - Every lookup, referrals included, is over by a deadline, past it WhoisTimeout is raised.
+        - The whois server of each TLD and IP range is asked to IANA once, and kept in a ReferralCache.
+        - No more than server_limit queries are in flight per whois server, the rest wait for a slot, within their
+        deadline, so batches don't hammer the same registries.
+        - first_answer() runs the lookups of several queries at once, on a bounded pool, e.g. a domain and its IP.
+
+    Domain answers are parsed by whois' parsers, so lookups return the same entries whois.whois() does. IPs are looked
+    up on the registry of their range, rather than on the domain their reverse DNS name belongs to, and their answers
+    parsed by parse_rir_answer().
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, server_limit=DEFAULT_SERVER_LIMIT, workers=DEFAULT_WORKERS,
+                 referrals=None, port=WHOIS_PORT, iana=IANA_HOST):
+        """
+        :param timeout: float, seconds a lookup may take
+        :param server_limit: int, queries in flight per server
+        :param workers: int, lookups run at once by first_answer()
+        :param referrals: ReferralCache or None, shared between clients if given
+        :param port: int, every server is queried on it
+        :param iana: str, server asked for the referrals
+        """
+        self.timeout = timeout
+        self.server_limit = server_limit
+        self.workers = workers
+        self.referrals = ReferralCache() if referrals is None else referrals
+        self.port = port
+        self.iana = iana
+
+        self._slots = {}  # {server: threading.BoundedSemaphore}
+        self._slots_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def whois(self, query, deadline=None):
+        """
+        Look up query on the whois server of its TLD, or of its range if it's an IP, following the referral to the
+        registrar's server if there is one.
+
+        Raises WhoisTimeout, WhoisServerError, NoWhoisServer, NoWhoisRecord
+
+        :param query: str, url, domain or IP
+        :param deadline: float or None, time.monotonic() the lookup has to be over by, defaults at timeout from now
+        :return: whois.parser.WhoisEntry, a dict, or a dict of RIR_FIELDS if query is an IP, see parse_rir_answer()
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+
+        try:
+            ipaddress.ip_address(query)
+        except ValueError:
+            return self._whois_domain(query, deadline)
+        return self._whois_ip(query, deadline)
+
+    def first_answer(self, queries, lookup=None, errors=()):
+        """
+        Run lookup on every query at once, and return the answer of the first query, in the order given, that has
+        one: later queries only answer if the earlier ones failed, but are already under way by then. Lookups still
+        running once an answer is returned are left to finish on their own deadline.
+
+        Each lookup has timeout seconds from the moment a worker of the pool picks it up, so lookups queued behind
+        others, e.g. those of a busy batch, don't run out of time before starting.
+
+        Raises WhoisTimeout, or the error of the last query if none answered
+
+        :param queries: list of str
+        :param lookup: callable or None, taking a query and a deadline keyword, defaults at whois()
+        :param errors: tuple of exception types, raised by lookup when a query has no answer, besides WhoisError
+        :return: lookup's return
+        """
+        lookup = self.whois if lookup is None else lookup
+
+        started = [threading.Event() for _ in queries]
+        deadlines = [None] * len(queries)
+
+        def run(i):
+            deadlines[i] = time.monotonic() + self.timeout
+            started[i].set()
+            return lookup(queries[i], deadline=deadlines[i])
+
+        futures = [self._get_pool().submit(run, i) for i in range(len(queries))]
+        error = NoWhoisRecord(', '.join(queries))
+
+        for i, future in enumerate(futures):
+            started[i].wait()
+            try:
+                return future.result(timeout=max(deadlines[i] - time.monotonic(), 0))
+            except (WhoisError,) + tuple(errors) as e:
+                error = e
+            except TimeoutError:
+                # Out of time, the answer of a later query is still better than none
+                for later in futures[i + 1:]:
+                    if later.done() and not later.cancelled() and later.exception() is None:
+                        return later.result()
+                    later.cancel()
+                raise WhoisTimeout('%s in %ss' % (queries[i], self.timeout))
+
+        raise error
+
+    def query(self, server, query, deadline):
+        """
+        Send a query to a whois server, and read its answer, waiting for a slot of the server first.
+
+        Raises WhoisTimeout, WhoisServerError
+
+        :param server: str
+        :param query: str
+        :param deadline: float, time.monotonic()
+        :return: str
+        """
+        slots = self._server_slots(server)
+        if not slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise WhoisTimeout('%s, waiting for a slot of %s' % (query, server))
+
+        try:
+            connection = socket.create_connection((server, self.port), timeout=self._remaining(deadline, server))
+            try:
+                connection.sendall(query.encode('utf-8') + b'\r\n')
+
+                response = b''
+                while len(response) < MAX_RESPONSE_BYTES:
+                    connection.settimeout(self._remaining(deadline, server))
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        break
+                    response += chunk
+            finally:
+                connection.close()
+        except socket.timeout:
+            raise WhoisTimeout('%s on %s' % (query, server))
+        except OSError as e:
+            raise WhoisServerError('%s: %s' % (server, e))
+        finally:
+            slots.release()
+
+        return response.decode('utf-8', 'replace')
+
+    def close(self):
+        """
+        :return: None
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def _whois_domain(self, query, deadline):
+        """
+        Same steps as whois.whois(): the server of the TLD, then the one it refers to, if any.
+
+        :param query: str
+        :param deadline: float
+        :return: whois.parser.WhoisEntry
+        """
+        domain = whois.extract_domain(query).encode('idna').decode('utf-8')
+        server = _nic_client_class()(lambda tld: self._tld_server(tld, deadline)).choose_server(domain)
+        if not server:
+            raise NoWhoisServer(domain)
+
+        text = self.query(server, self._format_query(server, domain), deadline)
+        if 'with "=xxx"' in text:  # Verisign lists every match unless asked for the exact one
+            text = self.query(server, '=' + domain, deadline)
+
+        referred = nic_client.NICClient.findwhois_server(text, server, domain)
+        if referred and referred != server:
+            text += self.query(referred, self._format_query(referred, domain), deadline)
+
+        return self._parse(domain, text)
+
+    def _whois_ip(self, ip, deadline):
+        """
+        :param ip: str
+        :param deadline: float
+        :return: dict, see parse_rir_answer()
+        """
+        server = self.referrals.ip(ip)
+        if server is MISSING:
+            text = self.query(self.iana, ip, deadline)
+            refer = REFER_RE.search(text)
+            ip_range = RANGE_RE.search(text)
+            if not refer:
+                raise NoWhoisServer(ip)
+
+            server = refer.group(1)
+            if ip_range:
+                try:
+                    self.referrals.add_range(*parse_range(ip_range.group(1)), server)
+                except ValueError:
+                    pass
+
+        text = self.query(server, ip, deadline)
+
+        # ARIN hands the ranges it transferred over to the registry holding them now
+        referred = REFERRAL_SERVER_RE.search(text)
+        if referred and referred.group(1) != server:
+            server = referred.group(1)
+            text = self.query(server, ip, deadline)
+
+        return parse_rir_answer(ip, text, server)
+
+    def _tld_server(self, tld, deadline):
+        """
+        :param tld: str
+        :param deadline: float
+        :return: str or None
+        """
+        server = self.referrals.tld(tld)
+        if server is MISSING:
+            refer = REFER_RE.search(self.query(self.iana, tld, deadline))
+            server = refer.group(1) if refer else None
+            self.referrals.set_tld(tld, server)
+        return server
+
+    @staticmethod
+    def _format_query(server, domain):
+        """
+        Queries some registries want formatted their own way, as whois' NICClient.whois() sends them.
+
+        :param server: str
+        :param domain: str
+        :return: str
+        """
+        if server == nic_client.NICClient.DENICHOST:
+            return '-T dn,ace -C UTF-8 ' + domain
+        if server == nic_client.NICClient.DK_HOST:
+            return ' --show-handles ' + domain
+        if server.endswith('.jp'):
+            return domain + '/e'
+        return domain
+
+    @staticmethod
+    def _parse(query, text):
+        """
+        Raises NoWhoisRecord
+
+        :param query: str
+        :param text: str
+        :return: whois.parser.WhoisEntry
+        """
+        if not text.strip():
+            raise NoWhoisRecord(query)
+
+        try:
+            return whois.parser.WhoisEntry.load(query, text)
+        except whois.exceptions.PywhoisError as e:
+            raise NoWhoisRecord('%s: %s' % (query, e))
+
+    def _server_slots(self, server):
+        """
+        :param server: str
+        :return: threading.BoundedSemaphore
+        """
+        with self._slots_lock:
+            slots = self._slots.get(server)
+            if slots is None:
+                slots = self._slots[server] = threading.BoundedSemaphore(self.server_limit)
+            return slots
+
+    def _get_pool(self):
+        """
+        :return: ThreadPoolExecutor
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='whois')
+            return self._pool
+
+    @staticmethod
+    def _remaining(deadline, server):
+        """
+        Raises WhoisTimeout
+
+        :param deadline: float
+        :param server: str
+        :return: float, seconds left
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise WhoisTimeout(server)
+        return remaining
+
+
+# Exceptions
+class WhoisError(Exception):
+    pass
+
+
+class WhoisTimeout(WhoisError):
+    pass
+
+
+class WhoisServerError(WhoisError):
+    pass
+
+
+class NoWhoisServer(WhoisError):
+    pass
+
+
+class NoWhoisRecord(WhoisError):
+    pass
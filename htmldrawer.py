@@ -1,16 +1,14 @@
+import os
 import json
+import hashlib
 
+BUFFER_SIZE = 1 << 16  # Bytes buffered before each write to output.html
+CHUNK_SIZE = 1 << 16  # Characters of a long text rendered at once
 
-def html_draw(data, filepath):
-    """
-    Generate the HTML for the report, save it under filepath/output.html.
-
-    :param data: dict, InfoGet.run() return
-    :param filepath: str, valid path
+RENDERER_VERSION = 1  # Bump along with any change to the output, so every saved report is drawn again
+RENDER_KEY_FILE = 'output.key'  # Saved next to output.html, render_key() of the data.json it was drawn from
 
-    :return: None
-    """
-    css = '''
+CSS = '''
     <style>
     body{
         color: #333333;
@@ -40,123 +38,258 @@ def html_draw(data, filepath):
     </style>
     '''
 
-    # START
-    start = '''<!DOCTYPE html>\n<html>\n%s\n<head>\n\t\t<title>Report on: %s</title>\n</head>\n<body>\n\t''' \
-            % (css, data['url'])
-    end = '\n\t</body>\n</html>'
-    output = start
+SECTIONS = ['main', 'whois', 'geolocation', 'builtwith', 'robots', 'sitemap', 'wiki']
 
-    # TITLE
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h1>Report on %s</h1>' % data['url']
+# Templates, formatted with % as they are written
+START = '''<!DOCTYPE html>\n<html>\n%s\n<head>\n\t\t<title>Report on: %s</title>\n</head>\n<body>\n\t'''
+END = '\n\t</body>\n</html>'
 
-    # TOP-BAR
-    sections = ['main', 'whois', 'geolocation', 'builtwith', 'robots', 'sitemap', 'wiki']
-    output += '\n\t\t\t<p class="aligncenter">'
-    for section in sections:
-        output += '<a href=#%s>%s</a> | ' % (section, section)
-    output += '</p>'
-    output += '\n\t\t\t</div>'
+TITLE = '\n\t\t\t<div class="elem">\n\t\t\t<h1>Report on %s</h1>'
+TOP_BAR = '\n\t\t\t<p class="aligncenter">' + \
+          ''.join(['<a href=#%s>%s</a> | ' % (section, section) for section in SECTIONS]) + \
+          '</p>\n\t\t\t</div>'
 
-    # MAIN
-    output += '\n\t\t\t<a name="main"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Main:</u></b></h2>'
-    output += '''
+SECTION_START = '\n\t\t\t<a name="%s"></a>\n\t\t\t<div class="elem">\n\t\t\t<h2><b><u>%s:</u></b></h2>'
+SECTION_END = '\n\t\t\t</div>'
+
+MAIN = '''
     \n\t\t\t<b>URL:</b> %s
     \t\t\t<br><b>IP:</b> %s
     \t\t\t<br><b>TITLE:</b> %s
     \t\t\t<br><b>ESTIMATED SIZE:</b> <a href=%s>%s</a>
     \t\t\t<br><b>POTENTIAL API:</b> <a href=%s>%s</a>
     \t\t\t<br><b>LINK TO LATEST NEWS:</b> <a href=%s>%s</a>
-    ''' % (data['url'], data['ip'], data['title'], data['estimated'][0], data['estimated'][1],
-           data['potential_api'], data['potential_api'], data['news_url'], data['news_url'])
-    output += '\n\t\t\t</div>'
+    '''
+
+LIST_START = '\n\t\t\t<ul>'
+LIST_END = '\n\t\t\t</ul>'
+BOLD_ITEM_OPEN = '\n\t\t\t\t<li><b>'
+BOLD_ITEM_CLOSE = '</b></li>'
+BOLD_ITEM = BOLD_ITEM_OPEN + '%s' + BOLD_ITEM_CLOSE
+KEY_VALUE_ITEM = '\n\t\t\t\t<li><b>%s:</b> %s</li>'
+NESTED_ITEM = '\n\t\t\t\t\t<li>%s</li>'
+NESTED_LIST_END = '\n\t\t\t\t</ul></li>'
+
+NESTED_LIST_START = '\n\t\t\t\t<li><b>%s</b>\n\t\t\t\t<ul>'
+WHOIS_MAP = '\n\t\t\t<p class="aligncenter"><a href="%s"><iframe height=300 width=300 ' \
+            'src="%s" frameborder="0" scrolling="no" marginheight="0" marginwidth="0">' \
+            '</iframe></a></p>'
+
+GEO_LIST_START = '\n\t\t\t\t<ul>'
+GEO_NESTED_LIST_START = '\n\t\t\t<li><b>%s</b>\n\t\t\t\t<li><ul>'
+GEO_MAP = '\n\t\t\t<p class="aligncenter"><a href="%s"><img width=300 height=300 src="location.jpg"></a></p>'
+
+ROBOTS_RULE = '\n\t\t\t\t\t<li>%s: %s</li>'
+
+SITEMAP = '\n\t\t\t<b>URL:</b> <a href=%s>%s</a>'
+SITEMAP_STATS = '\n\t\t\t<br><b>URLS:</b> %s, in %s sitemaps (%s failed%s)\n\t\t\t<br><b>LAST MODIFIED:</b> %s'
+SITEMAP_TRUNCATED = ', stopped early'
+SITEMAP_SAMPLE = '\n\t\t\t<br><b>SAMPLE:</b>'
+LINK_ITEM = '\n\t\t\t\t<li><a href=%s>%s</a></li>'
+WIKI = '\n\t\t\t\t<br><iframe src=%s width=850 height=800></iframe>'
+
+
+def html_draw(data, filepath):
+    """
+    Generate the HTML for the report, save it under filepath/output.html.
+
+    Sections are streamed into the file as they are rendered, so the report is never held in memory as a whole.
+
+    :param data: dict, InfoGet.run() return
+    :param filepath: str, valid path
+
+    :return: None
+    """
+    # Whatever output.html was drawn from, it isn't anymore
+    try:
+        os.remove('%s/%s' % (filepath, RENDER_KEY_FILE))
+    except FileNotFoundError:
+        pass
+
+    with open('%s/output.html' % filepath, 'w', encoding='utf-8', buffering=BUFFER_SIZE) as f:
+        f.writelines(render(data))
+
+
+def draw_report(filepath, data=None, force=False):
+    """
+    Draw filepath/output.html out of filepath/data.json, unless it's current: drawn by this RENDERER_VERSION out of
+    the same data.json, as recorded by RENDER_KEY_FILE. Checking a current report only reads and hashes data.json.
+
+    :param filepath: str, path of the report, holding data.json
+    :param data: dict or None, the content of data.json if already loaded
+    :param force: bool, draw it even if current
+    :return: bool, True if drawn
+    """
+    with open('%s/data.json' % filepath, 'rb') as f:
+        content = f.read()
+
+    key = render_key(content)
+    if not force and is_current(filepath, key):
+        return False
+
+    if data is None:
+        data = json.loads(content)
+
+    html_draw(data, filepath)
+
+    # Saved last, so a draw that fails halfway leaves the report stale
+    with open('%s/%s' % (filepath, RENDER_KEY_FILE), 'w', encoding='utf-8') as f:
+        f.write(key)
+
+    return True
+
+
+def render_key(content):
+    """
+    :param content: bytes, content of a data.json
+    :return: str, hex digest of content and RENDERER_VERSION
+    """
+    digest = hashlib.sha256(b'%d\n' % RENDERER_VERSION)
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def is_current(filepath, key):
+    """
+    Check if filepath/output.html was drawn out of the data.json key comes from.
+
+    :param filepath: str, path of the report
+    :param key: str, render_key() of filepath/data.json
+    :return: bool
+    """
+    if not os.path.isfile('%s/output.html' % filepath):
+        return False
+
+    try:
+        with open('%s/%s' % (filepath, RENDER_KEY_FILE), 'r', encoding='utf-8') as f:
+            return f.read() == key
+    except FileNotFoundError:
+        return False
+
+
+def render(data):
+    """
+    Render the report piece by piece.
+
+    :param data: dict, InfoGet.run() return
+    :return: generator of str
+    """
+    yield START % (CSS, data['url'])
+
+    # TITLE
+    yield TITLE % data['url']
+    yield TOP_BAR
+
+    # MAIN
+    yield SECTION_START % ('main', 'Main')
+    yield MAIN % (data['url'], data['ip'], data['title'], data['estimated'][0], data['estimated'][1],
+                  data['potential_api'], data['potential_api'], data['news_url'], data['news_url'])
+    yield SECTION_END
 
     # WHOIS
-    output += '\n\t\t\t<a name="whois"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Whois:</u></b></h2>'
+    yield SECTION_START % ('whois', 'Whois')
     if data['whois']:
-        output += '\n\t\t\t<ul>'
-        for key in data['whois'].keys():
-            if isinstance(data['whois'][key], list):
-                output += '\n\t\t\t\t<li><b>%s</b>' % key
-                output += '\n\t\t\t\t<ul>'
-                for elem in data['whois'][key]:
-                    output += '\n\t\t\t\t\t<li>%s</li>' % elem
-                output += '\n\t\t\t\t</ul></li>'
+        yield LIST_START
+        for key, value in data['whois'].items():
+            if isinstance(value, list):
+                yield NESTED_LIST_START % key
+                for elem in value:
+                    yield NESTED_ITEM % elem
+                yield NESTED_LIST_END
             else:
-                output += '\n\t\t\t\t<li><b>%s:</b> %s</li>' % (key, data['whois'][key])
-        output += '\n\t\t\t</ul>'
-        output += '\n\t\t\t<p class="aligncenter"><a href="%s"><iframe height=300 width=300 ' \
-                  'src="%s" frameborder="0" scrolling="no" marginheight="0" marginwidth="0">' \
-                  '</iframe></a></p>' % (data['geo_maps'][0], data['geo_maps'][0])
-    output += '\n\t\t\t</div>'
+                yield KEY_VALUE_ITEM % (key, value)
+        yield LIST_END
+        yield WHOIS_MAP % (data['geo_maps'][0], data['geo_maps'][0])
+    yield SECTION_END
 
     # GEOLOCATION
-    output += '\n\t\t\t<a name="geolocation"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Geolocation:</u></b></h2>'
+    yield SECTION_START % ('geolocation', 'Geolocation')
     if data['geo_location']:
-        output += '\n\t\t\t\t<ul>'
-        for key in data['geo_location'].keys():
-            if isinstance(data['geo_location'][key], list):
-                output += '\n\t\t\t<li><b>%s</b>' % key
-                output += '\n\t\t\t\t<li><ul>'
-                for elem in data['geo_location'][key]:
-                    output += '\n\t\t\t\t\t<li>%s</li>' % elem
-                output += '\n\t\t\t\t</ul></li>'
+        yield GEO_LIST_START
+        for key, value in data['geo_location'].items():
+            if isinstance(value, list):
+                yield GEO_NESTED_LIST_START % key
+                for elem in value:
+                    yield NESTED_ITEM % elem
+                yield NESTED_LIST_END
             else:
-                output += '\n\t\t\t\t<li><b>%s:</b> %s</li>' % (key, data['geo_location'][key])
-        output += '\n\t\t\t</ul>'
-        output += '\n\t\t\t<p class="aligncenter"><a href="%s"><img width=300 height=300 src="location.jpg"></a></p>' \
-                  % data['geo_maps'][1]
-    output += '\n\t\t\t</div>'
+                yield KEY_VALUE_ITEM % (key, value)
+        yield LIST_END
+        yield GEO_MAP % data['geo_maps'][1]
+    yield SECTION_END
 
     # BUILTWITH
-    output += '\n\t\t\t<a name="builtwith"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Builtwith:</u></b></h2>'
+    yield SECTION_START % ('builtwith', 'Builtwith')
     if data['builtwith']:
-        output += '\n\t\t\t<ul>'
+        yield LIST_START
         for elem in data['builtwith']:
-            output += '\n\t\t\t\t<li><b>%s</b></li>' % elem
-        output += '\n\t\t\t</ul>'
-    output += '\n\t\t\t</div>'
+            yield BOLD_ITEM % elem
+        yield LIST_END
+    yield SECTION_END
 
     # ROBOTS
-    output += '\n\t\t\t<a name="robots"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Robots:</u></b></h2>'
-    if data['robots']:
-        robots = data['robots'].split('\n')
-        output += '\n\t\t\t<ul>'
-        for elem in robots:
-            output += '\n\t\t\t\t<li><b>%s</b></li>' % elem
-        output += '\n\t\t\t</ul>'
-    output += '\n\t\t\t</div>'
+    yield SECTION_START % ('robots', 'Robots')
+    if isinstance(data['robots'], str) and data['robots']:
+        # Raw robots.txt saved by older versions
+        yield LIST_START
+        for lines in _split_chunks(data['robots']):
+            yield BOLD_ITEM_OPEN + (BOLD_ITEM_CLOSE + BOLD_ITEM_OPEN).join(lines) + BOLD_ITEM_CLOSE
+        yield LIST_END
+    elif data['robots']:
+        yield LIST_START
+        for group in data['robots']['groups']:
+            yield NESTED_LIST_START % ('User-agent: %s' % ', '.join(group['agents']))
+            if group['crawl_delay'] is not None:
+                yield NESTED_ITEM % ('Crawl-delay: %s' % group['crawl_delay'])
+            for rule, path in group['rules']:
+                yield ROBOTS_RULE % (rule.capitalize(), path)
+            yield NESTED_LIST_END
+        for elem in data['robots']['sitemaps']:
+            yield BOLD_ITEM % ('Sitemap: %s' % elem)
+        yield LIST_END
+    yield SECTION_END
 
     # SITEMAP
-    output += '\n\t\t\t<a name="sitemap"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Sitemap:</u></b></h2>'
+    yield SECTION_START % ('sitemap', 'Sitemap')
     if data['sitemap']:
-        output += '\n\t\t\t\t<br><iframe width=850 height=800 src=%s></iframe>' % data['sitemap']
-    output += '\n\t\t\t</div>'
+        yield SITEMAP % (data['sitemap'], data['sitemap'])
+
+        stats = data.get('sitemap_stats')
+        if stats:
+            lastmod = '%s to %s' % tuple(stats['lastmod']) if stats['lastmod'] else None
+            yield SITEMAP_STATS % (stats['url_count'], stats['sitemaps'], stats['errors'],
+                                   SITEMAP_TRUNCATED if stats['truncated'] else '', lastmod)
+            if stats['sample']:
+                yield SITEMAP_SAMPLE
+                yield LIST_START
+                for elem in stats['sample']:
+                    yield LINK_ITEM % (elem, elem)
+                yield LIST_END
+    yield SECTION_END
 
     # WIKI
-    output += '\n\t\t\t<a name="wiki"></a>'
-    output += '\n\t\t\t<div class="elem">'
-    output += '\n\t\t\t<h2><b><u>Wiki:</u></b></h2>'
+    yield SECTION_START % ('wiki', 'Wiki')
     if data['wiki']:
-        output += '\n\t\t\t\t<br><iframe src=%s width=850 height=800></iframe>' % data['wiki']
-    output += '\n\t\t\t</div>'
+        yield WIKI % data['wiki']
+    yield SECTION_END
 
     # END
-    output += end
+    yield END
+
 
-    # SAVE
-    with open('%s/output.html' % filepath, 'w', encoding='utf-8') as f:
-        f.write(output)
+def _split_chunks(text, size=CHUNK_SIZE):
+    """
+    Same lines as text.split('\\n'), in lists covering about size characters each, so a long text is never split
+    as a whole.
 
+    :param text: str
+    :param size: int
+    :return: generator of lists of str
+    """
+    start = 0
+    end = text.find('\n', start + size)
+    while end != -1:
+        yield text[start:end].split('\n')
+        start = end + 1
+        end = text.find('\n', start + size)
+    yield text[start:].split('\n')
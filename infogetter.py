@@ -1,14 +1,27 @@
 import os
 import json
-import socket
 import re
-import whois
-import builtwith
 import time
 import datetime
-from bs4 import BeautifulSoup
-
-from helpers.req_handler import GET, RequestHandler, RequestErrorData, RequestData
+import threading
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from helpers.req_handler import GET, HOST_RATE_LIMITER, RequestHandler, RequestErrorData, RequestData, SessionPool, \
+    ResponseTooLarge
+from helpers.lookup_cache import LookupCache, MISSING
+from helpers.title_parser import stream_title, TitleNotFound
+from helpers.sitemap import crawl_sitemaps
+from helpers.robots import parse_robots, load_robots
+from helpers.html_parser import default_serp_parser, ElementNotFound
+from helpers.lazy_import import lazy_import
+from helpers.fingerprint import default_engine
+from helpers.whois_client import WhoisClient, WhoisError, WhoisTimeout, WhoisServerError
+from helpers.resolver import Resolver, ResolveError
+from helpers.geoip import open_geo_database
+from helpers.report_store import DirectoryStore, open_store, url_to_filename, SQLITE_SUFFIXES
+from helpers.metrics import RequestMetrics, CollectorMetrics, REQUEST_METRICS, COLLECTOR_METRICS, OK, EMPTY, ERROR, \
+    RAISED, count_retries
 
 """
 Gather the following information out of a given domain:
@@ -26,29 +39,196 @@ Gather the following information out of a given domain:
     - ROBOTS.TXT 
     - SITEMAP 
     - WIKI PAGE
+
+bs4 and the builtwith signatures are only imported once a collector needs them, so loading a saved report stays
+cheap.
 """
 
+bs4 = lazy_import('bs4')
+
+
+# Fields gathered by InfoGetter.run(), in the order they are saved in data.json
+COLLECTORS = ['ip', 'title', 'estimated', 'potential_api', 'news_url', 'whois', 'geo_location', 'geo_maps',
+              'builtwith', 'robots', 'sitemap', 'sitemap_stats', 'wiki']
+
+# Fields each collector reads from InfoGetter.data, every other collector is independent
+COLLECTOR_DEPENDENCIES = {
+    'whois': ['ip'],  # Falls back to a whois on the IP
+    'geo_location': ['ip'],
+    'geo_maps': ['whois', 'geo_location'],
+    'sitemap': ['robots'],
+    'sitemap_stats': ['sitemap', 'robots'],
+}
+
+# Seconds each field stays fresh before InfoGetter.run(refresh=True) collects it again, None never expires
+COLLECTOR_TTLS = {
+    'ip': 24 * 60 * 60,
+    'title': 60 * 60,
+    'estimated': 24 * 60 * 60,
+    'potential_api': 7 * 24 * 60 * 60,
+    'news_url': None,
+    'whois': 7 * 24 * 60 * 60,
+    'geo_location': 7 * 24 * 60 * 60,
+    'geo_maps': 7 * 24 * 60 * 60,
+    'builtwith': 24 * 60 * 60,
+    'robots': 24 * 60 * 60,
+    'sitemap': 24 * 60 * 60,
+    'sitemap_stats': 24 * 60 * 60,
+    'wiki': 7 * 24 * 60 * 60,
+}
+
+# Process-wide caches shared by every InfoGetter, geolocation by IP and whois by registrable domain or IP
+GEO_CACHE = LookupCache(ttl=COLLECTOR_TTLS['geo_location'])
+WHOIS_CACHE = LookupCache(ttl=COLLECTOR_TTLS['whois'])
+LOOKUP_CACHE_FILES = {'geo_cache.json': GEO_CACHE, 'whois_cache.json': WHOIS_CACHE}
+
+# Process-wide whois client, so every InfoGetter shares its referral cache, per server limits and pool
+WHOIS_CLIENT = WhoisClient()
+WHOIS_MAX_ADDRESSES = 2  # Addresses of the domain looked up along with it, see InfoGetter._whois_queries()
+
+# Process-wide resolver, caching answers for their TTL, so batches resolve each domain once and can prefetch them
+RESOLVER = Resolver()
+
+# Offline geolocation, looked up before the extreme-ip-lookup.com API, see use_geo_database()
+GEO_LOOKUP = {'database': None, 'api_fallback': True}
+
+# Key of InfoGetter.data holding data about the collection itself: {'fetched_at': {field: timestamp},
+# 'collectors': {field: {'duration': seconds, 'outcome': str, 'retries': int}}, 'requests': RequestMetrics.snapshot()}
+METADATA_KEY = 'metadata'
+
+DEFAULT_MAX_WORKERS = 8
+
+RESULT_COUNT_RE = re.compile('[0-9,]+')
+MAP_URL_RE = re.compile('/maps/vt[^"\n]*')
+
+TITLE_CHUNK_SIZE = 16 * 1024  # Bytes read at a time while looking for the title
+ROBOTS_MAX_BYTES = 500 * 1024  # Crawlers ignore robots.txt past its first 500 KiB, so the rest is dropped
+MAP_MAX_BYTES = 5 * 1024 * 1024
+MAP_IMAGE = 'location.jpg'  # Name the geolocation map is saved under, drawn by htmldrawer
+SITEMAP_CHUNK_SIZE = 64 * 1024
+SITEMAP_WORKERS = 4  # Child sitemaps of an index read at once
+MAX_SITEMAPS = 50  # Sitemaps read per domain, index files included
+SITEMAP_MAX_BYTES = 20 * 1024 * 1024  # Uncompressed bytes read per domain, the url count is truncated past them
+SITEMAP_MAX_SECONDS = 30  # Wall time spent on the sitemaps of a domain
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64; rv:56.0) Gecko/20100101 Firefox/56.0'}
+
+# (requests per second, burst) per host, shared by every InfoGetter in the process to stay clear of throttling
+HOST_RATES = {
+    'www.google.com': (1, 3),
+    'google.com': (1, 3),
+    'extreme-ip-lookup.com': (0.8, 5),
+}
+
+for rate_host, (host_rate, host_burst) in HOST_RATES.items():
+    HOST_RATE_LIMITER.set_rate(rate_host, host_rate, host_burst)
+
+# Process-wide keep-alive connections, so the hosts every report asks (google.com, extreme-ip-lookup.com) are connected
+# to once per batch rather than once per domain. Closed at the end of a batch, and rebuilt if used again
+SESSION_POOL_MAXSIZE = 32  # Connections kept per host, shared by every InfoGetter running at once
+SESSION_POOL = SessionPool(RequestData(GET, headers=HEADERS), pool_maxsize=SESSION_POOL_MAXSIZE)
+
+
+def registrable_domain(host):
+    """
+    Best effort registrable domain of host, e.g. www.clarin.com.ar -> clarin.com.ar, api.github.com -> github.com
 
-INVALID_FILENAME_CHARS = ['/', '\\', '?', '%', '*', ':', '|', '"', '<', '>', '.']
+    :param host: str
+    :return: str
+    """
+    labels = host.lower().rstrip('.').split('.')
 
+    # Second level under a country code, e.g. com.ar or co.uk
+    if len(labels) >= 3 and len(labels[-1]) == 2 and len(labels[-2]) <= 3:
+        return '.'.join(labels[-3:])
 
-def url_to_filename(url):
+    return '.'.join(labels[-2:])
+
+
+def whois_cache_key(query):
     """
-    Transform an url into a filename valid name
+    Key of a whois query in WHOIS_CACHE, the IP itself or the registrable domain of the url
 
-    :param url: str
+    :param query: str, url or IP
     :return: str
     """
+    host = InfoGetter._sanitize_url(query)
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        return registrable_domain(host)
+
 
-    # Standardize urls
-    first_pass = url.replace('http://', '').replace('https://', '').replace('www.', '').split('/')[0]
-    # Cut to root
-    second_pass = first_pass.replace('.', ' - ')
-    # Remove invalids
-    for invalid in INVALID_FILENAME_CHARS:
-        second_pass = second_pass.replace(invalid, '')
+def load_lookup_caches(directory):
+    """
+    Load GEO_CACHE and WHOIS_CACHE from the files in directory, if any.
+
+    :param directory: str
+    :return: None
+    """
+    for filename, cache in LOOKUP_CACHE_FILES.items():
+        cache.load(directory + '/' + filename)
+
+
+def save_lookup_caches(directory):
+    """
+    Save GEO_CACHE and WHOIS_CACHE under directory.
+
+    :param directory: str
+    :return: None
+    """
+    for filename, cache in LOOKUP_CACHE_FILES.items():
+        cache.save(directory + '/' + filename)
 
-    return second_pass
+
+def use_geo_database(path, api_fallback=True):
+    """
+    Geolocate IPs on the GeoDatabase compiled at path (see helpers.geoip.compile_database()) rather than on the
+    extreme-ip-lookup.com API, which is only asked for the IPs out of it if api_fallback is True.
+
+    :param path: str or None, None goes back to the API alone
+    :param api_fallback: bool
+    :return: None
+    """
+    GEO_LOOKUP['database'] = open_geo_database(path) if path else None
+    GEO_LOOKUP['api_fallback'] = api_fallback
+
+
+def is_cached(url, output_directory=None):
+    """
+    Check if there's already data saved about url, without instantiating an InfoGetter.
+
+    :param url: str
+    :param output_directory: str, directory or SQLite file, see open_store() (defaults to ./output)
+    :return: bool
+    """
+    if not output_directory:
+        output_directory = os.getcwd() + '/output'
+
+    store = open_store(output_directory)
+    return store.exists(store.key(url))
+
+
+def is_error(value):
+    """
+    Check if a field's value is the ('Error', err) tuple collectors save when they fail, a list once loaded from json.
+
+    :param value: a field's value
+    :return: bool
+    """
+    return isinstance(value, (tuple, list)) and len(value) == 2 and value[0] == 'Error'
+
+
+def collector_outcome(value):
+    """
+    Outcome of a collector out of the value it returned: ERROR for the ('Error', err) tuple, EMPTY for None, else OK.
+
+    :param value: a field's value
+    :return: str
+    """
+    if is_error(value):
+        return ERROR
+    return EMPTY if value is None else OK
 
 
 class InfoGetter(object):
@@ -56,7 +236,8 @@ class InfoGetter(object):
     Class to handle the information gathering.
 
     It is instantiated with an url and an optional output_directory (it defaults to ./output), and then it is used
-    by calling on .run(), it saves (and returns) the data gotten in the form of a dictionary.
+    by calling on .run(), it saves (and returns) the data gotten in the form of a dictionary. Where it's saved is up
+    to a ReportStore, see helpers.report_store.
 
     We use a class instead of pure static methods for refactoring reasons, specifically involving the persistent
     RequestData, RequestErrorData, and RequestHandler instances, as well as the collection of the data and the handling
@@ -68,164 +249,431 @@ class InfoGetter(object):
 
     """
 
-    def __init__(self, url, output_directory=None):
+    def __init__(self, url, output_directory=None, store=None, index=None, session_pool=None):
         """
         Takes care of handling path and file checks and creations, as well as checking if there's already valid data
         saved about this domain.
 
         :param url: str
-        :param output_directory: str (defaults to ./output)
+        :param output_directory: str (defaults to ./output), a path ending in one of SQLITE_SUFFIXES saves to a
+        SqliteStore instead of a directory per domain
+        :param store: ReportStore or None, overrides output_directory
+        :param index: ReportIndex or None, updated with self.data every time it's saved, see open_index()
+        :param session_pool: SessionPool or None, defaults at SESSION_POOL
         """
 
         # Instantiate instance vars
         self.url = url
         self.data = {}
         self.loaded_flag = False
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64; rv:56.0) Gecko/20100101 Firefox/56.0'}
-        self.requester = RequestHandler([''], RequestData(GET, headers=headers), RequestErrorData(allow_errors=False))
 
-        # output_directory checks
-        default_path = os.getcwd() + '/output'
-        if output_directory and not os.path.isdir(output_directory):
-            raise InvalidFilePath(output_directory)
+        # Metrics of this instance, rolled up into the process-wide ones
+        self.request_metrics = RequestMetrics(parent=REQUEST_METRICS)
+        self.collector_metrics = CollectorMetrics(parent=COLLECTOR_METRICS)
+        self._metadata_lock = threading.Lock()
+
+        self.requester = RequestHandler([''], RequestData(GET, headers=HEADERS), RequestErrorData(allow_errors=False),
+                                        session_pool=session_pool if session_pool else SESSION_POOL,
+                                        metrics=self.request_metrics)
+
+        # Per-run caches, see _get_page() and _get_soup()
+        self._page_urls = {}
+        self._pages = {}
+        self._soups = {}
+        self._cache_locks = {}
+        self._cache_lock = threading.Lock()
+        self._collecting = set()  # Fields of the current pass of run(), see _streams_title()
+
+        if store is None and output_directory and output_directory.endswith(SQLITE_SUFFIXES):
+            store = open_store(output_directory)
+
+        if store is None:
+            # output_directory checks
+            default_path = os.getcwd() + '/output'
+            if output_directory and not os.path.isdir(output_directory):
+                raise InvalidFilePath(output_directory)
+
+            if not output_directory:
+                if not os.path.isdir(default_path):
+                    os.mkdir(default_path)
+                output_directory = default_path
+
+            store = DirectoryStore(output_directory)
+
+        self.store = store
+        self.key = store.key(self.url)
+        self.index = index
+
+        # Check if data already exists
+        try:  # Handle bad json
+            data = store.load(self.key)
+        except json.decoder.JSONDecodeError as e:
+            raise BrokenJsonFile(repr(e))
+
+        if data is not None:
+            self.data = data
+            self.loaded_flag = True
+
+        # Directory the report is drawn in, the url specific directory of a DirectoryStore
+        self.filepath = store.directory(self.key)
+
+    def run(self, concurrent=False, max_workers=DEFAULT_MAX_WORKERS, refresh=False):
+        """
+        Stitch together all different calls, while handling the different raises that might occur. The duration,
+        outcome and retries of each collector, and the metrics of the requests made, are saved under METADATA_KEY.
+
+        If self.loaded_flag is True, return the saved self.data without performing any work, unless refresh is True.
+        Then only the fields that are expired (see COLLECTOR_TTLS) or errored are collected again and merged into the
+        saved data, along with the fields depending on any of them that changed.
+
+        If concurrent is True, each collector is submitted to a thread pool as soon as the fields it depends on (see
+        COLLECTOR_DEPENDENCIES) are collected, so a run takes about as long as the longest dependency chain instead of
+        the sum of all the requests.
+
+        :param concurrent: bool
+        :param max_workers: int, size of the thread pool when concurrent
+        :param refresh: bool
+        :return: dict, self.data
+        """
+        # Check the flag
+        if self.loaded_flag and not refresh:
+            return self.data
+
+        fields = self._stale_fields() if self.loaded_flag else list(COLLECTORS)
+        if not fields:
+            return self.data
+
+        # First
+        self.data['url'] = self.url
 
-        if not output_directory:
-            if not os.path.isdir(default_path):
-                os.mkdir(default_path)
-            output_directory = default_path
+        try:
+            collected = set()
+            while fields:
+                previous = {field: self.data.get(field) for field in fields}
+                self._collecting = set(fields)
 
-        # Url specific directory check
-        url_folder_path = output_directory + '/' + url_to_filename(self.url)
-        if not os.path.isdir(url_folder_path):
-            os.mkdir(url_folder_path)
+                if concurrent:
+                    self._run_concurrent(fields, max_workers)
+                else:
+                    for field in fields:
+                        self._set_field(field, self._collect(field))
 
-        else:  # Check if file already exists
-            if os.path.isfile(url_folder_path + '/data.json'):
+                collected.update(fields)
+                fields = self._dependent_fields(previous, collected)
+        finally:
+            self._clear_cache()
 
-                try:  # Handle bad json
-                    with open(url_folder_path + '/data.json', 'r') as json_file:
-                        self.data = json.load(json_file)
-                    self.loaded_flag = True
-                except json.decoder.JSONDecodeError as e:
-                    raise BrokenJsonFile(repr(e))
+        self.data[METADATA_KEY]['requests'] = self.request_metrics.snapshot()
+        self._save()
 
-        self.filepath = url_folder_path
+        # Return data
+        return self.data
 
-    def run(self):
+    def _save(self):
         """
-        Stitch together all different calls, while handling the different raises that might occur.
+        Save self.data in self.store, and update self.index
 
-        If self.loaded_flag is True, return the saved self.data without performing any work.
+        :return: None
+        """
+        # Keep data.json in the same order no matter the order the collectors finished in
+        for key in ['url'] + COLLECTORS + [METADATA_KEY]:
+            if key in self.data:
+                self.data[key] = self.data.pop(key)
 
-        :return: dict, self.data
+        self.store.save(self.key, self.data)
+        if self.index is not None:
+            self.index.update(self.key, self.data)
+
+    def _set_field(self, field, value):
         """
-        # Check the flag
-        if self.loaded_flag:
-            return self.data
+        Save the value of a field in self.data, along with the time it was collected at.
 
-        # First
-        self.data['url'] = self.url
+        :param field: str
+        :param value: the field's value
+        :return: None
+        """
+        with self._metadata_lock:
+            self.data[field] = value
+            self.data.setdefault(METADATA_KEY, {}).setdefault('fetched_at', {})[field] = time.time()
+
+    def _record_collector(self, field, seconds, outcome, retries):
+        """
+        Save the metrics of a collector run under METADATA_KEY, and in self.collector_metrics.
 
+        :param field: str
+        :param seconds: float
+        :param outcome: str, OK, EMPTY, ERROR or RAISED
+        :param retries: int, requests retried
+        :return: None
+        """
+        with self._metadata_lock:
+            self.data.setdefault(METADATA_KEY, {}).setdefault('collectors', {})[field] = \
+                {'duration': seconds, 'outcome': outcome, 'retries': retries}
+        self.collector_metrics.record(field, seconds, outcome, retries)
+
+    def _stale_fields(self):
+        """
+        Get the fields of self.data that are missing, expired or errored.
+
+        :return: list of str, in COLLECTORS order
+        """
+        fetched_at = self.data.get(METADATA_KEY, {}).get('fetched_at', {})
+        now = time.time()
+
+        stale = []
+        for field in COLLECTORS:
+            ttl = COLLECTOR_TTLS.get(field)
+            if field not in self.data or field not in fetched_at or is_error(self.data[field]):
+                stale.append(field)
+            elif ttl is not None and now - fetched_at[field] > ttl:
+                stale.append(field)
+
+        return stale
+
+    def _dependent_fields(self, previous, collected):
+        """
+        Get the fields not collected yet that depend on a field whose value changed.
+
+        :param previous: dict, {field: value before collecting it}
+        :param collected: set of str, fields already collected
+        :return: list of str, in COLLECTORS order
+        """
+        changed = [field for field, value in previous.items() if self.data.get(field) != value]
+
+        return [field for field in COLLECTORS if field not in collected and
+                any(dep in changed for dep in COLLECTOR_DEPENDENCIES.get(field, []))]
+
+    def _run_concurrent(self, fields, max_workers):
+        """
+        Run the collectors for fields on a thread pool, submitting each one once its dependencies are in self.data.
+
+        Exceptions the collectors don't handle are raised after the already running collectors finish, as run() would
+        have raised them.
+
+        :param fields: list of str, fields in COLLECTORS
+        :param max_workers: int
+        :return: None
+        """
+        pending = list(fields)
+        running = {}
+        collected = set()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for field in list(pending):
+                    dependencies = COLLECTOR_DEPENDENCIES.get(field, [])
+                    if all(dep in collected or dep not in fields for dep in dependencies):
+                        pending.remove(field)
+                        running[executor.submit(self._collect, field)] = field
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    field = running.pop(future)
+                    self._set_field(field, future.result())
+                    collected.add(field)
+
+    def _collect(self, field):
+        """
+        Call the collector for field, recording its duration, outcome and the requests it retried.
+
+        :param field: str, a field in COLLECTORS
+        :return: the field's value
+        """
+        start = time.perf_counter()
+        with count_retries() as retry_count:
+            try:
+                value = getattr(self, '_collect_%s' % field)()
+            except Exception:
+                self._record_collector(field, time.perf_counter() - start, RAISED, retry_count.value)
+                raise
+
+        self._record_collector(field, time.perf_counter() - start, collector_outcome(value), retry_count.value)
+        return value
+
+    def _collect_ip(self):
         # Do not catch errors at IP lookup, as it might indicate connection issues or bad URLs.
-        self.data['ip'] = self._get_ip(self.url)
+        return self._get_ip(self.url)
 
+    def _collect_title(self):
         # If IP lookup didn't raise an error, this shouldn't either
-        self.data['title'] = self._get_title(self.url)
+        return self._get_title(self.url)
 
+    def _collect_estimated(self):
         # But this might if google changed structure
         try:
-            self.data['estimated'] = self._get_estimated_size(self.url)
+            return self._get_estimated_size(self.url)
         except Exception as e:
             err = ("[!] Possible Google issue: _get_estimated_size failed with exception: %s" % str(e))
             print("%s" % err)
-            self.data['estimated'] = ('Error', err)
+            return 'Error', err
 
+    def _collect_potential_api(self):
         # Get potential API, catch if none
         try:
-            self.data['potential_api'] = self._get_potential_api(self.url)
+            return self._get_potential_api(self.url)
         except NoApi:
-            self.data['potential_api'] = None
+            return None
         except Exception as e:
-            err = ("[!] Possible Google issue: _get_estimated_size failed with exception: %s" % str(e))
+            err = ("[!] Possible Google issue: _get_potential_api failed with exception: %s" % str(e))
             print("%s" % err)
-            self.data['potential_api'] = ('Error', err)
+            return 'Error', err
 
-        # Save news_url
-        self.data['news_url'] = self._get_news_url(self.url)
+    def _collect_news_url(self):
+        return self._get_news_url(self.url)
 
-        # Get whois, if error try with IP, else catch error
+    def _collect_whois(self):
+        # Get whois of the url and of its addresses at once, the url's preferred, else catch error
         try:
-            self.data['whois'] = self._get_whois_data(self.url)
+            return self._get_first_whois_data(self._whois_queries())
         except NoWhois:
-            try:
-                self.data['whois'] = self._get_whois_data(self.data['ip'])
-            except NoWhois:
-                self.data['whois'] = None
+            return None
 
+    def _collect_geo_location(self):
         # Get geolocation, catch both API fails and broader IP fails
         try:
-            self.data['geo_location'] = self._get_geo_location_data(self.data['ip'])
+            return self._get_geo_location_data(self.data['ip'])
         except NoGeo:
             print("[!] Geo Location lookup failed: It shouldn't fail if IP lookup came right.")
-            self.data['geo_location'] = None
+            return None
         except GeoAPIFailed:
             print("[!] Geo Location lookup failed on the request lvl, API might have changed or is down.")
+            return None
 
+    def _collect_geo_maps(self):
         # Get images, handle google hiccups
         try:
-            self.data['geo_maps'] = self._get_geo_imgs(self.data['whois'], self.data['geo_location'], self.filepath)
+            return self._get_geo_imgs(self.data['whois'], self.data['geo_location'])
         except GoogleHiccup:
             time.sleep(2)
             try:
-                self.data['geo_maps'] = self._get_geo_imgs(self.data['whois'], self.data['geo_location'], self.filepath)
+                return self._get_geo_imgs(self.data['whois'], self.data['geo_location'])
             except GoogleHiccup:
-                self.data['geo_maps'] = [None]
+                return [None]
 
-        # Call builtwith
-        self.data['builtwith'] = self._get_built_with(self.url)
+    def _collect_builtwith(self):
+        return self._get_built_with(self.url)
 
-        # Get robots.txt if any
+    def _collect_robots(self):
+        # Get robots.txt if any, saved parsed
         try:
-            self.data['robots'] = self._get_robot(self.url)
+            return parse_robots(self._get_robot(self.url)).as_dict()
         except:
-            self.data['robots'] = None
+            return None
 
+    def _collect_sitemap(self):
         # Get sitemap if any
         try:
-            self.data['sitemap'] = self._get_sitemap(self.url, self.data['robots'])
+            return self._get_sitemap(self.url, self.data['robots'])
         except NoSitemap:
-            self.data['sitemap'] = None
+            return None
+
+    def _collect_sitemap_stats(self):
+        # Count the sitemap urls, if there's a sitemap, along with every other sitemap robots.txt lists
+        if not self.data['sitemap']:
+            return None
+        return self._get_sitemap_stats(self._sitemap_urls(self.data['sitemap'], self.data['robots']))
 
+    def _collect_wiki(self):
         # Get wiki page if any
         try:
-            self.data['wiki'] = self._get_wiki(self.url)
+            return self._get_wiki(self.url)
         except NoWiki:
-            self.data['wiki'] = None
+            return None
         except Exception as e:
-            err = ("[!] Possible Google issue: _get_estimated_size failed with exception: %s" % str(e))
+            err = ("[!] Possible Google issue: _get_wiki failed with exception: %s" % str(e))
             print("%s" % err)
-            self.data['wiki'] = ('Error', err)
+            return 'Error', err
 
-    # Save data
-        with open(self.filepath + '/data.json', 'w', encoding='utf-8') as f:
-            f.write(json.dumps(self.data, indent=True))
+    def _req_wrap(self, url, stream=False):
+        """
+        Wraps a single request through the shared RequestHandler. RequestHandler.fetch() doesn't touch its url_list or
+        responses, so collectors can call this concurrently.
 
-        # Return data
-        return self.data
+        :param url: str
+        :param stream: bool, leave the body unread, the caller has to close the ResponseObject
+        :return: request's ResponseObject
+        """
+
+        return self.requester.fetch(url, stream=stream)
+
+    def _download_wrap(self, url, max_bytes, path=None, truncate=False):
+        """
+        Wraps a single bounded, streamed download through the shared RequestHandler.
+
+        :param url: str
+        :param max_bytes: int
+        :param path: str or None, file to write the body to instead of keeping it in memory
+        :param truncate: bool, keep the first max_bytes instead of raising ResponseTooLarge
+        :return: Download
+        """
+
+        return self.requester.download(url, max_bytes, path, truncate)
 
-    def _req_wrap(self, url):
+    def _probe_wrap(self, url):
         """
-        Wraps Request flushing, calling on new url, and response gathering.
+        Wraps a HEAD or ranged existence check through the shared RequestHandler.
+
+        :param url: str
+        :return: bool
+        """
+
+        return self.requester.probe(url)
+
+    def _get_page(self, url):
+        """
+        Get url through _req_wrap only once per run.
+
+        Responses are cached by their final URL, after redirects, so every collector asking for the same page shares a
+        single download. Concurrent callers of the same url wait for the first one instead of requesting it again.
 
         :param url: str
         :return: request's ResponseObject
         """
+        with self._get_cache_lock(url):
+            if url not in self._page_urls:
+                r = self._req_wrap(url)
+                self._pages.setdefault(r.url, r)
+                self._page_urls[url] = r.url
+
+            return self._pages[self._page_urls[url]]
+
+    def _get_soup(self, url):
+        """
+        Get the BeautifulSoup tree of url, parsing each cached page only once per run.
+
+        :param url: str
+        :return: BeautifulSoup object
+        """
+        final_url = self._get_page(url).url
+
+        with self._get_cache_lock(('soup', final_url)):
+            if final_url not in self._soups:
+                self._soups[final_url] = bs4.BeautifulSoup(self._pages[final_url].text, 'html.parser')
+
+            return self._soups[final_url]
+
+    def _get_cache_lock(self, key):
+        """
+        Get the lock guarding a single cache key.
+
+        :param key: hashable
+        :return: threading.Lock
+        """
+        with self._cache_lock:
+            return self._cache_locks.setdefault(key, threading.Lock())
 
-        self.requester.url_list = [url]
-        self.requester.responses = []
-        self.requester.run()
+    def _clear_cache(self):
+        """
+        Drop every cached response and tree, so nothing outlives the run it was fetched for.
 
-        return self.requester.responses[0]
+        :return: None
+        """
+        with self._cache_lock:
+            self._page_urls = {}
+            self._pages = {}
+            self._soups = {}
+            self._cache_locks = {}
+            self._collecting = set()
 
     @staticmethod
     def _sanitize_url(url):
@@ -239,32 +687,75 @@ class InfoGetter(object):
 
     def _get_ip(self, url):
         """
-        Get url IP via socket library
+        Get url IP, the first IPv4 address it resolves to if it has any
 
         :param url: str
         :return: str
         """
+        return self._get_ips(url)[0]
+
+    def _get_ips(self, url):
+        """
+        Get every address url resolves to, through RESOLVER, so it's only resolved once within its TTL
 
+        :param url: str
+        :return: list of str, IPv4 addresses first
+        """
         try:
-            ip = socket.gethostbyname(self._sanitize_url(url))
-            return ip
-        except socket.gaierror:
+            return RESOLVER.resolve(self._sanitize_url(url))
+        except ResolveError:
             raise BadUrlAtIPLookUp(url)
 
+    def _whois_queries(self):
+        """
+        Queries whois is looked up on, by preference: the url, its IP, and its other addresses already resolved, up to
+        WHOIS_MAX_ADDRESSES
+
+        :return: list of str
+        """
+        addresses = [self.data['ip']]
+        for address in RESOLVER.cached(self._sanitize_url(self.url)) or []:
+            if address not in addresses and len(addresses) < WHOIS_MAX_ADDRESSES:
+                addresses.append(address)
+        return [self.url] + addresses
+
     def _get_title(self, url):
         """
-        Get website title via BeautifulSoup
+        Get website title, reading the page only up to the title unless the whole page is needed anyway, see
+        _streams_title(). Falls back to BeautifulSoup over the whole page when the title can't be told from the head.
 
         :param url: str
         :return: str
         """
 
         sanitized_url = 'http://' + self._sanitize_url(url)
-        r = self._req_wrap(sanitized_url)
 
-        title = BeautifulSoup(r.text, 'html.parser').title.string
+        if self._streams_title(sanitized_url):
+            r = self._req_wrap(sanitized_url, stream=True)
+            try:
+                return stream_title(r.iter_content(TITLE_CHUNK_SIZE), r.encoding)
+            except TitleNotFound:
+                pass
+            finally:
+                r.close()
+
+        title = self._get_soup(sanitized_url).title.string
         return title
 
+    def _streams_title(self, url):
+        """
+        The title is only streamed out of the head of the page if the whole page isn't needed anyway: not if it's
+        already cached, nor if builtwith is collected in the same pass, which downloads it through _get_page(), as the
+        title then does, so the page is downloaded once.
+
+        :param url: str, sanitized
+        :return: bool
+        """
+        with self._cache_lock:
+            cached = url in self._page_urls
+
+        return not cached and 'builtwith' not in self._collecting
+
     def _get_estimated_size(self, url):
         """
         Estimate size of website using a google query with site:
@@ -274,11 +765,25 @@ class InfoGetter(object):
         """
 
         google_query_url = 'https://www.google.com/search?q=site:%s' % self._sanitize_url(url)
-        r = self._req_wrap(google_query_url)
+        return google_query_url, self._parse_estimated_size(self._get_page(google_query_url).text)
+
+    @staticmethod
+    def _parse_estimated_size(text):
+        """
+        Get the result count out of a google results page
 
-        bs_result_stats = BeautifulSoup(r.text, 'html.parser').find('div', {'id': 'result-stats'}).getText()
-        bs_num = re.findall(re.compile('[0-9,]+'), bs_result_stats)[0].replace(',', '')
-        return google_query_url, int(bs_num)
+        Raise GoogleHiccup
+
+        :param text: str
+        :return: int
+        """
+        try:
+            result_stats = default_serp_parser().result_stats(text)
+        except ElementNotFound:
+            raise GoogleHiccup()
+
+        num = RESULT_COUNT_RE.findall(result_stats)[0].replace(',', '')
+        return int(num)
 
     def _get_potential_api(self, url):
         """
@@ -291,14 +796,26 @@ class InfoGetter(object):
         """
 
         google_query_url = 'https://www.google.com/search?q=api %s' % self._sanitize_url(url)
-        r = self._req_wrap(google_query_url)
+        return self._parse_potential_api(self._get_page(google_query_url).text, url)
+
+    def _parse_potential_api(self, text, url):
+        """
+        Get the first result out of a google results page, if it shares domain with the URL.
 
-        bs_search_results = BeautifulSoup(r.text, 'html.parser').findAll('div', {'id': 'search'})[0]
-        bs_first_result = bs_search_results.find('cite').find(text=True, recursive=False)
+        Raise NoApi and GoogleHiccup
+
+        :param text: str
+        :param url: str
+        :return: str
+        """
+        try:
+            first_result = default_serp_parser().first_cite(text)
+        except ElementNotFound:
+            raise GoogleHiccup()
 
         # Check its API
-        if bs_first_result.find(self._sanitize_url(url)) != -1:
-            return bs_first_result
+        if first_result and first_result.find(self._sanitize_url(url)) != -1:
+            return first_result
         else:
             raise NoApi()
 
@@ -313,20 +830,63 @@ class InfoGetter(object):
         return 'https://www.google.com/search?tbm=nws&q="%s"' % self._sanitize_url(url)
 
     @staticmethod
-    def _get_whois_data(ip):
+    def _get_whois_data(ip, deadline=None):
         """
-        Get whois data on the ip
+        Get whois data on the ip, looking it up in WHOIS_CACHE first. Queries that raised NoWhois are cached as well,
+        unless they timed out or the server failed.
 
         :param ip: str
+        :param deadline: float or None, time.monotonic() the lookup has to be over by, see WhoisClient.whois()
         :return: dict
         """
+        cache_key = whois_cache_key(ip)
+        whois_flat = WHOIS_CACHE.get(cache_key)
 
-        whois_flat = {}
+        if whois_flat is MISSING:
+            try:
+                whois_flat = InfoGetter._flatten_whois(WHOIS_CLIENT.whois(ip, deadline))
+            except (WhoisTimeout, WhoisServerError) as e:
+                print("[!] Whois on %s failed: %s" % (ip, str(e)))
+                raise NoWhois()
+            except WhoisError:
+                whois_flat = None
+
+            # An answer none of whose fields parsed is no answer
+            if whois_flat is not None and not any(whois_flat.values()):
+                whois_flat = None
+            WHOIS_CACHE.set(cache_key, whois_flat)
+
+        if whois_flat is None:
+            raise NoWhois()
+
+        return dict(whois_flat)
+
+    @staticmethod
+    def _get_first_whois_data(queries):
+        """
+        Get whois data on the first of queries that has any, looking them all up at once, see
+        WhoisClient.first_answer()
+
+        Raises NoWhois
+
+        :param queries: list of str, urls or IPs
+        :return: dict
+        """
         try:
-            whois_data = whois.whois(ip)
-        except socket.gaierror:
+            return WHOIS_CLIENT.first_answer(queries, InfoGetter._get_whois_data, errors=(NoWhois,))
+        except WhoisError:
             raise NoWhois()
 
+    @staticmethod
+    def _flatten_whois(whois_data):
+        """
+        Flatten the datetime objects whois returns into strings
+
+        :param whois_data: dict
+        :return: dict
+        """
+        whois_flat = {}
+
         # whois returns datetime objects, we want to flatten them into strings to then save as .json
         for key in whois_data.keys():
             if isinstance(whois_data[key], datetime.datetime):
@@ -346,13 +906,53 @@ class InfoGetter(object):
 
     def _get_geo_location_data(self, ip):
         """
-        Use extreme-ip-lookup API to get geo_location data
+        Use extreme-ip-lookup API to get geo_location data, looking it up in the GeoDatabase and GEO_CACHE first
+
+        :param ip: str
+        :return: dictionary
+        """
+        geo_data = self._get_offline_geo_location(ip)
+        if geo_data is not None:
+            return geo_data
+
+        geo_data = GEO_CACHE.get(ip)
+
+        if geo_data is MISSING:
+            geo_url = 'http://extreme-ip-lookup.com/json/%s' % ip
+            geo_data = self._parse_geo_location(self._req_wrap(geo_url))
+            GEO_CACHE.set(ip, geo_data)
+
+        return dict(geo_data)
+
+    @staticmethod
+    def _get_offline_geo_location(ip):
+        """
+        Look ip up in the GeoDatabase set by use_geo_database(), if any. Not cached, a lookup takes microseconds.
+
+        Raise NoGeo, if ip is out of the GeoDatabase and the API isn't a fallback
 
         :param ip: str
+        :return: dictionary, or None if the API has to be asked
+        """
+        database = GEO_LOOKUP['database']
+        if database is None:
+            return None
+
+        geo_data = database.lookup(ip)
+        if geo_data is None and not GEO_LOOKUP['api_fallback']:
+            raise NoGeo()
+        return geo_data
+
+    @staticmethod
+    def _parse_geo_location(r):
+        """
+        Check the extreme-ip-lookup API response
+
+        Raise NoGeo, GeoAPIFailed
+
+        :param r: request's ResponseObject
         :return: dictionary
         """
-        geo_url = 'http://extreme-ip-lookup.com/json/%s' % ip
-        r = self._req_wrap(geo_url)
         try:
             if r.json()['status'] == 'fail':
                 raise NoGeo()
@@ -361,17 +961,37 @@ class InfoGetter(object):
         except KeyError:
             raise GeoAPIFailed()
 
-    def _get_geo_imgs(self, whois_data, geolocation_data, filepath):
+    def _get_geo_imgs(self, whois_data, geolocation_data):
         """
         Get the iframe link of the location gotten through whois_data.
-        Save a static image and google maps link gotten through geolocation_data.
+        Save a static image to self.store, as MAP_IMAGE, and google maps link gotten through geolocation_data.
 
         :param whois_data: dict
         :param geolocation_data: dict
         :return: list, [whois_google_maps_embed_link, geo_location_google_maps_link]
         """
-        response = [None, None]
+        response = [self._get_whois_maps_link(whois_data), None]
 
+        if geolocation_data:
+            r = self._req_wrap(self._get_map_query_url(geolocation_data))
+            try:
+                download = self._download_wrap(self._parse_map_url(r.text), MAP_MAX_BYTES)
+                self.store.save_image(self.key, MAP_IMAGE, download.content)
+            except ResponseTooLarge:
+                print("[!] Map image over %s bytes, not saved." % MAP_MAX_BYTES)
+
+            response[1] = self._get_geolocation_maps_link(geolocation_data)
+
+        return response
+
+    @staticmethod
+    def _get_whois_maps_link(whois_data):
+        """
+        Get the google maps embed link for the address in whois_data
+
+        :param whois_data: dict
+        :return: str or None
+        """
         if whois_data:
             if whois_data['address'] and whois_data['zipcode']:
                 data = whois_data['address'] + ' ' + whois_data['zipcode']
@@ -388,56 +1008,77 @@ class InfoGetter(object):
                 # Make google maps link
                 google_maps_link = "https://maps.google.com/maps?width=100%&height=600&hl=es&q=" + data + \
                                    "&ie=UTF8&t=&z=7&iwloc=B&output=embed"
-                response[0] = google_maps_link
-
-        #
-
-        if geolocation_data:
-            im_query_url = 'http://www.google.com/search?q=%s,%s' % (geolocation_data['lat'], geolocation_data['lon'])
+                return google_maps_link
 
-            r = self._req_wrap(im_query_url)
+        return None
 
-            try:
-                map_url = (re.findall(re.compile('/maps/vt.*'), r.text)[0]).split('"')[0]
-                map_query = 'http://google.com%s' % map_url
+    @staticmethod
+    def _get_map_query_url(geolocation_data):
+        """
+        :param geolocation_data: dict
+        :return: str, google query whose results embed a static map of the location
+        """
+        return 'http://www.google.com/search?q=%s,%s' % (geolocation_data['lat'], geolocation_data['lon'])
 
-                img = self._req_wrap(map_query)
+    @staticmethod
+    def _parse_map_url(text):
+        """
+        Get the static map image url out of the google results page text
 
-                with open('%s/location.jpg' % filepath, 'wb') as f:
-                    f.write(img.content)
+        Raise GoogleHiccup
 
-            except IndexError:
-                raise GoogleHiccup()
+        :param text: str
+        :return: str
+        """
+        try:
+            map_url = MAP_URL_RE.search(text).group()
+        except AttributeError:
+            raise GoogleHiccup()
 
-            google_maps_geolocation = 'https://www.google.com/maps/@?api=1&map_action=map&center=%s, %s&zoom=13' % \
-                                      (geolocation_data['lat'], geolocation_data['lon'])
-            response[1] = google_maps_geolocation
+        return 'http://google.com%s' % map_url
 
-        return response
+    @staticmethod
+    def _get_geolocation_maps_link(geolocation_data):
+        """
+        :param geolocation_data: dict
+        :return: str, google maps link centered on the location
+        """
+        return 'https://www.google.com/maps/@?api=1&map_action=map&center=%s, %s&zoom=13' % \
+               (geolocation_data['lat'], geolocation_data['lon'])
 
     def _get_built_with(self, url):
         """
-        Get builtwith data of the url
+        Get builtwith data of the url, detected by the shared FingerprintEngine, same as builtwith.builtwith() would
 
         :param url: str
         :return: dict
         """
-        #
         sanitized_url = 'http://' + self._sanitize_url(url)
-        r = self._req_wrap(sanitized_url)
+        r = self._get_page(sanitized_url)
+
+        return self._detect_technologies(r.headers, r.text)
 
-        return builtwith.builtwith('aaa', headers=r.headers, html=str(r.text).encode('utf-8'))
+    @staticmethod
+    def _detect_technologies(headers, text):
+        """
+        The first call compiles the signatures, see default_engine()
+
+        :param headers: dict
+        :param text: str
+        :return: dict
+        """
+        return default_engine().detect(headers, text)
 
     def _get_robot(self, url):
         """
-        Get robots.txt data of the url
+        Get robots.txt data of the url, up to ROBOTS_MAX_BYTES
 
         :param url: str
         :return: str
         """
         sanitized_url = 'http://' + self._sanitize_url(url)
 
-        r = self._req_wrap('%s/robots.txt' % sanitized_url)
+        r = self._download_wrap('%s/robots.txt' % sanitized_url, ROBOTS_MAX_BYTES, truncate=True)
 
         return r.text
 
@@ -449,29 +1090,66 @@ class InfoGetter(object):
         :return:
         """
 
-        # Check for sitemap uri in robot_data
-        robot_dict = {}
-        if robot_data:
-            robot = robot_data.split('\n')
-            for elem in robot:
-                split_elem = elem.split(':')
+        sitemap_url = self._find_sitemap_url(url, robot_data)
+
+        try:
+            found = self._probe_wrap(sitemap_url)  # Checked without downloading it, as it can be huge
+        except:
+            found = False
+
+        if not found:
+            raise NoSitemap()
+        return sitemap_url
+
+    def _get_sitemap_stats(self, sitemap_urls):
+        """
+        Stream the sitemaps and the sitemaps they index, counting their urls.
+
+        :param sitemap_urls: list of str
+        :return: dict, {'url_count': int, 'lastmod': [str, str] or None, 'sample': list of str, 'sitemaps': int,
+        'errors': int, 'truncated': bool}
+        """
+        return crawl_sitemaps(sitemap_urls, self._get_sitemap_chunks, SITEMAP_WORKERS, MAX_SITEMAPS,
+                              max_total_bytes=SITEMAP_MAX_BYTES, max_seconds=SITEMAP_MAX_SECONDS)
+
+    @staticmethod
+    def _sitemap_urls(sitemap_url, robot_data):
+        """
+        :param sitemap_url: str
+        :param robot_data: dict, str or None
+        :return: list of str, sitemap_url first
+        """
+        robots = load_robots(robot_data)
+        return [sitemap_url] + [url for url in (robots.sitemaps if robots else []) if url != sitemap_url]
+
+    def _get_sitemap_chunks(self, sitemap_url):
+        """
+        :param sitemap_url: str
+        :return: generator of bytes, the request is made once it's iterated
+        """
+        r = self._req_wrap(sitemap_url, stream=True)
+        try:
+            for chunk in r.iter_content(SITEMAP_CHUNK_SIZE):
+                yield chunk
+        finally:
+            r.close()
+
+    def _find_sitemap_url(self, url, robot_data):
+        """
+        Get the first sitemap url listed in robot_data, or the default /sitemap.xml
 
-                try:
-                    robot_dict[split_elem[0]] = split_elem[1:]
-                except IndexError:
-                    pass
+        :param url: str
+        :param robot_data: dict, str (saved by older versions) or None
+        :return: str
+        """
+        robots = load_robots(robot_data)
 
-        # Get (and try) link
-        if robot_dict.get('Sitemap'):
-            sitemap_url = ':'.join(robot_dict['Sitemap']).lstrip()
+        if robots and robots.sitemaps:
+            sitemap_url = robots.sitemaps[0]
         else:
             sitemap_url = 'http://' + self._sanitize_url(url) + '/sitemap.xml'
 
-        try:
-            self._req_wrap(sitemap_url)  # We do this to catch exceptions if sitemap_url does not work
-            return sitemap_url
-        except:
-            raise NoSitemap()
+        return sitemap_url
 
     def _get_wiki(self, url):
         """
@@ -481,17 +1159,28 @@ class InfoGetter(object):
         :return: str
         """
         google_query = 'https://www.google.com/search?q=%s site:wikipedia.org' % self._sanitize_url(url)
+        return self._parse_wiki(self._get_page(google_query).text)
+
+    @staticmethod
+    def _parse_wiki(text):
+        """
+        Get the first link out of a google results page
 
-        r = self._req_wrap(google_query)
+        Raise NoWiki and GoogleHiccup
 
-        bs_search_results = BeautifulSoup(r.text, 'html.parser').findAll('div', {'id': 'search'})[0]
-        bs_first_result = bs_search_results.find('a')
+        :param text: str
+        :return: str
+        """
+        try:
+            first_result = default_serp_parser().first_link(text)
+        except ElementNotFound:
+            raise GoogleHiccup()
 
         # Make sure it is wiki
-        if not bs_first_result:
+        if first_result is None:
             raise NoWiki()
 
-        return bs_first_result.get('href')
+        return first_result
 
 
 # Exceptions
@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+from unittest import TestCase
+
+import bckg_info
+import infogetter
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.path = os.getcwd() + '/batch_check'
+        os.mkdir(self.path)
+
+        # A previously saved report
+        os.mkdir(self.path + '/cached - org')
+        with open(self.path + '/cached - org/data.json', 'w') as f:
+            f.write('{}')
+
+        self.worker = bckg_info._batch_worker
+        self.processed = []
+
+        def fake_worker(url, path, refresh, addresses):
+            if url == 'broken.org':
+                raise ValueError(url)
+            self.processed.append(url)
+
+        bckg_info._batch_worker = fake_worker
+
+        # Names the batch resolves ahead
+        self.resolver = infogetter.RESOLVER
+        self.prefetched = []
+
+        class FakeResolver(object):
+            prefetch = self.prefetched.extend
+
+            @staticmethod
+            def cached(name):
+                return None
+
+        infogetter.RESOLVER = FakeResolver()
+
+    def tearDown(self):
+        bckg_info._batch_worker = self.worker
+        infogetter.RESOLVER = self.resolver
+        shutil.rmtree(self.path)
+
+    def test_read_urls(self):
+        with open(self.path + '/urls.txt', 'w') as f:
+            f.write('example.org\n\n# comment\nhttp://www.example.org/\nexample.com\n')
+
+        self.assertEqual(['example.org', 'example.com'], bckg_info.read_urls(self.path + '/urls.txt'))
+
+    def test_batch(self):
+        urls = ['a%s.org' % n for n in range(20)] + ['cached.org', 'broken.org']
+        result = bckg_info.batch(urls, self.path, workers=4, max_in_flight=2)
+
+        self.assertEqual(['cached.org'], result['skipped'])
+        self.assertEqual(['broken.org'], list(result['failed'].keys()))
+        self.assertEqual(sorted(urls[:20]), sorted(result['done']))
+        self.assertEqual(sorted(urls[:20]), sorted(self.processed))
+        self.assertEqual(urls[:20] + ['broken.org'], self.prefetched)  # Saved ones aren't resolved
+
+        with open(self.path + '/batch_errors.json', 'r') as f:
+            self.assertEqual(result['failed'], json.load(f))
+
+    def test_batch_refresh(self):
+        result = bckg_info.batch(['cached.org'], self.path, workers=1, refresh=True)
+
+        self.assertEqual([], result['skipped'])
+        self.assertEqual(['cached.org'], self.processed)
+
+    def test_batch_sqlite(self):
+        store = bckg_info.open_store(self.path + '/reports.sqlite')
+        store.save('cached.org', {})
+
+        result = bckg_info.batch(['http://www.cached.org/', 'broken.org', 'new.org'], self.path + '/reports.sqlite',
+                                 workers=1)
+        store.close()
+
+        self.assertEqual(['http://www.cached.org/'], result['skipped'])
+        self.assertEqual(['new.org'], self.processed)
+        self.assertTrue(os.path.isfile(self.path + '/batch_errors.json'))
+
+    def test_render_all(self):
+        for name in ['a - org', 'b - org']:
+            os.mkdir(self.path + '/' + name)
+            shutil.copy(os.getcwd() + '/example_org_data.json', self.path + '/' + name + '/data.json')
+        os.mkdir(self.path + '/empty')
+
+        # The saved {} is missing every field
+        result = bckg_info.render_all(self.path, workers=2)
+        self.assertEqual(['a - org', 'b - org'], sorted(result['drawn']))
+        self.assertEqual(['cached - org'], list(result['failed'].keys()))
+
+        result = bckg_info.render_all(self.path, workers=2)
+        self.assertEqual([], result['drawn'])
+        self.assertEqual(2, len(result['current']))
+
+        self.assertEqual(2, len(bckg_info.render_all(self.path, workers=2, force=True)['drawn']))
+
+    def test_rebuild_index(self):
+        for url in ['a.org', 'b.org']:
+            os.mkdir(self.path + '/' + bckg_info.infogetter.url_to_filename(url))
+            with open(os.getcwd() + '/example_org_data.json', 'r', encoding='utf-8') as f:
+                data = dict(json.load(f), url=url)
+            with open(self.path + '/%s/data.json' % bckg_info.infogetter.url_to_filename(url), 'w') as f:
+                f.write(json.dumps(data))
+
+        # The saved {} has no terms, but is indexed all the same
+        self.assertEqual(3, bckg_info.rebuild_index(self.path, workers=2))
+
+        index = bckg_info.open_index(self.path)
+        self.assertEqual(['a - org', 'b - org'], index.query(technology='EdgeCast', country='US'))
+        self.assertEqual([('icann', 2)], index.counts('registrar'))
+        index.close()
@@ -0,0 +1,86 @@
+import os
+import re
+import random
+from unittest import TestCase
+
+import builtwith
+from requests.structures import CaseInsensitiveDict
+
+from helpers.fingerprint import FingerprintEngine, LiteralMatcher, BackendNotAvailable, load_signatures, \
+    required_literals, VERSION_SEPARATOR
+from helpers.lazy_import import module_available
+
+
+def synthetic_pages(signatures, n, seed=0):
+    """
+    Pages made of pieces of the signatures themselves, the literals of their regexes, meta tags and headers, so most
+    signatures get exercised.
+
+    :param signatures: dict
+    :param n: int
+    :param seed: int
+    :return: list of (headers, html)
+    """
+    rng = random.Random(seed)
+    snippets = []
+    metas = []
+    headers = []
+    for spec in signatures['apps'].values():
+        for key in ['html', 'script']:
+            value = spec.get(key, [])
+            for pattern in value if isinstance(value, list) else [value]:
+                source = re.sub(r'[\^$()?*+\[\]{}|]', '', pattern.split(VERSION_SEPARATOR)[0])
+                snippets.append(re.sub(r'\\(.)', r'\1', source))
+        for name, value in spec.get('meta', {}).items():
+            metas.append('<meta name="%s" content="%s">' % (name, value.split(VERSION_SEPARATOR)[0].strip('^$')))
+        for name, value in spec.get('headers', {}).items():
+            headers.append((name, re.sub(r'[\^$()?*+\[\]{}|\\]', '', value.split(VERSION_SEPARATOR)[0])))
+
+    pages = []
+    for _ in range(n):
+        html = '<html><head>%s</head><body>%s</body></html>' % (''.join(rng.sample(metas, 3)),
+                                                                '\n'.join(rng.sample(snippets, 20)))
+        pages.append((CaseInsensitiveDict(rng.sample(headers, 4)), html))
+    return pages
+
+
+class TestFingerprint(TestCase):
+    def setUp(self):
+        self.signatures = load_signatures()
+
+        self.pages = synthetic_pages(self.signatures, 100)
+        fixtures = [os.getcwd() + '/../benchmarks/fixtures/' + name for name in ['index.html', 'serp.html']]
+        fixtures += [os.getcwd() + '/serp_corpus/' + name for name in sorted(os.listdir(os.getcwd() + '/serp_corpus'))]
+        for path in fixtures:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.pages.append((CaseInsensitiveDict({'Server': 'nginx/1.18.0', 'X-Powered-By': 'PHP/7.4'}), f.read()))
+
+    def test_parity(self):
+        expected = [builtwith.builtwith('https://www.example.org/', headers=headers, html=html.encode('utf-8'))
+                    for headers, html in self.pages]
+        self.assertGreater(sum(len(techs) for techs in expected), len(self.pages))  # Plenty of signatures matched
+
+        for backend in ['regex'] + (['ahocorasick'] if module_available('ahocorasick') else []):
+            engine = FingerprintEngine(self.signatures, backend)
+            for (headers, html), techs in zip(self.pages, expected):
+                self.assertEqual(techs, engine.detect(headers, html, 'https://www.example.org/'))
+
+        # Bytes, as builtwith takes them, and url signatures
+        engine = FingerprintEngine(self.signatures)
+        self.assertEqual(builtwith.builtwith('https://shop.example.org/index.php', html=b'<p>Hi</p>'),
+                         engine.detect(html=b'<p>Hi</p>', url='https://shop.example.org/index.php'))
+
+    def test_required_literals(self):
+        self.assertEqual(['/wp-content/'], required_literals('/wp-content/'))
+        self.assertEqual(['jquery'], required_literals('jquery(?:\\-|\\.)([\\d.]*\\d)[^/]*\\.js'))
+        self.assertEqual(['drupal', 'joomla'], sorted(required_literals('(?:drupal|joomla)\\.js')))
+        self.assertIsNone(required_literals('(?:ab|wordpress)'))  # 'ab' is too short to filter
+        self.assertIsNone(required_literals('.*'))
+
+    def test_literal_matcher(self):
+        for backend in ['regex'] + (['ahocorasick'] if module_available('ahocorasick') else []):
+            matcher = LiteralMatcher(['jquery', 'query', 'wp-content', 'nginx'], backend)
+            self.assertEqual({'jquery', 'query', 'wp-content'}, matcher.found('<script src="/wp-content/jquery.js">'))
+            self.assertEqual(set(), matcher.found('<p>nothing</p>'))
+
+        self.assertRaises(BackendNotAvailable, LiteralMatcher, ['jquery'], 'hyperscan')
@@ -0,0 +1,129 @@
+import os
+import json
+import shutil
+from unittest import TestCase
+
+from helpers.geoip import GeoDatabase, compile_database, open_geo_database, InvalidSource, InvalidDatabase
+from helpers.lookup_cache import MISSING
+
+import infogetter
+from infogetter import InfoGetter, NoGeo
+
+CSV = '''ip_start,ip_end,continent,country,country_code,region,city,latitude,longitude,isp,org,ipType
+1.0.0.0,1.0.0.255,Oceania,Australia,AU,Queensland,Brisbane,-27.46794,153.02809,APNIC,APNIC,Business
+1.0.1.0,1.0.1.255,Oceania,Australia,AU,Queensland,Brisbane,-27.46794,153.02809,APNIC,APNIC,Business
+93.184.216.0,93.184.216.255,North America,United States,US,California,Los Angeles,34.05223,-118.24368,\
+Verizon Business,Verizon Business,Residential
+93.184.216.128,93.184.217.0,Europe,Overlapping,XX,,,0,0,,,
+2606:2800::,2606:2800:ffff:ffff:ffff:ffff:ffff:ffff,North America,United States,US,California,Los Angeles,\
+34.05223,-118.24368,Edgecast,Edgecast,Business
+not an ip,1.0.0.1,,,,,,,,,,
+'''
+
+DBIP_CSV = '''1.0.0.0,1.0.0.255,OC,AU,Queensland,South Brisbane,-27.4748,153.017
+::ffff:0:0,::ffff:0:0,EU,ZZ,,,0,0
+'''
+
+
+class TestGeoip(TestCase):
+    def setUp(self):
+        self.path = os.getcwd() + '/geoip_check'
+        os.mkdir(self.path)
+        self.database = self._compile(CSV, 'ranges.csv')
+
+    def tearDown(self):
+        infogetter.use_geo_database(None)
+        shutil.rmtree(self.path)
+
+    def _compile(self, text, filename):
+        with open(self.path + '/' + filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.counts = compile_database(self.path + '/' + filename, self.path + '/' + filename + '.db')
+        return self.path + '/' + filename + '.db'
+
+    def test_compile(self):
+        # The Brisbane ranges are merged, the overlapping one and the bad row skipped
+        self.assertEqual({'ipv4': 2, 'ipv6': 1, 'locations': 4, 'skipped': 2}, self.counts)
+        database = GeoDatabase(self.database)
+        self.assertEqual({'ipv4': 2, 'ipv6': 1, 'bytes': os.path.getsize(self.database)}, database.stats())
+        database.close()
+
+        self.assertRaises(InvalidSource, self._compile, 'country,city\nAR,Rosario\n', 'bad.csv')
+
+        with open(self.path + '/bad.db', 'wb') as f:
+            f.write(b'not a database')
+        self.assertRaises(InvalidDatabase, GeoDatabase, self.path + '/bad.db')
+
+    def test_lookup(self):
+        database = GeoDatabase(self.database)
+
+        # Same fields as the API answers with
+        with open(os.getcwd() + '/example_org_geo_location.json', 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        expected['ipType'] = 'Residential'
+        self.assertEqual(expected, database.lookup('93.184.216.34'))
+
+        # Range bounds
+        self.assertEqual('Brisbane', database.lookup('1.0.0.0')['city'])
+        self.assertEqual('Brisbane', database.lookup('1.0.1.255')['city'])
+        self.assertEqual('United States', database.lookup('93.184.216.255')['country'])
+        self.assertIsNone(database.lookup('0.255.255.255'))
+        self.assertIsNone(database.lookup('1.0.2.0'))
+        self.assertIsNone(database.lookup('93.184.217.0'))
+        self.assertIsNone(database.lookup('255.255.255.255'))
+
+        # IPv6, and IPv4 mapped into it
+        self.assertEqual('Edgecast', database.lookup('2606:2800:220:1:248:1893:25c8:1946')['isp'])
+        self.assertIsNone(database.lookup('2606:2801::1'))
+        self.assertEqual('1.0.0.1', database.lookup('::ffff:1.0.0.1')['query'])
+        self.assertIsNone(database.lookup('example.org'))
+        database.close()
+
+    def test_formats(self):
+        # DB-IP's IP to City Lite, without header
+        database = GeoDatabase(self._compile(DBIP_CSV, 'dbip.csv'))
+        geo_data = database.lookup('1.0.0.7')
+        self.assertEqual(('South Brisbane', 'AU', 'OC', '-27.4748'),
+                         (geo_data['city'], geo_data['countryCode'], geo_data['continent'], geo_data['lat']))
+        self.assertEqual('', geo_data['isp'])
+        database.close()
+
+        # Integer ranges, as IP2Location gives them, and networks
+        database = GeoDatabase(self._compile('ip_from,ip_to,country_code\n16777216,16777471,AU\n', 'integers.csv'))
+        self.assertEqual('AU', database.lookup('1.0.0.200')['countryCode'])
+        database.close()
+        networks = 'network,country_code\n2a00::/12,EU\n10.0.0.0/8,ZZ\n2001:db8::/120,A\n2001:db8::100/120,B\n'
+        database = GeoDatabase(self._compile(networks, 'networks.csv'))
+        self.assertEqual('EU', database.lookup('2a0f:ffff::1')['countryCode'])
+        self.assertEqual('ZZ', database.lookup('10.255.0.1')['countryCode'])
+        self.assertEqual({'ipv4': 1, 'ipv6': 3, 'locations': 4, 'skipped': 0}, self.counts)
+
+        # Ranges sharing their high 64 bits
+        self.assertEqual('A', database.lookup('2001:db8::ff')['countryCode'])
+        self.assertEqual('B', database.lookup('2001:db8::100')['countryCode'])
+        self.assertIsNone(database.lookup('2001:db8::200'))
+        self.assertIsNone(database.lookup('2001:db7:ffff:ffff:ffff:ffff:ffff:ffff'))
+        database.close()
+
+        # ASN columns, only in the lookups of the ranges that have one
+        asns = 'ip_start,ip_end,as_number,org\n1.0.0.0,1.0.0.255,13335,Cloudflare\n1.0.1.0,1.0.1.255,,Unknown\n'
+        database = GeoDatabase(self._compile(asns, 'asns.csv'))
+        self.assertEqual('13335', database.lookup('1.0.0.1')['asn'])
+        self.assertNotIn('asn', database.lookup('1.0.1.1'))
+        database.close()
+
+    def test_info_getter(self):
+        info_getter = InfoGetter('example.org', self.path)
+        infogetter.use_geo_database(self.database)
+        self.assertIs(open_geo_database(self.database), infogetter.GEO_LOOKUP['database'])
+
+        # Looked up offline, without asking the API nor filling GEO_CACHE
+        self.assertEqual('Los Angeles', info_getter._get_geo_location_data('93.184.216.34')['city'])
+        self.assertIs(MISSING, infogetter.GEO_CACHE.get('93.184.216.34'))
+
+        # Out of the database, the API is asked unless it isn't a fallback
+        infogetter.GEO_CACHE.set('8.8.8.8', {'country': 'Cached'})
+        self.assertEqual('Cached', info_getter._get_geo_location_data('8.8.8.8')['country'])
+        infogetter.use_geo_database(self.database, api_fallback=False)
+        self.assertRaises(NoGeo, info_getter._get_geo_location_data, '8.8.8.8')
+        infogetter.GEO_CACHE.clear()
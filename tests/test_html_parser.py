@@ -0,0 +1,77 @@
+import os
+from unittest import TestCase
+
+from helpers.html_parser import BACKENDS, available_backends, get_serp_parser, ElementNotFound, BackendNotAvailable
+from infogetter import InfoGetter, GoogleHiccup, NoApi, NoWiki
+
+CORPUS = 'serp_corpus'
+
+
+def parse_all(parser, html):
+    """
+    :param parser: SerpParser
+    :param html: str
+    :return: list, each method's return or ElementNotFound
+    """
+    results = []
+    for method in [parser.result_stats, parser.first_cite, parser.first_link]:
+        try:
+            results.append(method(html))
+        except ElementNotFound:
+            results.append(ElementNotFound)
+
+    # Backends may keep different whitespace around unclosed markup, the count is all that's read from it
+    if isinstance(results[0], str):
+        results[0] = ' '.join(results[0].split())
+    return results
+
+
+class TestHtmlParser(TestCase):
+    def test_backends_equivalence(self):
+        corpus = sorted(os.listdir(CORPUS))
+        self.assertTrue(corpus)
+
+        for name in available_backends():
+            parser = get_serp_parser(name)
+            for filename in corpus:
+                with open('%s/%s' % (CORPUS, filename), 'r', encoding='utf-8') as f:
+                    html = f.read()
+
+                with self.subTest(backend=name, page=filename):
+                    self.assertEqual(parse_all(get_serp_parser('bs4'), html), parse_all(parser, html))
+
+    def test_get_serp_parser(self):
+        self.assertIn(get_serp_parser().name, available_backends())
+        self.assertIn('bs4', available_backends())
+        self.assertIn('strainer', available_backends())
+
+        for name in BACKENDS:
+            if name not in available_backends():
+                self.assertRaises(BackendNotAvailable, get_serp_parser, name)
+        self.assertRaises(BackendNotAvailable, get_serp_parser, 'regex')
+
+    def test_parse_serp(self):
+        ig = InfoGetter('example.org')
+
+        def read(filename):
+            with open('%s/%s' % (CORPUS, filename), 'r', encoding='utf-8') as f:
+                return f.read()
+
+        self.assertEqual(1230000, ig._parse_estimated_size(read('results.html')))
+        self.assertEqual('https://developer.example.org', ig._parse_potential_api(read('results.html'), 'example.org'))
+        self.assertEqual('https://en.wikipedia.org/wiki/Malformed', ig._parse_wiki(read('malformed.html')))
+
+        self.assertRaises(NoApi, ig._parse_potential_api, read('cite_span.html'), 'example.org')
+        self.assertRaises(NoApi, ig._parse_potential_api, read('empty_cite.html'), 'example.org')
+        self.assertRaises(NoWiki, ig._parse_wiki, read('no_results.html'))
+        for method in [ig._parse_estimated_size, ig._parse_wiki]:
+            self.assertRaises(GoogleHiccup, method, read('no_search.html'))
+
+        # Map url runs up to the closing quote or the end of the line
+        self.assertEqual('http://google.com/maps/vt/data=abc,1', ig._parse_map_url('<img src="/maps/vt/data=abc,1" >'))
+        self.assertEqual('http://google.com/maps/vt?pb=2', ig._parse_map_url('x /maps/vt?pb=2\n"'))
+        self.assertRaises(GoogleHiccup, ig._parse_map_url, '<img src="/maps/api/staticmap">')
+
+        # Clean
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+from unittest import TestCase
+
+import htmldrawer
+
+
+class TestHtmlDrawer(TestCase):
+    def setUp(self):
+        self.path = os.getcwd() + '/html_output'
+        os.mkdir(self.path)
+
+        with open(os.getcwd() + '/example_org_data.json', 'r', encoding='utf-8') as f:
+            self.data = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_html_draw(self):
+        htmldrawer.html_draw(self.data, self.path)
+
+        with open(self.path + '/output.html', 'rb') as f:
+            output = f.read()
+        with open(os.getcwd() + '/example_org_output.html', 'rb') as f:
+            expected = f.read()
+
+        self.assertEqual(expected, output)
+
+    def test_split_chunks(self):
+        text = 'User-agent: *\n\nDisallow: /a/\nDisallow: /b/\n'
+        for size in [0, 1, 5, 100]:
+            chunks = list(htmldrawer._split_chunks(text, size))
+            self.assertEqual(text.split('\n'), [line for chunk in chunks for line in chunk])
+        self.assertEqual([['']], list(htmldrawer._split_chunks('')))
+
+    def test_html_draw_raw_robots(self):
+        # Reports saved by older versions hold robots.txt as text
+        self.data['robots'] = 'User-agent: *\nDisallow: /a'
+        htmldrawer.html_draw(self.data, self.path)
+
+        with open(self.path + '/output.html', 'r', encoding='utf-8') as f:
+            output = f.read()
+
+        self.assertIn('<li><b>User-agent: *</b></li>\n\t\t\t\t<li><b>Disallow: /a</b></li>', output)
+
+        # An empty robots.txt draws no list, as a missing one
+        drawn = []
+        for robots in ['', None]:
+            self.data['robots'] = robots
+            htmldrawer.html_draw(self.data, self.path)
+            with open(self.path + '/output.html', 'r', encoding='utf-8') as f:
+                drawn.append(f.read())
+        self.assertEqual(drawn[0], drawn[1])
+
+    def test_draw_report(self):
+        with open(self.path + '/data.json', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.data, indent=True))
+
+        self.assertTrue(htmldrawer.draw_report(self.path))
+        self.assertFalse(htmldrawer.draw_report(self.path, self.data))
+        self.assertTrue(htmldrawer.draw_report(self.path, force=True))
+
+        with open(self.path + '/output.html', 'rb') as f:
+            output = f.read()
+        with open(os.getcwd() + '/example_org_output.html', 'rb') as f:
+            self.assertEqual(f.read(), output)
+
+        # A new data.json, a new renderer, or a missing output.html draw it again
+        self.data['title'] = 'Changed'
+        with open(self.path + '/data.json', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.data, indent=True))
+        self.assertTrue(htmldrawer.draw_report(self.path))
+        self.assertFalse(htmldrawer.draw_report(self.path))
+
+        version = htmldrawer.RENDERER_VERSION
+        htmldrawer.RENDERER_VERSION += 1
+        try:
+            self.assertTrue(htmldrawer.draw_report(self.path))
+            self.assertFalse(htmldrawer.draw_report(self.path))
+        finally:
+            htmldrawer.RENDERER_VERSION = version
+
+        os.remove(self.path + '/output.html')
+        self.assertTrue(htmldrawer.draw_report(self.path))
+
+        # Drawing it straight from html_draw() leaves it stale
+        htmldrawer.html_draw(self.data, self.path)
+        self.assertTrue(htmldrawer.draw_report(self.path))
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+from unittest import TestCase
+
+HEAVY_MODULES = ['whois', 'builtwith', 'bs4', 'requests', 'asyncio']
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter, so modules imported by other tests don't count
+SCRIPT = '''
+import sys
+import json
+
+import bckg_info
+imported = [name for name in %(heavy)r if name in sys.modules]
+
+# Cached report: loading it and drawing it again shouldn't import any of them either
+ig = bckg_info.infogetter.InfoGetter('example.org', %(path)r)
+bckg_info.htmldrawer.html_draw(ig.run(), ig.filepath)
+cached = [name for name in %(heavy)r if name in sys.modules]
+
+print(json.dumps({'loaded': ig.loaded_flag, 'import': imported, 'cached': cached}))
+'''
+
+
+class TestImportTime(TestCase):
+    def setUp(self):
+        self.path = os.getcwd() + '/import_check'
+        os.mkdir(self.path)
+        os.mkdir(self.path + '/example - org')
+        shutil.copy(os.getcwd() + '/example_org_data.json', self.path + '/example - org/data.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_lazy_imports(self):
+        script = SCRIPT % {'heavy': HEAVY_MODULES, 'path': self.path}
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+        result = json.loads(output.decode('utf-8').splitlines()[-1])
+
+        self.assertTrue(result['loaded'])
+        self.assertEqual([], result['import'])
+        self.assertEqual([], result['cached'])
@@ -1,9 +1,14 @@
 import os
 import json
+import time
+import asyncio
 from unittest import TestCase
 
 from infogetter import url_to_filename, InfoGetter, InvalidFilePath, BrokenJsonFile, BadUrlAtIPLookUp, NoApi, NoWhois, \
-    NoGeo, NoSitemap, NoWiki
+    NoGeo, NoSitemap, NoWiki, COLLECTORS, COLLECTOR_DEPENDENCIES, COLLECTOR_TTLS, METADATA_KEY, GEO_CACHE, \
+    registrable_domain, whois_cache_key, TITLE_CHUNK_SIZE, SESSION_POOL
+from async_infogetter import AsyncInfoGetter
+from helpers.metrics import OK
 
 TEST_URLS = ['example.com', 'example.com/', 'example.com/asfaf/aa', 'www.example.com', 'www.example.com/',
              'www.example.com/asfjao/assa', 'http://www.example.com', 'http://www.example.com/',
@@ -13,6 +18,49 @@ TEST_URLS = ['example.com', 'example.com/', 'example.com/asfaf/aa', 'www.example
 PATH = os.getcwd()
 
 
+class FakeResponse(object):
+    """
+    Minimal stand in for request's ResponseObject
+    """
+    def __init__(self, url, text, headers=None):
+        self.url = url
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = headers or {}
+        self.encoding = 'utf-8'
+        self.read = 0
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            self.read += chunk_size
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class AsyncFakeResponse(object):
+    """
+    Minimal stand in for AsyncResponse and AsyncStreamResponse
+    """
+    def __init__(self, response):
+        self.url = response.url
+        self.text = response.text
+        self.headers = response.headers
+        self.encoding = response.encoding
+        self._response = response
+
+    async def iter_content(self, chunk_size):
+        for chunk in self._response.iter_content(chunk_size):
+            yield chunk
+
+    def close(self):
+        pass
+
+
 class TestInfoGetter(TestCase):
     def test_url_to_filename(self):
         results = []
@@ -32,8 +80,9 @@ class TestInfoGetter(TestCase):
         InfoGetter('example.org', os.getcwd() + '/dir_check')
         self.assertTrue(os.path.isdir(os.getcwd() + '/dir_check/example - org'))
 
-        # Good path, url folder no json
-        InfoGetter('empty', os.getcwd() + '/dir_check')
+        # Good path, url folder no json, sharing the keep-alive connections of the first one
+        ig = InfoGetter('empty', os.getcwd() + '/dir_check')
+        self.assertIs(SESSION_POOL, ig.requester.session_pool)
 
         # Good path, url folder, bad json
         self.assertRaises(BrokenJsonFile, InfoGetter, 'bad_json', os.getcwd() + '/dir_check')
@@ -171,8 +220,7 @@ class TestInfoGetter(TestCase):
         correct_response = [None,
                             'https://www.google.com/maps/@?api=1&map_action=map&center=34.05223, -118.24368&zoom=13']
         ig = InfoGetter('example.org')
-        result = ig._get_geo_imgs(ig._get_whois_data(ig._get_ip(ig.url)), ig._get_geo_location_data(ig._get_ip(ig.url)),
-                                  ig.filepath)
+        result = ig._get_geo_imgs(ig._get_whois_data(ig._get_ip(ig.url)), ig._get_geo_location_data(ig._get_ip(ig.url)))
 
         self.assertEqual(correct_response, result)
 
@@ -233,3 +281,234 @@ class TestInfoGetter(TestCase):
         os.rmdir(os.getcwd() + '/output/afkaofkoaf - com')
         os.rmdir(os.getcwd() + '/output/example - org')
         os.rmdir(os.getcwd() + '/output')
+
+    def test_run_concurrent(self):
+        ig = InfoGetter('example.org')
+
+        # Replace every collector with a fake one that takes 0.2s
+        log = []
+
+        def fake_collector(field):
+            def collect():
+                log.append(('start', field))
+                time.sleep(0.2)
+                log.append(('end', field))
+                return field
+            return collect
+
+        for field in COLLECTORS:
+            setattr(ig, '_collect_%s' % field, fake_collector(field))
+
+        start = time.time()
+        data = ig.run(concurrent=True, max_workers=len(COLLECTORS))
+        elapsed = time.time() - start
+
+        # Longest chain is ip -> whois -> geo_maps, sequential would take 0.2 * len(COLLECTORS)
+        self.assertLess(elapsed, 0.2 * 5)
+        self.assertEqual(['url'] + COLLECTORS + [METADATA_KEY], list(data.keys()))
+        for field, dependencies in COLLECTOR_DEPENDENCIES.items():
+            for dep in dependencies:
+                self.assertLess(log.index(('end', dep)), log.index(('start', field)))
+
+        # Each collector's metrics are saved along with the data
+        for field in COLLECTORS:
+            collector = data[METADATA_KEY]['collectors'][field]
+            self.assertEqual((OK, 0), (collector['outcome'], collector['retries']))
+            self.assertGreaterEqual(collector['duration'], 0.2)
+            self.assertEqual({OK: 1}, ig.collector_metrics.snapshot()['collectors'][field]['outcomes'])
+        self.assertEqual({'hosts': {}}, data[METADATA_KEY]['requests'])
+
+        # Clean
+        os.remove(os.getcwd() + '/output/example - org/data.json')
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
+
+    def test_page_cache(self):
+        ig = InfoGetter('example.org')
+
+        requested = []
+
+        def fake_req_wrap(url, stream=False):
+            requested.append(url)
+            return FakeResponse('https://example.org/', '<html><head><title>Example Domain</title></head></html>')
+
+        ig._req_wrap = fake_req_wrap
+
+        # Title and builtwith share the homepage, parsed only once
+        ig._get_built_with(ig.url)
+        self.assertEqual('Example Domain', ig._get_title(ig.url))
+        self.assertEqual('Example Domain', ig._get_title('www.example.org'))
+        self.assertEqual(['http://example.org'], requested)
+        self.assertEqual(1, len(ig._soups))
+
+        # Nothing survives a clear
+        ig._clear_cache()
+        self.assertEqual({}, ig._pages)
+        self.assertEqual({}, ig._soups)
+        ig._get_title(ig.url)
+        self.assertEqual(2, len(requested))
+
+        # Collected in the same pass as builtwith, the title isn't streamed out of a download of its own
+        ig._clear_cache()
+        ig._collecting = {'title', 'builtwith'}
+        ig._get_title(ig.url)
+        ig._get_built_with(ig.url)
+        self.assertEqual(3, len(requested))
+
+        # Clean
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
+
+    def test_get_title_streamed(self):
+        ig = AsyncInfoGetter('example.org')
+
+        head = '<html><head><title>Example Domain</title></head>'
+        responses = {
+            'http://example.org': FakeResponse('https://example.org/', head + '<body>%s</body></html>' % ('x' * 10 ** 6)),
+            'http://example.com': FakeResponse('https://example.com/', '<head></head><body><title>Late</title></body>'),
+        }
+
+        def fake_req_wrap(url, stream=False):
+            return responses[url]
+
+        async def async_fake_req_wrap(url, stream=False):
+            return AsyncFakeResponse(responses[url])
+
+        # Only the head is read
+        ig._req_wrap = async_fake_req_wrap
+        self.assertEqual('Example Domain', asyncio.run(ig._get_title(ig.url)))
+        sync_ig = InfoGetter('example.org')
+        sync_ig._req_wrap = fake_req_wrap
+        self.assertEqual('Example Domain', sync_ig._get_title(sync_ig.url))
+        self.assertLessEqual(responses['http://example.org'].read, 2 * TITLE_CHUNK_SIZE)
+
+        # A title out of the head falls back to the whole page
+        self.assertEqual('Late', sync_ig._get_title('example.com'))
+        self.assertEqual(['https://example.com/'], list(sync_ig._soups.keys()))
+        self.assertEqual('Late', asyncio.run(ig._get_title('example.com')))
+
+        # Clean
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
+
+    def test_async_run(self):
+        ig = AsyncInfoGetter('example.org')
+
+        log = []
+
+        def fake_collector(field):
+            async def collect():
+                log.append(('start', field))
+                await asyncio.sleep(0.2)
+                log.append(('end', field))
+                return field
+            return collect
+
+        for field in COLLECTORS:
+            setattr(ig, '_collect_%s' % field, fake_collector(field))
+
+        start = time.time()
+        data = asyncio.run(ig.run())
+        elapsed = time.time() - start
+
+        self.assertLess(elapsed, 0.2 * 5)
+        self.assertEqual(['url'] + COLLECTORS + [METADATA_KEY], list(data.keys()))
+        for field, dependencies in COLLECTOR_DEPENDENCIES.items():
+            for dep in dependencies:
+                self.assertLess(log.index(('end', dep)), log.index(('start', field)))
+
+        # Each collector's metrics are saved along with the data
+        for field in COLLECTORS:
+            collector = data[METADATA_KEY]['collectors'][field]
+            self.assertEqual((OK, 0), (collector['outcome'], collector['retries']))
+            self.assertGreaterEqual(collector['duration'], 0.2)
+            self.assertEqual({OK: 1}, ig.collector_metrics.snapshot()['collectors'][field]['outcomes'])
+        self.assertEqual({'hosts': {}}, data[METADATA_KEY]['requests'])
+
+        # Clean
+        os.remove(os.getcwd() + '/output/example - org/data.json')
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
+
+    def test_refresh(self):
+        os.mkdir(os.getcwd() + '/output')
+        os.mkdir(os.getcwd() + '/output/example - org')
+
+        # Saved a day and a half ago, with an errored estimated
+        saved_at = time.time() - 36 * 60 * 60
+        data = {field: field for field in COLLECTORS}
+        data['url'] = 'example.org'
+        data['estimated'] = ['Error', 'err']
+        data[METADATA_KEY] = {'fetched_at': {field: saved_at for field in COLLECTORS}}
+        with open(os.getcwd() + '/output/example - org/data.json', 'w') as f:
+            f.write(json.dumps(data))
+
+        ig = InfoGetter('example.org')
+        self.assertTrue(ig.loaded_flag)
+
+        collected = []
+
+        def fake_collector(field):
+            def collect():
+                collected.append(field)
+                # ip changes, so geo_location and whois get collected again, then geo_maps
+                return 'new ' + field if field in ['ip', 'geo_location'] else field
+            return collect
+
+        for field in COLLECTORS:
+            setattr(ig, '_collect_%s' % field, fake_collector(field))
+
+        # Without refresh the saved data is returned untouched
+        self.assertEqual(data, ig.run())
+        self.assertEqual([], collected)
+
+        ig.run(refresh=True)
+        expired = [field for field in COLLECTORS if COLLECTOR_TTLS[field] and COLLECTOR_TTLS[field] < 36 * 60 * 60]
+        self.assertEqual(sorted(set(expired + ['estimated', 'whois', 'geo_location', 'geo_maps'])), sorted(collected))
+        self.assertNotIn('news_url', collected)
+
+        with open(os.getcwd() + '/output/example - org/data.json', 'r') as f:
+            saved = json.load(f)
+        self.assertEqual('new ip', saved['ip'])
+        self.assertEqual('estimated', saved['estimated'])
+        self.assertEqual(saved_at, saved[METADATA_KEY]['fetched_at']['wiki'])
+        self.assertLess(saved_at, saved[METADATA_KEY]['fetched_at']['ip'])
+
+        # Nothing left to refresh
+        collected.clear()
+        ig.run(refresh=True)
+        self.assertEqual([], collected)
+
+        # Clean
+        os.remove(os.getcwd() + '/output/example - org/data.json')
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
+
+    def test_whois_cache_key(self):
+        for url in TEST_URLS:
+            self.assertEqual('example.com', whois_cache_key(url))
+        self.assertEqual('clarin.com.ar', registrable_domain('www.clarin.com.ar'))
+        self.assertEqual('github.com', registrable_domain('api.github.com'))
+        self.assertEqual('93.184.216.34', whois_cache_key('93.184.216.34'))
+
+    def test_geo_cache(self):
+        ig = InfoGetter('example.org')
+
+        requested = []
+
+        def fake_req_wrap(url):
+            requested.append(url)
+            return FakeResponse(url, '{"status": "success", "country": "United States"}')
+
+        ig._req_wrap = fake_req_wrap
+
+        GEO_CACHE.clear()
+        for _ in range(3):
+            self.assertEqual('United States', ig._get_geo_location_data('93.184.216.34')['country'])
+        self.assertEqual(1, len(requested))
+        self.assertEqual(2, GEO_CACHE.stats()['hits'])
+        GEO_CACHE.clear()
+
+        # Clean
+        os.rmdir(os.getcwd() + '/output/example - org')
+        os.rmdir(os.getcwd() + '/output')
@@ -0,0 +1,67 @@
+import os
+import time
+from unittest import TestCase
+
+from helpers.lookup_cache import LookupCache, MISSING
+
+
+class TestLookupCache(TestCase):
+    def test_lru(self):
+        cache = LookupCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', None)
+
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+        # b was used last, so a goes
+        cache.get('b')
+        cache.set('c', 3)
+        self.assertIs(MISSING, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+        self.assertEqual({'entries': 2, 'hits': 4, 'misses': 1, 'hit_rate': 0.8}, cache.stats())
+
+    def test_ttl(self):
+        cache = LookupCache(ttl=0.1)
+        cache.set('a', 1)
+        self.assertEqual(1, cache.get('a'))
+        time.sleep(0.15)
+        self.assertIs(MISSING, cache.get('a'))
+
+    def test_entry_ttl(self):
+        cache = LookupCache(ttl=60)
+        cache.set('a', 1, ttl=0.1)
+        cache.set('b', 2)
+        time.sleep(0.15)
+        self.assertIs(MISSING, cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+
+    def test_save_load(self):
+        path = os.getcwd() + '/cache_check.json'
+
+        cache = LookupCache()
+        cache.set('93.184.216.34', {'country': 'United States'})
+        cache.save(path)
+
+        loaded = LookupCache()
+        loaded.load(path)
+        self.assertEqual({'country': 'United States'}, loaded.get('93.184.216.34'))
+
+        # Entries keep their own ttl
+        cache.set('example.org', ['93.184.216.34'], ttl=0.1)
+        cache.save(path)
+        loaded = LookupCache()
+        loaded.load(path)
+        self.assertEqual(['93.184.216.34'], loaded.get('example.org'))
+        time.sleep(0.15)
+        self.assertIs(MISSING, loaded.get('example.org'))
+
+        # Expired entries are dropped on load
+        expired = LookupCache(ttl=0)
+        time.sleep(0.01)
+        expired.load(path)
+        self.assertEqual(0, expired.stats()['entries'])
+
+        # Clean
+        os.remove(path)
@@ -0,0 +1,98 @@
+import os
+import json
+import asyncio
+from unittest import TestCase
+
+from helpers.metrics import Histogram, RequestMetrics, CollectorMetrics, OK, ERROR, count_retries, save_metrics
+
+
+class TestMetrics(TestCase):
+    def test_histogram(self):
+        histogram = Histogram([0.1, 1])
+        for value in [0.05, 0.1, 0.5, 5]:
+            histogram.observe(value)
+
+        self.assertEqual({'bounds': [0.1, 1], 'counts': [2, 1, 1], 'sum': 5.65, 'count': 4}, histogram.as_dict())
+
+        histogram.merge(histogram.as_dict())
+        self.assertEqual([4, 2, 2], histogram.counts)
+
+    def test_request_metrics(self):
+        parent = RequestMetrics()
+        metrics = RequestMetrics(parent=parent)
+
+        metrics.record_request('https://www.google.com/search?q=a', 0.2, 200, 100)
+        metrics.record_request('https://www.google.com/search?q=b', 0.3, 429)
+        metrics.record_request('http://example.org/', 2)
+        metrics.record_bytes('http://example.org/robots.txt', 50)
+
+        # Retries count on the innermost block, from any task started within it
+        async def retry():
+            metrics.record_retry('https://www.google.com/search?q=b')
+
+        async def retries():
+            with count_retries() as retry_count:
+                await asyncio.gather(retry(), retry())
+            return retry_count.value
+
+        with count_retries() as outer_count:
+            self.assertEqual(2, asyncio.run(retries()))
+            metrics.record_retry('https://www.google.com/search?q=b')
+        self.assertEqual(1, outer_count.value)
+
+        google = metrics.snapshot()['hosts']['www.google.com']
+        self.assertEqual((2, 0, 100, 3), (google['requests'], google['connection_errors'], google['bytes'],
+                                          google['retries']))
+        self.assertEqual({'200': 1, '429': 1}, google['status_codes'])
+        self.assertEqual(1, metrics.snapshot()['hosts']['example.org']['connection_errors'])
+        self.assertEqual(metrics.snapshot(), parent.snapshot())
+
+        # Snapshots of other processes add up
+        parent.merge(metrics.snapshot())
+        self.assertEqual(4, parent.snapshot()['hosts']['www.google.com']['requests'])
+        self.assertEqual(4, parent.snapshot()['hosts']['www.google.com']['latency']['count'])
+
+        text = metrics.to_prometheus()
+        self.assertIn('bckg_info_requests_total{host="www.google.com"} 2\n', text)
+        self.assertIn('bckg_info_responses_total{host="www.google.com",status="429"} 1\n', text)
+        self.assertIn('bckg_info_request_duration_seconds_bucket{host="example.org",le="1"} 0\n', text)
+        self.assertIn('bckg_info_request_duration_seconds_bucket{host="example.org",le="+Inf"} 1\n', text)
+        self.assertIn('# TYPE bckg_info_request_duration_seconds histogram\n', text)
+
+    def test_collector_metrics(self):
+        metrics = CollectorMetrics(parent=CollectorMetrics())
+        metrics.record('ip', 0.01, OK)
+        metrics.record('estimated', 1.5, ERROR, retries=2)
+        metrics.record('estimated', 0.5, OK)
+
+        estimated = metrics.parent.snapshot()['collectors']['estimated']
+        self.assertEqual({OK: 1, ERROR: 1}, estimated['outcomes'])
+        self.assertEqual((2, 2.0, 2), (estimated['duration']['count'], estimated['duration']['sum'],
+                                       estimated['retries']))
+
+        text = metrics.to_prometheus('test')
+        self.assertIn('test_collector_runs_total{collector="estimated",outcome="error"} 1\n', text)
+        self.assertIn('test_collector_retries_total{collector="estimated"} 2\n', text)
+        self.assertIn('test_collector_duration_seconds_count{collector="ip"} 1\n', text)
+
+    def test_save_metrics(self):
+        request_metrics = RequestMetrics()
+        collector_metrics = CollectorMetrics()
+        request_metrics.record_request('http://example.org/', 0.1, 200)
+        collector_metrics.record('title', 0.1, OK)
+
+        save_metrics('metrics.json', request_metrics, collector_metrics)
+        with open('metrics.json', 'r') as f:
+            snapshot = json.load(f)
+        self.assertEqual(['example.org'], list(snapshot['hosts'].keys()))
+        self.assertEqual(['title'], list(snapshot['collectors'].keys()))
+
+        save_metrics('metrics.prom', request_metrics, collector_metrics)
+        with open('metrics.prom', 'r') as f:
+            text = f.read()
+        self.assertIn('bckg_info_requests_total{host="example.org"} 1', text)
+        self.assertIn('bckg_info_collector_runs_total{collector="title",outcome="ok"} 1', text)
+
+        # Clean
+        os.remove('metrics.json')
+        os.remove('metrics.prom')
@@ -0,0 +1,86 @@
+import os
+import json
+import shutil
+from unittest import TestCase
+
+from helpers.report_index import ReportIndex, UnknownField, index_terms, index_path, open_index
+from helpers.report_store import SqliteStore
+
+from infogetter import InfoGetter
+
+
+class TestReportIndex(TestCase):
+    def setUp(self):
+        self.path = os.getcwd() + '/index_check'
+        os.mkdir(self.path)
+
+        with open(os.getcwd() + '/example_org_data.json', 'r', encoding='utf-8') as f:
+            self.data = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_index_terms(self):
+        terms = index_terms(self.data)
+
+        self.assertIn(('ip', '93.184.216.34'), terms)
+        self.assertIn(('country', 'us'), terms)
+        self.assertIn(('org', 'verizon business'), terms)
+        self.assertIn(('registrar', 'icann'), terms)
+        self.assertIn(('name_server', 'a.iana-servers.net'), terms)
+        self.assertIn(('technology', 'edgecast'), terms)
+        self.assertEqual(len(set(terms)), len(terms))  # isp and org are the same
+
+        # Failed fields have no terms
+        self.assertEqual([], index_terms({'ip': None, 'whois': ['Error', 'NoWhois'], 'builtwith': {}}))
+
+        # Autonomous systems of GeoIP databases with an ASN column, and of the origin registries of IPs give
+        terms = index_terms({'geo_location': {'asn': '15133'}, 'whois': {'origin': 'AS15169, AS36040'}})
+        self.assertEqual([('asn', 'as15133'), ('asn', 'as15169'), ('asn', 'as36040')], terms)
+
+    def test_index_path(self):
+        self.assertEqual('output/index.sqlite', index_path('output'))
+        self.assertEqual('reports.index.sqlite', index_path('reports.sqlite'))
+
+    def test_query(self):
+        index = ReportIndex(self.path + '/index.sqlite')
+        index.update('example.org', self.data)
+        other = dict(self.data, url='example.com', ip='1.1.1.1', builtwith={'web-servers': ['Nginx']},
+                     geo_location=dict(self.data['geo_location'], asn='13335'))
+        index.update('example.com', other)
+
+        self.assertEqual(['example.com', 'example.org'], index.query(registrar='ICANN'))
+        self.assertEqual(['example.com'], index.query(registrar='icann', technology='nginx'))
+        self.assertEqual([], index.query(ip='1.1.1.1', technology='edgecast'))
+        self.assertEqual(['example.com', 'example.org'], index.query(name_server='A.IANA-SERVERS.NET.'))
+        self.assertEqual(['example.com'], index.query(asn='AS13335'))
+        self.assertEqual(['example.com'], index.query(asn='13335'))
+        self.assertEqual('example.com', index.url('example.com'))
+        self.assertRaises(UnknownField, index.query, title='Example Domain')
+
+        self.assertEqual([('icann', 2)], index.counts('registrar'))
+        self.assertEqual([('1.1.1.1', 1)], index.counts('ip', limit=1))
+
+        # Updates replace the previous postings
+        index.update('example.com', dict(other, builtwith={'web-servers': ['Apache']}))
+        self.assertEqual([], index.query(technology='nginx'))
+        self.assertEqual(['example.com'], index.query(technology='apache'))
+
+        index.remove('example.com')
+        self.assertEqual(['example.org'], index.keys())
+        self.assertEqual([('icann', 1)], index.counts('registrar'))
+
+        index.close()
+
+    def test_infogetter_save(self):
+        store = SqliteStore(self.path + '/reports.sqlite')
+        index = open_index(self.path + '/reports.sqlite')
+
+        ig = InfoGetter('example.org', store=store, index=index)
+        ig.data = self.data
+        ig._save()
+
+        self.assertEqual(['example.org'], index.query(ip='93.184.216.34'))
+
+        store.close()
+        index.close()
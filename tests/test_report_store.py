@@ -0,0 +1,104 @@
+import os
+import json
+import shutil
+from unittest import TestCase
+
+from helpers.report_store import DirectoryStore, SqliteStore, ReportNotFound, report_key, import_directory, \
+    open_store, serialize
+
+from infogetter import InfoGetter
+
+
+class TestReportStore(TestCase):
+    def setUp(self):
+        self.path = os.getcwd() + '/store_check'
+        os.mkdir(self.path)
+
+        with open(os.getcwd() + '/example_org_data.json', 'r', encoding='utf-8') as f:
+            self.data = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_report_key(self):
+        for url in ['example.org', 'http://www.Example.org/', 'https://example.org/a/b?c=d', 'www.example.org#a']:
+            self.assertEqual('example.org', report_key(url))
+
+        # Unlike url_to_filename(), no two hosts share a key
+        self.assertNotEqual(report_key('a.b.org'), report_key('ab.org'))
+        self.assertEqual('api.www.example.org:8080', report_key('api.www.example.org:8080/x'))
+
+    def test_directory_store(self):
+        store = DirectoryStore(self.path)
+        key = store.key('http://www.example.org')
+        self.assertEqual('example - org', key)
+        self.assertFalse(store.exists(key))
+        self.assertIsNone(store.load(key))
+
+        store.save(key, self.data)
+        store.save_image(key, 'location.jpg', b'jpg')
+
+        self.assertTrue(store.exists(key))
+        self.assertEqual(self.data, store.load(key))
+        self.assertEqual([key], store.keys())
+        self.assertEqual(self.path + '/example - org', store.export(key))
+        with open(self.path + '/example - org/location.jpg', 'rb') as f:
+            self.assertEqual(b'jpg', f.read())
+
+    def test_sqlite_store(self):
+        store = SqliteStore(self.path + '/reports.sqlite')
+        key = store.key('http://www.example.org')
+        self.assertFalse(store.exists(key))
+        self.assertIsNone(store.load(key))
+        self.assertRaises(ReportNotFound, store.export, key)
+
+        store.save(key, self.data)
+        store.save('example.com', dict(self.data, url='example.com'))
+        self.assertTrue(store.exists(key))
+        self.assertEqual(self.data, store.load(key))
+        self.assertEqual(['example.com', 'example.org'], store.keys())
+
+        # Images are saved once however many reports draw them, and dropped once none does
+        store.save_image(key, 'location.jpg', b'jpg')
+        store.save_image('example.com', 'location.jpg', b'jpg')
+        self.assertEqual(1, self._count(store, 'images'))
+        store.save_image(key, 'location.jpg', b'new jpg')
+        self.assertEqual(2, self._count(store, 'images'))
+        store.save_image('example.com', 'location.jpg', b'new jpg')
+        self.assertEqual(1, self._count(store, 'images'))
+
+        # Exported as files, byte for byte what a DirectoryStore would save
+        path = store.export(key)
+        self.assertEqual(self.path + '/reports_reports/example.org', path)
+        with open(path + '/data.json', 'rb') as f:
+            self.assertEqual(serialize(self.data), f.read())
+        with open(path + '/location.jpg', 'rb') as f:
+            self.assertEqual(b'new jpg', f.read())
+
+        store.close()
+
+    def test_import_directory(self):
+        source = DirectoryStore(self.path + '/output')
+        for url in ['example.org', 'example.com']:
+            key = source.key(url)
+            source.save(key, dict(self.data, url=url))
+            source.save_image(key, 'location.jpg', b'jpg')
+        os.mkdir(self.path + '/output/empty')
+
+        store = open_store(self.path + '/reports.db')
+        self.assertEqual(2, import_directory(self.path + '/output', store))
+        self.assertEqual(['example.com', 'example.org'], store.keys())
+        self.assertEqual({'location.jpg': b'jpg'}, store.load_images('example.com'))
+        self.assertIs(store, open_store(self.path + '/reports.db'))
+
+        # InfoGetter loads from it
+        ig = InfoGetter('https://www.example.org/', self.path + '/reports.db')
+        self.assertTrue(ig.loaded_flag)
+        self.assertEqual('example.org', ig.key)
+        self.assertEqual(self.data, ig.run())
+
+        store.close()
+
+    @staticmethod
+    def _count(store, table):
+        return store._connection().execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
@@ -0,0 +1,304 @@
+import os
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from helpers.req_handler import GET, RequestHandler, ThreadedRequestHandler, RequestData, RequestErrorData, \
+    SessionPool, RateLimiter, InvalidStatusCode, NoValidationString, ResponseTooLarge, backoff_delay
+from helpers.async_req_handler import AsyncRequestHandler, AsyncResponse
+from helpers.metrics import RequestMetrics, count_retries
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    """
+    Echoes the path back, keeping connections alive. /missing is a 404, /slow takes a second, and paths starting with
+    /flaky fail their first request. /big sends a megabyte, /chunked sends it without Content-Length, and HEAD is
+    only answered on /big.
+    """
+    protocol_version = 'HTTP/1.1'
+    hits = {}
+
+    def handle(self):
+        try:
+            super(LocalHandler, self).handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # Streamed responses are closed early by the client on purpose
+            pass
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path == '/big' else 405)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+
+        if self.path in ['/big', '/chunked']:
+            body = b'x' * 1024 * 1024
+            self.send_response(200)
+            if self.path == '/big':
+                self.send_header('Content-Length', str(len(body)))
+            else:
+                self.send_header('Transfer-Encoding', 'chunked')
+                body = b''.join([b'%x\r\n%s\r\n' % (len(body[i:i + 4096]), body[i:i + 4096])
+                                 for i in range(0, len(body), 4096)]) + b'0\r\n\r\n'
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if self.path == '/drip':
+            self.send_response(200)
+            self.send_header('Content-Length', '5')
+            self.end_headers()
+            for _ in range(5):
+                self.wfile.write(b'x')
+                self.wfile.flush()
+                time.sleep(0.2)
+            return
+
+        status = 200
+        if self.path == '/missing':
+            status = 404
+        elif self.path == '/slow':
+            time.sleep(1)
+        elif self.path.startswith('/flaky') and self.hits[self.path] == 1:
+            status = 500
+        elif self.path == '/throttled' and self.hits[self.path] == 1:
+            status = 429
+        body = ('%s' % self.path).encode('utf-8')
+
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0.2')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRequestHandler(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), LocalHandler)
+        cls.base_url = 'http://127.0.0.1:%s' % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_fetch(self):
+        rh = RequestHandler([], RequestData(GET), RequestErrorData(allow_errors=False))
+        self.assertEqual('/a', rh.fetch(self.base_url + '/a').text)
+        self.assertEqual([], rh.responses)
+        self.assertRaises(InvalidStatusCode, rh.fetch, self.base_url + '/missing')
+
+    def test_session_pool_reuse(self):
+        url_list = [self.base_url + '/%s' % n for n in range(5)]
+        rh = RequestHandler(url_list, RequestData(GET), RequestErrorData())
+        rh.run()
+
+        self.assertEqual(5, len(rh.responses))
+        self.assertEqual({'127.0.0.1': {'requests': 5, 'hits': 4, 'misses': 1}}, rh.session_pool.stats())
+
+        rh.session_pool.close()
+        self.assertEqual({}, rh.session_pool.stats())
+
+    def test_threaded_shares_session_pool(self):
+        url_list = [self.base_url + '/%s' % n for n in range(20)]
+        session_pool = SessionPool(RequestData(GET))
+        trh = ThreadedRequestHandler(url_list, RequestData(GET), RequestErrorData(), thread_num=4,
+                                     session_pool=session_pool)
+        trh.do_threads(n_pass=0)  # Still accepted, and ignored
+
+        self.assertEqual(20, len(trh.responses))
+        for handler in trh.handlers:
+            self.assertIs(session_pool, handler.session_pool)
+
+        stats = session_pool.stats()['127.0.0.1']
+        self.assertEqual(20, stats['requests'])
+        self.assertLessEqual(stats['misses'], 4)
+
+    def test_threaded_queue(self):
+        # One slow url shouldn't hold up the urls that would have been assigned to its thread
+        url_list = [self.base_url + '/slow'] + [self.base_url + '/q%s' % n for n in range(40)]
+        trh = ThreadedRequestHandler(url_list, RequestData(GET), RequestErrorData(), thread_num=2)
+
+        start = time.time()
+        trh.do_threads()
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(41, len(trh.responses))
+
+    def test_threaded_retries(self):
+        url_list = [self.base_url + '/flaky%s' % n for n in range(5)] + [self.base_url + '/missing']
+        LocalHandler.hits['/missing'] = 0
+        trh = ThreadedRequestHandler(url_list, RequestData(GET), RequestErrorData(), thread_num=3, max_passes=2,
+                                     sleep_pass=0.1)
+        trh.do_threads()
+
+        self.assertEqual(5, len(trh.responses))
+        self.assertEqual([self.base_url + '/missing'], [err['url'] for err in trh.errors])
+        self.assertEqual(3, LocalHandler.hits['/missing'])
+        self.assertEqual(7, trh.retries)
+
+    def test_rate_limiter(self):
+        rate_limiter = RateLimiter()
+        rate_limiter.set_rate('127.0.0.1', 10, burst=2)
+
+        # Burst, then one token every 0.1s, other hosts untouched
+        self.assertEqual(0, rate_limiter.reserve(self.base_url))
+        self.assertEqual(0, rate_limiter.reserve(self.base_url))
+        self.assertAlmostEqual(0.1, rate_limiter.reserve(self.base_url), places=2)
+        self.assertAlmostEqual(0.2, rate_limiter.reserve(self.base_url), places=2)
+        self.assertEqual(0, rate_limiter.reserve('http://example.org'))
+
+        url_list = [self.base_url + '/r%s' % n for n in range(4)]
+        rh = RequestHandler(url_list, RequestData(GET), RequestErrorData(), rate_limiter=RateLimiter())
+        rh.rate_limiter.set_rate('127.0.0.1', 10, burst=1)
+        start = time.time()
+        rh.run()
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def test_backoff(self):
+        request_error_data = RequestErrorData(backoff_base=1, backoff_max=5)
+        for n_try in range(10):
+            self.assertLessEqual(backoff_delay(n_try, request_error_data), min(5, 2 ** n_try))
+
+        # Retry-After is honored on 429
+        LocalHandler.hits['/throttled'] = 0
+        rh = RequestHandler([], RequestData(GET), RequestErrorData(allow_errors=False))
+        start = time.time()
+        self.assertEqual('/throttled', rh.fetch(self.base_url + '/throttled').text)
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertEqual(2, LocalHandler.hits['/throttled'])
+
+    def test_metrics(self):
+        LocalHandler.hits['/throttled'] = 0
+        parent = RequestMetrics()
+        metrics = RequestMetrics(parent=parent)
+        rh = RequestHandler([], RequestData(GET), RequestErrorData(), metrics=metrics)
+
+        with count_retries() as retry_count:
+            rh.fetch(self.base_url + '/throttled')
+        rh.fetch(self.base_url + '/missing')
+        rh.download(self.base_url + '/big', 2 * 1024 * 1024)
+
+        host = metrics.snapshot()['hosts']['127.0.0.1']
+        self.assertEqual(4, host['requests'])
+        self.assertEqual({'200': 2, '404': 1, '429': 1}, host['status_codes'])
+        self.assertEqual(1, host['retries'])
+        self.assertEqual(1, retry_count.value)
+        self.assertEqual(2 * len('/throttled') + len('/missing') + 1024 * 1024, host['bytes'])
+        self.assertEqual(4, host['latency']['count'])
+        self.assertEqual(metrics.snapshot(), parent.snapshot())
+
+        # Same for the async handler
+        async def fetch():
+            arh = AsyncRequestHandler([], RequestData(GET), RequestErrorData(), metrics=RequestMetrics())
+            try:
+                await arh.fetch(self.base_url + '/missing')
+                await arh.download(self.base_url + '/big', 2 * 1024 * 1024)
+            finally:
+                await arh.close()
+            return arh.metrics.snapshot()['hosts']['127.0.0.1']
+
+        host = asyncio.run(fetch())
+        self.assertEqual((2, {'200': 1, '404': 1}), (host['requests'], host['status_codes']))
+        self.assertEqual(len('/missing') + 1024 * 1024, host['bytes'])
+
+    def test_async_request_handler(self):
+        url_list = [self.base_url + '/%s' % n for n in range(20)] + [self.base_url + '/missing']
+
+        async def run_handler():
+            arh = AsyncRequestHandler(url_list, RequestData(GET), RequestErrorData(), concurrency=5)
+            await arh.run()
+            await arh.close()
+            return arh
+
+        arh = asyncio.run(run_handler())
+        self.assertEqual(20, len(arh.responses))
+        self.assertEqual([{'error': InvalidStatusCode, 'url': self.base_url + '/missing',
+                           'response': arh.errors[0]['response']}], arh.errors)
+
+        async def fetch(url, request_error_data):
+            arh = AsyncRequestHandler([], RequestData(GET), request_error_data)
+            try:
+                return (await arh.fetch(url)).text
+            finally:
+                await arh.close()
+
+        self.assertEqual('/a', asyncio.run(fetch(self.base_url + '/a', RequestErrorData(allow_errors=False))))
+        self.assertRaises(InvalidStatusCode, asyncio.run,
+                          fetch(self.base_url + '/missing', RequestErrorData(allow_errors=False)))
+        self.assertRaises(NoValidationString, asyncio.run,
+                          fetch(self.base_url + '/a', RequestErrorData(allow_errors=False,
+                                                                       expected_validation_str='/b')))
+
+        # Charsets Python doesn't know are read as utf-8
+        response = AsyncResponse(self.base_url, 200, {}, 'café'.encode('utf-8'), 'x-unknown-charset')
+        self.assertEqual('café', response.text)
+
+    def test_download(self):
+        rh = RequestHandler([], RequestData(GET), RequestErrorData(allow_errors=False))
+
+        download = rh.download(self.base_url + '/a', 100)
+        self.assertEqual('/a', download.text)
+        self.assertFalse(download.truncated)
+
+        # Refused from Content-Length, or once the chunks go over
+        self.assertRaises(ResponseTooLarge, rh.download, self.base_url + '/big', 1000)
+        self.assertRaises(ResponseTooLarge, rh.download, self.base_url + '/chunked', 1000)
+
+        download = rh.download(self.base_url + '/chunked', 1000, truncate=True)
+        self.assertEqual((1000, True), (len(download.content), download.truncated))
+
+        # Saved to disk, and left alone when too large
+        path = os.getcwd() + '/download.txt'
+        download = rh.download(self.base_url + '/big', 2 * 1024 * 1024, path)
+        self.assertIsNone(download.content)
+        self.assertEqual(1024 * 1024, os.path.getsize(path))
+        self.assertRaises(ResponseTooLarge, rh.download, self.base_url + '/chunked', 1000, path)
+        self.assertEqual(1024 * 1024, os.path.getsize(path))
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+        # Clean
+        os.remove(path)
+
+    def test_probe(self):
+        rh = RequestHandler([], RequestData(GET), RequestErrorData(allow_errors=False))
+        self.assertTrue(rh.probe(self.base_url + '/big'))
+        # HEAD refused, falls back to a ranged GET
+        self.assertTrue(rh.probe(self.base_url + '/chunked'))
+        self.assertFalse(rh.probe(self.base_url + '/missing'))
+
+    def test_async_download(self):
+        async def run_handler():
+            arh = AsyncRequestHandler([], RequestData(GET), RequestErrorData(allow_errors=False))
+            try:
+                download = await arh.download(self.base_url + '/chunked', 1000, truncate=True)
+                self.assertEqual((1000, True), (len(download.content), download.truncated))
+                with self.assertRaises(ResponseTooLarge):
+                    await arh.download(self.base_url + '/big', 1000)
+
+                self.assertTrue(await arh.probe(self.base_url + '/big'))
+                self.assertTrue(await arh.probe(self.base_url + '/chunked'))
+                self.assertFalse(await arh.probe(self.base_url + '/missing'))
+            finally:
+                await arh.close()
+
+        asyncio.run(run_handler())
+
+        # A streamed body is only timed out while stalled, not for taking longer than the timeout as a whole
+        async def drip():
+            arh = AsyncRequestHandler([], RequestData(GET, timeout=0.6), RequestErrorData(allow_errors=False))
+            try:
+                return (await arh.download(self.base_url + '/drip', 100)).content
+            finally:
+                await arh.close()
+
+        self.assertEqual(b'xxxxx', asyncio.run(drip()))
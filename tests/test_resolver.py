@@ -0,0 +1,127 @@
+import time
+import threading
+from types import SimpleNamespace
+from unittest import TestCase, skipUnless
+
+from helpers.resolver import Resolver, NameNotResolved, ResolveTimeout, BackendNotAvailable
+from helpers.lazy_import import module_available
+
+ANSWERS = {
+    'example.org': (['93.184.216.34', '2606:2800:220:1:248:1893:25c8:1946'], 0.2),
+    'example.com': (['93.184.216.35'], 60),
+}
+
+
+class FakeResolver(Resolver):
+    """
+    Resolver answering ANSWERS after delay seconds, recording the names it was asked for.
+    """
+    def __init__(self, delay=0.0, **kwargs):
+        super().__init__(backend='system', **kwargs)
+        self.delay = delay
+        self.queries = []
+        self._queries_lock = threading.Lock()
+
+    def _query(self, name):
+        with self._queries_lock:
+            self.queries.append(name)
+        time.sleep(self.delay)
+        if name == 'timeout.org':
+            raise ResolveTimeout(name)
+        return ANSWERS.get(name, ([], None))
+
+
+class TestResolver(TestCase):
+    def test_resolve(self):
+        resolver = FakeResolver()
+        self.assertEqual(ANSWERS['example.org'][0], resolver.resolve('Example.org.'))
+        self.assertEqual(['10.0.0.1'], resolver.resolve('10.0.0.1'))
+        self.assertRaises(NameNotResolved, resolver.resolve, 'missing.org')
+
+        # Answers are cached for their TTL, names that don't resolve for negative_ttl
+        resolver.resolve('example.org')
+        self.assertRaises(NameNotResolved, resolver.resolve, 'missing.org')
+        self.assertEqual(['example.org', 'missing.org'], resolver.queries)
+
+        time.sleep(0.25)
+        resolver.resolve('example.org')
+        self.assertEqual(['example.org', 'missing.org', 'example.org'], resolver.queries)
+
+        self.assertEqual(['93.184.216.35'], resolver.resolve('example.com'))
+        self.assertEqual(['93.184.216.35'], resolver.cached('example.com'))
+        self.assertIsNone(resolver.cached('example.net'))
+        resolver.close()
+
+    def test_timeout(self):
+        resolver = FakeResolver(delay=0.3, timeout=0.1)
+        self.assertRaises(ResolveTimeout, resolver.resolve, 'example.org')
+
+        # The lookup already under way is waited on rather than started again
+        time.sleep(0.3)
+        self.assertEqual(ANSWERS['example.org'][0], resolver.resolve('example.org'))
+        self.assertEqual(['example.org'], resolver.queries)
+
+        # Timeouts aren't cached
+        self.assertRaises(ResolveTimeout, resolver.resolve, 'timeout.org')
+        time.sleep(0.3)
+        self.assertRaises(ResolveTimeout, resolver.resolve, 'timeout.org')
+        self.assertEqual(2, resolver.queries.count('timeout.org'))
+        resolver.close()
+
+    def test_prefetch(self):
+        resolver = FakeResolver(delay=0.2, workers=8)
+        names = ['example.org', 'example.com', 'missing.org', 'example.org']
+
+        start = time.monotonic()
+        self.assertEqual(3, resolver.prefetch(names))
+        resolved = resolver.resolve_many(names)
+        self.assertLess(time.monotonic() - start, 0.4)  # At once, not one after the other
+
+        self.assertEqual({'example.org': ANSWERS['example.org'][0], 'example.com': ['93.184.216.35'],
+                          'missing.org': None}, resolved)
+        self.assertEqual(3, len(resolver.queries))
+        resolver.close()
+
+    def test_system(self):
+        resolver = Resolver(backend='system')
+        self.assertIn('127.0.0.1', resolver.resolve('localhost'))
+        resolver.close()
+
+        self.assertRaises(BackendNotAvailable, Resolver, backend='c-ares')
+
+    def test_malformed_names(self):
+        # Names no resolver accepts, refused before any query
+        resolver = Resolver(backend='system')
+        for name in ['a..example.org', 'a' * 64 + '.org']:
+            self.assertRaises(NameNotResolved, resolver.resolve, name)
+        resolver.close()
+
+    @skipUnless(module_available('dns.resolver'), 'dnspython is not installed')
+    def test_dnspython_malformed_names(self):
+        resolver = Resolver(backend='dnspython')
+        for name in ['a..example.org', 'a' * 64 + '.org']:
+            self.assertRaises(NameNotResolved, resolver.resolve, name)
+        resolver.close()
+
+    @skipUnless(module_available('dns.resolver'), 'dnspython is not installed')
+    def test_dnspython_partial_timeout(self):
+        from dns.exception import Timeout
+
+        class Answer(list):
+            rrset = SimpleNamespace(ttl=3600)
+
+        class FakeDns(object):
+            # dns.resolver.Resolver whose AAAA queries time out, and every query for timeout.org
+            def resolve(self, name, record_type):
+                if record_type == 'AAAA' or name == 'timeout.org':
+                    raise Timeout()
+                return Answer([SimpleNamespace(address='93.184.216.34')])
+
+        resolver = Resolver(backend='dnspython', negative_ttl=60)
+        resolver._dns = FakeDns()
+
+        # The A answer is kept, for no longer than negative_ttl, failing only when every record type timed out
+        self.assertEqual((['93.184.216.34'], 60), resolver._query('example.org'))
+        self.assertEqual(['93.184.216.34'], resolver.resolve('example.org'))
+        self.assertRaises(ResolveTimeout, resolver._query, 'timeout.org')
+        resolver.close()
@@ -0,0 +1,84 @@
+import json
+from unittest import TestCase
+
+from helpers.robots import Robots, parse_robots, load_robots
+
+ROBOTS = '''# Comments and unknown lines are skipped
+Disallow: /before-any-agent
+User-Agent: *
+Disallow: /private/
+Allow: /private/public.html
+Disallow: /*.pdf$
+Disallow: /search?q=*
+
+user-agent: Googlebot
+user-agent: bingbot  # Same group
+crawl-delay: 5
+disallow: /
+allow: /$
+ALLOW: /news
+
+User-agent: googlebot
+Disallow: /news/old
+
+Sitemap: https://example.org/sitemap.xml
+sitemap: https://example.org/news.xml
+'''
+
+
+class TestRobots(TestCase):
+    def test_parse_robots(self):
+        robots = parse_robots(ROBOTS)
+
+        self.assertEqual(3, len(robots.groups))
+        self.assertEqual(['Googlebot', 'bingbot'], robots.groups[1].agents)
+        self.assertEqual(5, robots.crawl_delay('Googlebot/2.1 (+http://www.google.com/bot.html)'))
+        self.assertIsNone(robots.crawl_delay('Otherbot'))
+        self.assertEqual(['https://example.org/sitemap.xml', 'https://example.org/news.xml'], robots.sitemaps)
+
+        with open('soundcloud_com_robots_txt.txt', 'r') as f:
+            robots = parse_robots(f.read())
+        self.assertEqual(['https://soundcloud.com/sitemap.xml', 'https://soundcloud.com/sitemapIndex.xml'],
+                         robots.sitemaps)
+        self.assertTrue(robots.can_fetch('Otherbot', '/anything'))
+
+    def test_can_fetch(self):
+        robots = parse_robots(ROBOTS)
+
+        cases = [('Otherbot', '/before-any-agent', True),
+                 ('Otherbot', 'https://example.org/private/', False),
+                 ('Otherbot', '/private/public.html', True),
+                 ('Otherbot', '/files/a.pdf', False),
+                 ('Otherbot', '/files/a.pdf?download=1', True),
+                 ('Otherbot', '/search?q=robots', False),
+                 ('Otherbot', '/search', True),
+                 # Longest match wins, so the googlebot groups are merged and override *
+                 ('Googlebot', '/', True),
+                 ('Googlebot', 'https://example.org', True),
+                 ('GOOGLEBOT', '/about', False),
+                 ('Googlebot', '/news/today', True),
+                 ('Googlebot', '/news/old/1', False),
+                 ('bingbot', '/news/old/1', True),
+                 ('Googlebot', '/robots.txt', True)]
+        for user_agent, url, allowed in cases:
+            self.assertEqual(allowed, robots.can_fetch(user_agent, url), (user_agent, url))
+
+        # Allow wins a tie
+        robots = parse_robots('User-agent: *\nDisallow: /page\nAllow: /page')
+        self.assertTrue(robots.can_fetch('Otherbot', '/page'))
+
+        # Without rules or groups everything is allowed
+        self.assertTrue(parse_robots('User-agent: *\nDisallow:').can_fetch('Otherbot', '/a'))
+        self.assertTrue(parse_robots('').can_fetch('Otherbot', '/a'))
+
+    def test_as_dict(self):
+        robots = parse_robots(ROBOTS)
+        data = json.loads(json.dumps(robots.as_dict()))
+
+        loaded = Robots.from_dict(data)
+        self.assertEqual(robots.as_dict(), loaded.as_dict())
+        self.assertFalse(loaded.can_fetch('Googlebot', '/about'))
+
+        # Older reports saved robots.txt as text
+        self.assertEqual(robots.as_dict(), load_robots(ROBOTS).as_dict())
+        self.assertIsNone(load_robots(None))
@@ -0,0 +1,108 @@
+import gzip
+import asyncio
+from unittest import TestCase
+
+from helpers.sitemap import parse_sitemap, crawl_sitemaps, async_crawl_sitemaps, InvalidSitemap, \
+    SitemapTooLarge
+
+URLSET = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">%s</urlset>'
+URL = '<url><loc>%s</loc><lastmod>%s</lastmod></url>'
+INDEX = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">%s</sitemapindex>'
+SITEMAP = '<sitemap><loc>%s</loc></sitemap>'
+
+
+def make_urlset(prefix, n, day=1):
+    return (URLSET % ''.join([URL % ('http://example.org/%s/%s' % (prefix, i), '2020-01-%02d' % day)
+                              for i in range(n)])).encode('utf-8')
+
+
+def chunked(content, size=1000):
+    return [content[start:start + size] for start in range(0, len(content), size)]
+
+
+class TestSitemap(TestCase):
+    def test_parse_sitemap(self):
+        content = make_urlset('a', 50000)
+        for data in [content, gzip.compress(content)]:
+            parser = parse_sitemap(chunked(data))
+            self.assertEqual(50000, parser.url_count)
+            self.assertEqual(['2020-01-01', '2020-01-01'], parser.lastmod)
+            self.assertEqual(['http://example.org/a/%s' % i for i in range(5)], parser.sample)
+            self.assertEqual([], parser.sitemaps)
+
+            # Entries are dropped once read
+            self.assertEqual(0, len(parser._root))
+
+        # Gzip magic split over two chunks
+        data = gzip.compress(make_urlset('a', 3))
+        self.assertEqual(3, parse_sitemap([data[:1], data[1:]]).url_count)
+
+    def test_invalid_sitemap(self):
+        self.assertRaises(InvalidSitemap, parse_sitemap, [b'<html><body>Not found</body>'])
+        self.assertRaises(InvalidSitemap, parse_sitemap, [b''])
+        self.assertRaises(InvalidSitemap, parse_sitemap, [b'\x1f\x8bnot gzip'])
+
+        # Gzip bombs are stopped at max_bytes, uncompressed
+        bomb = gzip.compress(b'<urlset>' + b' ' * 10 ** 7 + b'</urlset>')
+        self.assertRaises(SitemapTooLarge, parse_sitemap, [bomb], max_bytes=10 ** 6)
+
+    def test_crawl_sitemaps(self):
+        sitemaps = {
+            'http://example.org/sitemap.xml': (INDEX % ''.join([SITEMAP % 'http://example.org/a.xml.gz',
+                                                                SITEMAP % 'http://example.org/b.xml',
+                                                                SITEMAP % 'http://example.org/missing.xml'])).encode(),
+            'http://example.org/a.xml.gz': gzip.compress(make_urlset('a', 10, day=3)),
+            'http://example.org/b.xml': make_urlset('b', 20, day=2),
+        }
+
+        def get_chunks(url):
+            yield from chunked(sitemaps[url])
+
+        async def async_get_chunks(url):
+            for chunk in chunked(sitemaps[url]):
+                yield chunk
+
+        for stats in [crawl_sitemaps(['http://example.org/sitemap.xml'], get_chunks),
+                      asyncio.run(async_crawl_sitemaps(['http://example.org/sitemap.xml'], async_get_chunks))]:
+            self.assertEqual(30, stats['url_count'])
+            self.assertEqual(['2020-01-02', '2020-01-03'], stats['lastmod'])
+            self.assertEqual(5, len(stats['sample']))
+            self.assertEqual((3, 1, False), (stats['sitemaps'], stats['errors'], stats['truncated']))
+
+        # Stops at max_sitemaps
+        stats = crawl_sitemaps(['http://example.org/sitemap.xml'], get_chunks, max_sitemaps=2)
+        self.assertEqual((2, True), (stats['sitemaps'] + stats['errors'], stats['truncated']))
+
+    def test_crawl_budget(self):
+        sitemaps = {'http://example.org/a.xml': make_urlset('a', 1000),
+                    'http://example.org/b.xml': make_urlset('b', 10)}
+        closed = []
+
+        def get_chunks(url):
+            try:
+                yield from chunked(sitemaps[url])
+            finally:
+                closed.append(url)
+
+        async def async_get_chunks(url):
+            try:
+                for chunk in chunked(sitemaps[url]):
+                    yield chunk
+            finally:
+                closed.append(url)
+
+        # Stops at max_total_bytes across every sitemap, keeping the urls read up to then
+        for crawl in [lambda: crawl_sitemaps(list(sitemaps), get_chunks, max_workers=1, max_total_bytes=20000),
+                      lambda: asyncio.run(async_crawl_sitemaps(list(sitemaps), async_get_chunks, max_workers=1,
+                                                               max_total_bytes=20000))]:
+            closed.clear()
+            stats = crawl()
+            self.assertTrue(stats['truncated'])
+            self.assertTrue(0 < stats['url_count'] < 1000)
+            self.assertEqual((1, 0), (stats['sitemaps'], stats['errors']))
+            self.assertIn('http://example.org/a.xml', closed)
+
+        # Nothing is read once max_seconds are gone
+        stats = crawl_sitemaps(list(sitemaps), get_chunks, max_seconds=-1)
+        self.assertEqual((0, 0, True), (stats['url_count'], stats['sitemaps'], stats['truncated']))
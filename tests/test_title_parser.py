@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from bs4 import BeautifulSoup
+
+from helpers.title_parser import TitleParser, TitleNotFound, stream_title
+
+
+class TestTitleParser(TestCase):
+    def test_stream_title(self):
+        # Same title as BeautifulSoup, whatever the chunk boundaries
+        documents = ['<html><head><title>A &amp; B</title></head><body></body></html>',
+                     '<head><meta charset="utf-8"><title>\n café &#169; \n</title>',
+                     '<TITLE>Upper</TITLE>',
+                     '<title></title>']
+        for document in documents:
+            expected = BeautifulSoup(document, 'html.parser').title.string
+            content = document.encode('utf-8')
+            for size in [1, 3, 1024]:
+                chunks = [content[start:start + size] for start in range(0, len(content), size)]
+                self.assertEqual(expected, stream_title(chunks))
+
+    def test_title_not_found(self):
+        # Anything BeautifulSoup would need the tree for is left to it
+        documents = ['<title>a<b>b</b></title>',
+                     '<title>a<!-- b -->c</title>',
+                     '<title/><title>a</title>',
+                     '<head></head><body><title>a</title></body>',
+                     '<title>never closed']
+        for document in documents:
+            self.assertRaises(TitleNotFound, stream_title, [document.encode('utf-8')])
+
+    def test_max_bytes(self):
+        content = ('<head><!-- %s --><title>a</title>' % ('x' * 1000)).encode('utf-8')
+        chunks = [content[start:start + 100] for start in range(0, len(content), 100)]
+        self.assertRaises(TitleNotFound, stream_title, chunks, max_bytes=500)
+        self.assertEqual('a', stream_title(chunks, max_bytes=2000))
+
+        # Stops reading once the title is closed
+        parser = TitleParser()
+        self.assertTrue(parser.feed_bytes(b'<title>a</title>'))
+        self.assertTrue(parser.feed_bytes(b'<title>b</title>'))
+        self.assertEqual('a', parser.get_title())
+
+    def test_encoding(self):
+        content = '<title>café</title>'.encode('latin-1')
+        self.assertEqual('café', stream_title([content[:10], content[10:]], 'ISO-8859-1'))
+
+        # Charsets Python doesn't know are read as utf-8
+        self.assertEqual('café', stream_title(['<title>café</title>'.encode('utf-8')], 'x-unknown-charset'))
@@ -0,0 +1,289 @@
+import time
+import threading
+import socketserver
+from unittest import TestCase
+
+from helpers.whois_client import WhoisClient, ReferralCache, WhoisTimeout, NoWhoisServer, NoWhoisRecord, parse_range, \
+    parse_rir_answer, whois, nic_client, _nic_client_class
+from helpers.lookup_cache import MISSING
+
+# Fake servers on loopback addresses sharing a port, as the client queries every server on the same one
+IANA, REGISTRY, REGISTRAR = '127.0.0.1', '127.0.0.2', '127.0.0.3'
+SLOW = 0.5  # Seconds the slow queries take
+
+# Trimmed answers of RIPE and ARIN, as they're sent
+RIPE_ANSWER = '''% This is the RIPE Database query service.
+% The objects are in RPSL format.
+
+% Information related to '93.184.216.0 - 93.184.216.255'
+
+inetnum:        93.184.216.0 - 93.184.216.255
+netname:        EDGECAST-NETBLK-03
+descr:          NETBLK-03-EU-93-184-216-0-24
+descr:          Edgecast Inc.
+country:        EU
+org:            ORG-EA43-RIPE
+admin-c:        DS7892-RIPE
+status:         ASSIGNED PA
+created:        2012-06-22T21:48:41Z
+last-modified:  2012-06-22T21:48:41Z
+source:         RIPE # Filtered
+
+organisation:   ORG-EA43-RIPE
+org-name:       Edgecast Inc.
+org-type:       OTHER
+address:        13031 W Jefferson Blvd #900
+address:        90094
+address:        Los Angeles
+address:        UNITED STATES
+abuse-mailbox:  abuse@verizondigitalmedia.com
+source:         RIPE # Filtered
+
+% Information related to '93.184.216.0/24AS15133'
+
+route:          93.184.216.0/24
+descr:          EDGECAST-NETBLK-03
+origin:         AS15133
+source:         RIPE # Filtered
+'''
+
+ARIN_ANSWER = '''#
+# ARIN WHOIS data and services are subject to the Terms of Use
+# available at: https://www.arin.net/resources/registry/whois/tou/
+#
+
+NetRange:       8.0.0.0 - 8.127.255.255
+CIDR:           8.0.0.0/9
+NetName:        LVLT-ORG-8-8
+NetType:        Direct Allocation
+OriginAS:
+Organization:   Level 3 Parent, LLC (LPL-141)
+
+OrgName:        Level 3 Parent, LLC
+Country:        US
+
+NetRange:       8.8.8.0 - 8.8.8.255
+CIDR:           8.8.8.0/24
+NetName:        GOGL
+NetHandle:      NET-8-8-8-0-1
+Parent:         LVLT-ORG-8-8 (NET-8-0-0-0-1)
+NetType:        Reallocated
+OriginAS:       AS15169
+Organization:   Google LLC (GOGL)
+RegDate:        2014-03-14
+Updated:        2014-03-14
+Ref:            https://rdap.arin.net/registry/ip/8.8.8.0
+
+OrgName:        Google LLC
+OrgId:          GOGL
+Address:        1600 Amphitheatre Parkway
+City:           Mountain View
+StateProv:      CA
+PostalCode:     94043
+Country:        US
+
+OrgAbuseHandle: ABUSE5250-ARIN
+OrgAbuseEmail:  network-abuse@google.com
+
+#
+# ARIN WHOIS data and services are subject to the Terms of Use
+#
+'''
+
+ANSWERS = {
+    IANA: {
+        'org': 'domain: ORG\nrefer: %s\n' % REGISTRY,
+        '93.184.216.34': 'refer: %s\ninetnum: 93.0.0.0 - 93.255.255.255\n' % REGISTRY,
+        '93.184.216.35': 'refer: %s\ninetnum: 93.0.0.0 - 93.255.255.255\n' % REGISTRY,
+        '8.8.8.8': 'refer: %s\ninetnum: 8.0.0.0 - 8.255.255.255\n' % REGISTRAR,
+    },
+    REGISTRY: {
+        'example.org': 'Domain Name: EXAMPLE.ORG\nRegistrar WHOIS Server: %s\n' % REGISTRAR,
+        'slow.org': 'Domain Name: SLOW.ORG\nRegistrar: Slow\n',
+        'missing.org': 'NOT FOUND\n',
+        '93.184.216.34': RIPE_ANSWER,
+        '93.184.216.35': RIPE_ANSWER,
+    },
+    REGISTRAR: {
+        'example.org': 'Domain Name: EXAMPLE.ORG\nRegistrar: ICANN\nCreation Date: 1995-08-31T04:00:00Z\n',
+        '8.8.8.8': ARIN_ANSWER,
+    },
+}
+
+
+class FakeWhoisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        query = self.rfile.readline().decode('utf-8').strip()
+        self.server.received(query)
+        if query in self.server.slow:
+            time.sleep(SLOW)
+        self.wfile.write(self.server.answers.get(query, '').encode('utf-8'))
+        self.server.received(None)
+
+
+class FakeWhoisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, address, port, answers, slow):
+        super().__init__((address, port), FakeWhoisHandler)
+        self.answers = answers
+        self.slow = slow
+        self.queries = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    def received(self, query):
+        """
+        :param query: str, or None once answered
+        """
+        with self.lock:
+            if query is None:
+                self.in_flight -= 1
+            else:
+                self.queries.append(query)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+
+class TestWhoisClient(TestCase):
+    def setUp(self):
+        self.slow = set()
+        self.servers = {IANA: FakeWhoisServer(IANA, 0, ANSWERS[IANA], self.slow)}
+        port = self.servers[IANA].server_address[1]
+        for address in [REGISTRY, REGISTRAR]:
+            self.servers[address] = FakeWhoisServer(address, port, ANSWERS[address], self.slow)
+
+        self.client = WhoisClient(timeout=2, port=port, iana=IANA)
+
+    def tearDown(self):
+        self.client.close()
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def test_whois_domain(self):
+        entry = self.client.whois('https://www.example.org/index.html')
+        self.assertEqual('ICANN', entry['registrar'])
+        self.assertEqual('1995-08-31', entry['creation_date'].date().isoformat())
+        self.assertEqual(['org', 'example.org'], self.servers[IANA].queries + self.servers[REGISTRY].queries)
+
+        # The TLD's server is only asked for once
+        self.client.whois('example.org')
+        self.assertEqual(['org'], self.servers[IANA].queries)
+        self.assertEqual(REGISTRY, self.client.referrals.tld('org'))
+
+        self.assertRaises(NoWhoisRecord, self.client.whois, 'missing.org')
+        self.assertRaises(NoWhoisServer, self.client.whois, 'example.net')  # IANA knows no server for net here
+
+    def test_python_whois_internals(self):
+        # The parts of python-whois the client relies on beyond whois.whois(), pinned in requirements.txt
+        client = _nic_client_class()(lambda tld: 'whois.nic.' + tld)
+        self.assertEqual('whois.nic.zzz', client.choose_server('example.zzz'))
+        text = 'Domain Name: EXAMPLE.ORG\nRegistrar WHOIS Server: whois.registrar.example\n'
+        self.assertEqual('whois.registrar.example',
+                         nic_client.NICClient.findwhois_server(text, 'whois.registry.example', 'example.org'))
+        self.assertEqual(('whois.denic.de', 'whois.dk-hostmaster.dk'),
+                         (nic_client.NICClient.DENICHOST, nic_client.NICClient.DK_HOST))
+
+        self.assertEqual('example.org', whois.extract_domain('https://www.example.org/index.html'))
+        self.assertEqual('ICANN', whois.parser.WhoisEntry.load('example.org', 'Registrar: ICANN\n')['registrar'])
+        self.assertTrue(issubclass(whois.exceptions.PywhoisError, Exception))
+
+    def test_whois_ip(self):
+        entry = self.client.whois('93.184.216.34')
+        self.assertEqual(('EDGECAST-NETBLK-03', 'Edgecast Inc.', 'RIPE', 'EU', 'AS15133'),
+                         (entry['name'], entry['org'], entry['registry'], entry['country'], entry['origin']))
+        self.assertEqual('13031 W Jefferson Blvd #900, 90094, Los Angeles, UNITED STATES', entry['address'])
+        self.assertEqual('NETBLK-03-EU-93-184-216-0-24, Edgecast Inc.', entry['description'])
+        self.assertEqual(['abuse@verizondigitalmedia.com'], entry['emails'])
+        self.assertEqual('93.184.216.0 - 93.184.216.255', entry['netrange'])
+        self.assertIsNone(entry['zipcode'])
+
+        # The range IANA gave covers the second IP
+        self.assertEqual('RIPE', self.client.whois('93.184.216.35')['registry'])
+        self.assertEqual(['93.184.216.34'], self.servers[IANA].queries)
+
+        # ARIN's most specific network is the last one
+        entry = self.client.whois('8.8.8.8')
+        self.assertEqual(('GOGL', 'Google LLC', 'AS15169', '8.8.8.0/24', '2014-03-14'),
+                         (entry['name'], entry['org'], entry['origin'], entry['cidr'], entry['creation_date']))
+        self.assertEqual(('1600 Amphitheatre Parkway', 'Mountain View', 'CA', '94043', 'US'),
+                         (entry['address'], entry['city'], entry['state'], entry['zipcode'], entry['country']))
+        self.assertEqual(REGISTRAR, entry['registry'])
+
+    def test_parse_rir_answer(self):
+        self.assertRaises(NoWhoisRecord, parse_rir_answer, '10.0.0.1', '% No entries found\n', 'whois.ripe.net')
+
+    def test_deadline(self):
+        self.slow.add('slow.org')
+        client = WhoisClient(timeout=SLOW / 5, port=self.client.port, iana=IANA)
+
+        start = time.monotonic()
+        self.assertRaises(WhoisTimeout, client.whois, 'slow.org')
+        self.assertLess(time.monotonic() - start, SLOW)
+
+    def test_server_limit(self):
+        self.slow.add('slow.org')
+        client = WhoisClient(timeout=10, server_limit=2, port=self.client.port, iana=IANA)
+
+        threads = [threading.Thread(target=client.whois, args=('slow.org',)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(6, self.servers[REGISTRY].queries.count('slow.org'))
+        self.assertEqual(2, self.servers[REGISTRY].max_in_flight)
+
+    def test_first_answer(self):
+        # The domain's answer is preferred, even if the IP's comes first
+        self.slow.add('slow.org')
+        self.assertEqual('Slow', self.client.first_answer(['slow.org', '93.184.216.34'])['registrar'])
+
+        # Both run at once
+        start = time.monotonic()
+        self.slow.add('93.184.216.34')
+        self.assertEqual('RIPE', self.client.first_answer(['missing.org', '93.184.216.34'])['registry'])
+        self.assertLess(time.monotonic() - start, SLOW * 2)
+
+        self.assertRaises(NoWhoisRecord, self.client.first_answer, ['missing.org'])
+
+        # Past the deadline, a later answer beats none
+        self.slow.discard('93.184.216.34')
+        client = WhoisClient(timeout=SLOW / 2, port=self.client.port, iana=IANA)
+        self.assertEqual('RIPE', client.first_answer(['slow.org', '93.184.216.34'])['registry'])
+        self.assertRaises(WhoisTimeout, client.first_answer, ['slow.org'])
+        client.close()
+
+    def test_first_answer_queued(self):
+        # The deadline of a lookup waiting for a worker only starts once it gets one
+        self.slow.add('slow.org')
+        client = WhoisClient(timeout=SLOW * 1.5, workers=1, port=self.client.port, iana=IANA)
+        answers = []
+        threads = [threading.Thread(target=lambda: answers.append(client.first_answer(['slow.org'])))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['Slow', 'Slow'], [answer['registrar'] for answer in answers])
+        client.close()
+
+    def test_referral_cache(self):
+        cache = ReferralCache()
+        self.assertIs(MISSING, cache.ip('10.0.0.1'))
+
+        cache.add_range(*parse_range('93.0.0.0 - 93.255.255.255'), 'whois.ripe.net')
+        cache.add_range(*parse_range('8.0.0.0/8'), 'whois.arin.net')
+        cache.add_range(*parse_range('2a00::/12'), 'whois.ripe.net')
+        self.assertEqual('whois.ripe.net', cache.ip('93.184.216.34'))
+        self.assertEqual('whois.arin.net', cache.ip('8.8.8.8'))
+        self.assertEqual('whois.ripe.net', cache.ip('2a00:1450::1'))
+        self.assertIs(MISSING, cache.ip('9.0.0.1'))
+
+        cache.set_tld('NET', None)
+        self.assertIsNone(cache.tld('net'))
+        self.assertEqual({'tlds': 1, 'ranges': 3}, cache.stats())